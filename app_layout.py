@@ -1,836 +1,2033 @@
-import sys
-from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout,
-                             QHBoxLayout, QPushButton, QLineEdit, QListWidget,
-                             QGraphicsScene, QGraphicsView, QGraphicsRectItem,
-                             QDialog, QFormLayout, QDialogButtonBox, QGraphicsTextItem,
-                             QInputDialog, QMessageBox, QGraphicsItemGroup, QMenuBar, QMenu, QAction, QFileDialog)  # Import QInputDialog para editar o nome
-from PyQt5.QtCore import Qt, QRectF
-from PyQt5.QtGui import QBrush, QColor, QFont, QPen, QDrag, QPixmap, QPainter, QTextOption
-from typing import Optional, List
-import requests
-import threading
-import random
-import uvicorn
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
-from PyQt5.QtWidgets import QListWidgetItem
-from PyQt5.QtCore import QMimeData
-from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
-import json
-
-# FastAPI Backend (Mesmo código do backend)
-app = FastAPI()
-# Simulação de banco de dados
-stores = {}
-categories = {}
-store_layouts = {}
-class Store(BaseModel):
-    id: int
-    name: str
-    num_columns: int
-    modules_per_column: int
-
-class Category(BaseModel):
-    id: int
-    name: str
-
-class Module(BaseModel):
-    module_id: int
-    column: int
-    row: int
-    x: int
-    y: int
-    name: str
-    category_id: Optional[int] = None
-    width: int = 60
-    height: int = 30
-    rotation: int = 0  # Adicione este atributo
-
-class StoreLayoutData(BaseModel):
-    store_id: int
-    columns: List[List[Module]]
-
-@app.post("/store/")
-def create_store(store: Store):
-    """
-    Cria uma nova loja com o layout inicial.
-
-    Args:
-        store (Store): Objeto Store contendo os detalhes da loja.
-
-    Returns:
-        dict: Mensagem de confirmação e detalhes da loja criada.
-    """
-    if store.id in stores:
-        raise HTTPException(status_code=400, detail="Store ID já existe")
-    stores[store.id] = store
-
-    # Cria um layout inicial com colunas
-    columns = []
-    module_id_counter = 0
-    for column_index in range(store.num_columns):
-        column = []
-        for row_index in range(store.modules_per_column):
-            module = Module(
-                module_id=module_id_counter,
-                column=column_index,
-                row=row_index,
-                x=column_index * 70,
-                y=row_index * 40,
-                name=f"Module {module_id_counter}"
-            )
-            column.append(module)
-            module_id_counter += 1
-        columns.append(column)
-
-    store_layouts[store.id] = StoreLayoutData(store_id=store.id, columns=columns).dict()
-    return {"message": "Loja criada", "store": store}
-def get_store_layout(store_id: int):
-    """
-    Obtém o layout da loja especificada pelo ID.
-
-    Args:
-        store_id (int): ID da loja.
-
-    Returns:
-        dict: Layout da loja.
-    """
-@app.post("/category/")
-def create_category(category: Category):
-    if category.id in categories:
-        raise HTTPException(status_code=400, detail="ID de categoria já existe")
-@app.put("/store-layout/{store_id}")
-def update_store_layout(store_id: int, layout_data: StoreLayoutData):
-    """
-    Atualiza o layout da loja.
-
-    Args:
-        store_id (int): ID da loja a ser atualizada.
-        layout_data (StoreLayoutData): Dados do layout da loja.
-
-    Returns:
-        dict: Mensagem de confirmação e detalhes do layout atualizado.
-    """
-
-@app.get("/store-layout/{store_id}")
-def get_store_layout(store_id: int):
-    if store_id not in store_layouts:
-        raise HTTPException(status_code=404, detail="Layout não encontrado")
-    return store_layouts[store_id]
-
-@app.put("/store-layout/{store_id}")
-def update_store_layout(store_id: int, layout_data: StoreLayoutData):
-    if store_id not in stores:
-        raise HTTPException(status_code=404, detail="Loja não encontrada")
-
-    store_layouts[store_id] = layout_data.dict()
-    return {"message": "Layout atualizado", "store_layout": layout_data}
-
-#Calcula o share do layout
-@app.get("/store-layout/{store_id}/share")
-def get_store_layout_share(store_id: int):
-    if store_id not in store_layouts:
-        raise HTTPException(status_code=404, detail="Layout não encontrado")
-    layout_data = store_layouts[store_id]
-    store = stores[store_id]
-
-    total_modules = store.num_columns * store.modules_per_column
-    category_counts = {}
-    columns = layout_data.get("columns", [])  # Extrai a lista de colunas
-
-    for column in columns:  # Itera sobre as colunas
-        for module in column:  # Itera sobre os módulos na coluna
-            cat_id = module.get("category_id")
-            if (cat_id):
-                category_counts[cat_id] = category_counts.get(cat_id, 0) + 1 #Contabiliza
-
-    participation = {cat_id: (count / total_modules) * 100 for cat_id, count in category_counts.items()} #calcula o share
-    return participation
-
-API_URL = "http://127.0.0.1:8000"
-
-def run_fastapi():
-    import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
-
-threading.Thread(target=run_fastapi, daemon=True).start()
-
-# PyQt5 Frontend
-class CategoryDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Adicionar Categoria")
-        layout = QFormLayout(self)
-
-        self.id_edit = QLineEdit(self)
-        self.name_edit = QLineEdit(self)
-
-        layout.addRow("ID:", self.id_edit)
-        layout.addRow("Nome:", self.name_edit)
-
-        self.buttons = QDialogButtonBox(
-            QDialogButtonBox.Ok | QDialogButtonBox.Cancel,
-            Qt.Horizontal, self)
-        layout.addWidget(self.buttons)
-
-        self.buttons.accepted.connect(self.accept)
-        self.buttons.rejected.connect(self.reject)
-
-    def get_category_data(self):
-        return {"id": self.id_edit.text(), "name": self.name_edit.text()}
-
-class DraggableRect(QGraphicsRectItem):
-    def __init__(self, module: Module):
-        super().__init__(module.x, module.y, module.width, module.height)
-        self.module = module
-        self.setRect(0, 0, module.width, module.height)  # Define o tamanho do retângulo
-        self.setFlag(QGraphicsRectItem.ItemIsMovable)
-        self.setFlag(QGraphicsRectItem.ItemIsSelectable)
-        self.setAcceptHoverEvents(True)
-        self.setAcceptDrops(True)  # Aceita drops
-        self.setBrush(QBrush(QColor("white")))
-        self.text_item = QGraphicsTextItem(module.name, self)  # Texto
-        self.text_item.setFont(QFont("Arial", 8))
-        self.text_item.setDefaultTextColor(QColor("black"))
-        text_option = QTextOption()
-        text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
-        self.text_item.document().setDefaultTextOption(text_option)
-        self.text_item.setTextWidth(self.rect().width())
-        self.center_text()
-
-    def mousePressEvent(self, event):
-        self.setSelected(True)
-        super().mousePressEvent(event)
-
-    def mouseMoveEvent(self, event):
-        super().mouseMoveEvent(event)
-        self.center_text()
-
-    def mouseReleaseEvent(self, event):
-        super().mouseReleaseEvent(event)
-        self.center_text()
-
-    def mouseDoubleClickEvent(self, event):
-        # Abre uma caixa de diálogo para editar o nome
-        view = self.scene().views()[0]  # Obtém a primeira view associada à cena
-        parent_widget = view.parent()  # Pega o widget pai correto
-        new_name, ok = QInputDialog.getText(parent_widget, "Editar Nome do Módulo", "Novo Nome:", QLineEdit.Normal, self.module.name)
-
-        if ok and new_name:
-            self.module.name = new_name  # Atualiza o nome no objeto Module
-            self.text_item.setPlainText(new_name)  # Atualiza o texto
-            self.center_text()  # Centraliza
-            print(f"Nome do módulo {self.module.module_id} alterado para: {new_name}")
-
-    def center_text(self):
-        text_rect = self.text_item.boundingRect()
-        rect = self.rect()
-        x = rect.left() + (rect.width() - text_rect.width()) / 2
-        y = rect.top() + (rect.height() - text_rect.height()) / 2
-        self.text_item.setPos(x, y)
-
-    def snap_to_grid(self):
-        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
-        x = round(self.x() / grid_size) * grid_size
-        y = round(self.y() / grid_size) * grid_size
-        self.setPos(x, y)
-        self.module.x = x
-        self.module.y = y
-
-class StoreLayoutScene(QGraphicsScene):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setSceneRect(QRectF(0, 0, 6000, 5500))  # Aumenta o espaço útil
-        self.draw_grid()
-
-    def draw_grid(self):
-        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
-        scene_rect = self.sceneRect()
-        left = int(scene_rect.left()) - int(scene_rect.left()) % grid_size
-        top = int(scene_rect.top()) - int(scene_rect.top()) % grid_size
-        right = int(scene_rect.right())
-        bottom = int(scene_rect.bottom())
-
-        pen = QPen(QColor(200, 200, 200))  # Cor da grade
-        for x in range(left, right, grid_size):
-            self.addLine(x, scene_rect.top(), x, scene_rect.bottom(), pen)
-
-        for y in range(top, bottom, grid_size):
-            self.addLine(scene_rect.left(), y, scene_rect.right(), y, pen)
-
-    def mouseReleaseEvent(self, event):
-        super().mouseReleaseEvent(event)
-        self.snap_selected_items_to_grid()
-
-    def snap_selected_items_to_grid(self):
-        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
-        selected_items = self.selectedItems()
-        if not selected_items:
-            return
-
-        for item in selected_items:
-            if isinstance(item, QGraphicsItemGroup):
-                for child in item.childItems():
-                    if isinstance(child, DraggableRect):
-                        child.snap_to_grid()
-            elif isinstance(item, DraggableRect):
-                item.snap_to_grid()
-
-class StoreLayoutView(QGraphicsView):
-    def __init__(self, scene: StoreLayoutScene, parent=None):
-        super().__init__(scene, parent)
-        self.setDragMode(QGraphicsView.RubberBandDrag)
-        self.setScene(scene)
-        self.setRenderHint(QPainter.Antialiasing)
-        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
-        self.setResizeAnchor(QGraphicsView.AnchorUnderMouse)
-
-    def wheelEvent(self, event):
-        zoom_in_factor = 1.25
-        zoom_out_factor = 1 / zoom_in_factor
-
-        if event.angleDelta().y() > 0:
-            zoom_factor = zoom_in_factor
-        else:
-            zoom_factor = zoom_out_factor
-
-        self.scale(zoom_factor, zoom_factor)
-
-    def zoom_in(self):
-        self.scale(1.25, 1.25)
-
-    def zoom_out(self):
-        self.scale(0.8, 0.8)
-
-class DraggableCategory(QListWidgetItem):
-    def __init__(self, category_id, category_name, parent=None):
-        super().__init__(f"{category_name} ({category_id})", parent)
-        self.category_id = category_id
-        self.category_name = category_name
-
-    def mouseMoveEvent(self, event):
-        if event.buttons() == Qt.LeftButton:
-            drag = QDrag(event.widget())
-            mimeData = QMimeData()
-            mimeData.setText(str(self.category_id)) # Passa o ID como texto
-            mimeData.setData("application/x-category", str(self.category_id).encode())  # Para identificar o tipo
-            pixmap = QPixmap(self.listWidget().visualItemRect(self).size())
-            painter = QPainter(pixmap)
-            painter.fillRect(pixmap.rect(), QColor("lightgray"))  # Cor de fundo do item
-            painter.drawText(pixmap.rect(), Qt.AlignCenter, self.text())  # Desenha o texto
-            painter.end()
-            drag.setPixmap(pixmap)
-            drag.setHotSpot(event.pos() - self.listWidget().visualItemRect(self).topLeft())
-            drag.exec_(Qt.CopyAction | Qt.MoveAction)
-
-class StoreLayoutApp(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.API_URL = "http://127.0.0.1:8000"
-        self.setWindowTitle("Engenharia de Layout de Loja")
-        self.store_id = None
-        self.categories = {}
-        self.modules = {}
-        self.category_colors = {}
-
-        self.initUI()
-
-    def initUI(self):
-        # Layout Principal
-        main_layout = QHBoxLayout(self)
-
-        # Left Side (Store and Category Management)
-        left_layout = QVBoxLayout()
-
-        # Store Management
-        store_layout = QVBoxLayout()
-        store_layout.addWidget(QLabel("Cod da Loja:"))
-        self.store_id_edit = QLineEdit(self)
-        store_layout.addWidget(self.store_id_edit)
-
-        store_layout.addWidget(QLabel("Nome da Loja:"))
-        self.store_name_edit = QLineEdit(self)
-        store_layout.addWidget(self.store_name_edit)
-
-        store_layout.addWidget(QLabel("Número de Colunas:"))
-        self.num_columns_edit = QLineEdit(self)
-        store_layout.addWidget(self.num_columns_edit)
-
-        store_layout.addWidget(QLabel("Módulos por Coluna:"))
-        self.modules_per_column_edit = QLineEdit(self)
-        store_layout.addWidget(self.modules_per_column_edit)
-
-        self.create_store_btn = QPushButton("Criar Loja", self)
-        self.create_store_btn.clicked.connect(self.create_store)
-        store_layout.addWidget(self.create_store_btn)
-        left_layout.addLayout(store_layout)
-
-        # Category Management
-        category_layout = QVBoxLayout()
-        self.add_category_btn = QPushButton("Adicionar Categoria", self)
-        self.add_category_btn.clicked.connect(self.add_category)
-        category_layout.addWidget(self.add_category_btn)
-
-        self.category_list = QListWidget(self)
-        self.category_list.setDragEnabled(True)  # Permite "drag" na lista
-        left_layout.addLayout(category_layout)
-        category_layout.addWidget(self.category_list)  # Exibe as categorias
-
-        # Module Management
-        module_layout = QVBoxLayout()
-        self.add_module_btn = QPushButton("Incluir Módulo", self)
-        self.add_module_btn.clicked.connect(self.add_module)
-        module_layout.addWidget(self.add_module_btn)
-        
-
-        self.remove_module_btn = QPushButton("Excluir Módulo", self)
-        self.remove_module_btn.clicked.connect(self.remove_module)
-        module_layout.addWidget(self.remove_module_btn)
-        left_layout.addLayout(module_layout)
-
-        # Right Side (Store Layout Visualization)
-        self.scene = StoreLayoutScene(self)
-        self.view = StoreLayoutView(self.scene, self)
-        self.view.setAcceptDrops(True)
-        right_layout = QVBoxLayout()
-        right_layout.addWidget(self.view)
-
-        # Adding layouts to main layout
-        main_layout.addLayout(left_layout)
-        main_layout.addLayout(right_layout)
-
-        self.setLayout(main_layout)
-
-        # Adicionar a barra de menu
-        self.menu_bar = QMenuBar(self)
-        self.layout().setMenuBar(self.menu_bar)
-
-        # Adicionar menus
-        file_menu = self.menu_bar.addMenu("Arquivo")
-        edit_menu = self.menu_bar.addMenu("Editar")
-        view_menu = self.menu_bar.addMenu("Visualizar")  # Adicionar menu de visualização
-
-        # Adicionar ações ao menu Arquivo
-        get_layout_action = QAction("Obter Layout", self)
-        get_layout_action.triggered.connect(self.get_layout)
-        file_menu.addAction(get_layout_action)
-
-        save_layout_action = QAction("Salvar Layout", self)
-        save_layout_action.triggered.connect(self.save_layout)
-        file_menu.addAction(save_layout_action)
-
-        save_as_pdf_action = QAction("Salvar como PDF", self)
-        save_as_pdf_action.triggered.connect(self.save_as_pdf)
-        file_menu.addAction(save_as_pdf_action)
-
-        print_layout_action = QAction("Imprimir Layout", self)
-        print_layout_action.triggered.connect(self.print_layout)
-        file_menu.addAction(print_layout_action)
-
-        show_share_action = QAction("Exibir Share", self)
-        show_share_action.triggered.connect(self.show_layout_share)
-        file_menu.addAction(show_share_action)
-
-        save_as_json_action = QAction("Salvar como JSON", self)
-        save_as_json_action.triggered.connect(self.save_as_json)
-        file_menu.addAction(save_as_json_action)
-
-        load_from_json_action = QAction("Carregar do JSON", self)
-        load_from_json_action.triggered.connect(self.load_from_json)
-        file_menu.addAction(load_from_json_action)
-
-        # Adicionar ações ao menu Editar
-        resize_text_action = QAction("Redimensionar Texto", self)
-        resize_text_action.triggered.connect(self.resize_text)
-        edit_menu.addAction(resize_text_action)
-
-        rotate_text_action = QAction("Rotacionar Texto", self)
-        rotate_text_action.triggered.connect(self.rotate_text)
-        edit_menu.addAction(rotate_text_action)
-
-        resize_module_action = QAction("Redimensionar Módulo", self)
-        resize_module_action.triggered.connect(self.resize_module)
-        edit_menu.addAction(resize_module_action)
-
-        rotate_module_action = QAction("Rotacionar Módulo", self)
-        rotate_module_action.triggered.connect(self.rotate_module)
-        edit_menu.addAction(rotate_module_action)
-
-        group_modules_action = QAction("Agrupar Módulos", self)
-        group_modules_action.triggered.connect(self.group_modules)
-        edit_menu.addAction(group_modules_action)
-
-        ungroup_modules_action = QAction("Desagrupar Módulos", self)
-        ungroup_modules_action.triggered.connect(self.ungroup_modules)
-        edit_menu.addAction(ungroup_modules_action)
-
-        # Adicionar ações ao menu Visualizar
-        zoom_in_action = QAction("Aumentar Zoom", self)
-        zoom_in_action.triggered.connect(self.view.zoom_in)
-        view_menu.addAction(zoom_in_action)
-
-        zoom_out_action = QAction("Diminuir Zoom", self)
-        zoom_out_action.triggered.connect(self.view.zoom_out)
-        view_menu.addAction(zoom_out_action)
-
-    def create_store(self):
-        store_id = self.store_id_edit.text()
-        store_name = self.store_name_edit.text()
-        num_columns = self.num_columns_edit.text()
-        modules_per_column = self.modules_per_column_edit.text()
-
-        try:
-            num_columns = int(num_columns)
-            modules_per_column = int(modules_per_column)
-            response = requests.post(f"{self.API_URL}/store/", json={"id": int(store_id), "name": store_name, "num_columns": num_columns, "modules_per_column": modules_per_column})
-            response.raise_for_status()
-            print(response.json())
-            # Atualiza a interface
-            self.store_id = int(store_id)
-            self.num_columns = num_columns
-            self.modules_per_column = modules_per_column
-            self.categories = {}
-            self.category_list.clear()
-            self.modules = {}
-            self.category_colors = {}
-
-            self.draw_store_layout()
-
-        except requests.exceptions.RequestException as e:
-            print(f"Erro ao criar loja: {e}")
-        except ValueError:
-            print("Número de corredores e módulos por corredor devem ser inteiros.")
-
-    def add_category(self):
-        dialog = CategoryDialog(self)
-        result = dialog.exec_()
-        if result == QDialog.Accepted:
-            category_data = dialog.get_category_data()
-            try:
-                response = requests.post(f"{self.API_URL}/category/", json={"id": int(category_data['id']), "name": category_data['name']})
-                response.raise_for_status()
-                print(response.json())
-
-                cat_id = int(category_data['id'])
-                cat_name = category_data['name']
-                self.categories[cat_id] = cat_name
-                self.category_colors[cat_id] = "#{:06x}".format(random.randint(0, 0xFFFFFF))
-
-                item = DraggableCategory(cat_id, cat_name)  # Usando a classe DraggableCategory
-                self.category_list.addItem(item)
-            except requests.exceptions.RequestException as e:
-                print(f"Erro ao adicionar categoria: {e}")
-            except ValueError:
-                print("ID da categoria deve ser um inteiro.")
-
-    def draw_store_layout(self):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        # Limpa a cena
-        self.scene.clear()
-        self.modules = {}
-
-        # Desenha a grade
-        self.scene.draw_grid()
-
-        # Obtém o layout da API
-        try:
-            response = requests.get(f"{self.API_URL}/store-layout/{self.store_id}")
-            response.raise_for_status()
-            data = response.json()
-            self.update_layout_from_api(data)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Erro ao obter o layout: {e}")
-
-    def update_layout_from_api(self, data):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        # Limpa a cena atual
-        self.scene.clear()
-        self.modules = {}
-
-        # Desenha a grade
-        self.scene.draw_grid()
-
-        # Obtém as colunas da API
-        columns_data = data.get("columns", [])
-
-        # Configuração dos módulos
-        grid_size = 20
-
-        for column_index, column_data in enumerate(columns_data):
-            for module_data in column_data:
-                module = Module(**module_data)
-                rect = DraggableRect(module)
-                rect.setPos(module.x, module.y)  # Define a posição do retângulo
-                self.scene.addItem(rect)
-                self.modules[module.module_id] = rect
-
-                if module.category_id:
-                    color = self.category_colors.get(module.category_id, "gray")
-                    rect.setBrush(QBrush(QColor(color)))
-
-    def save_layout(self):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        # Converte o layout para o formato da API
-        columns_data = []
-        for column_index in range(self.num_columns):
-            column = []
-            for module_id, rect in self.modules.items():
-                module = rect.module
-                column.append(module)
-            columns_data.append(column)
-
-        layout_data = StoreLayoutData(store_id=self.store_id, columns=columns_data)
-
-        try:
-            response = requests.put(f"{self.API_URL}/store-layout/{self.store_id}", json=layout_data.dict())
-            response.raise_for_status()
-            print(response.json())
-        except requests.exceptions.RequestException as e:
-            print(f"Erro ao salvar o layout: {e}")
-
-    def show_layout_share(self):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        try:
-            response = requests.get(f"{self.API_URL}/store-layout/{self.store_id}/share")
-            response.raise_for_status()
-            share_data = response.json()
-
-            message = "Participação das Categorias:\n"
-            for cat_id, share in share_data.items():
-                cat_name = self.categories.get(cat_id, "Desconhecido")
-                message += f"{cat_name} ({cat_id}): {share:.2f}%\n"
-
-            msg_box = QMessageBox()
-            msg_box.setWindowTitle("Share do Layout")
-            msg_box.setText(message)
-            msg_box.exec_()
-
-        except requests.exceptions.RequestException as e:
-            print(f"Erro ao obter o share do layout: {e}")
-
-    def get_layout(self):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        try:
-            response = requests.get(f"{self.API_URL}/store-layout/{self.store_id}")
-            response.raise_for_status()
-            data = response.json()
-            self.update_layout_from_api(data)
-        except requests.exceptions.RequestException as e:
-            print(f"Erro ao obter o layout: {e}")
-
-    # Métodos para redimensionar e rotacionar o texto
-    def resize_text(self):
-        try:
-            size, ok = QInputDialog.getInt(self, "Redimensionar Texto", "Novo Tamanho:", min=1, max=100)
-            if ok:
-                for rect in self.scene.selectedItems():
-                    if isinstance(rect, DraggableRect):
-                        rect.text_item.setFont(QFont("Arial", size))
-                        rect.center_text()
-        except Exception as e:
-            print(f"Erro ao redimensionar texto: {e}")
-
-    def rotate_text(self):
-        angle, ok = QInputDialog.getInt(self, "Rotacionar Texto", "Novo Ângulo:", min=0, max=360)
-        if ok:
-            for rect in self.scene.selectedItems():
-                if isinstance(rect, DraggableRect):
-                    rect.rotate_text(angle)
-
-    def resize_module(self):
-        width, ok_width = QInputDialog.getInt(self, "Redimensionar Módulo", "Nova Largura:", min=10, max=200)
-        if not ok_width:
-            return
-
-        height, ok_height = QInputDialog.getInt(self, "Redimensionar Módulo", "Nova Altura:", min=10, max=200)
-        if not ok_height:
-            return
-
-        for rect in self.scene.selectedItems():
-            if isinstance(rect, DraggableRect):
-                rect.prepareGeometryChange()
-                rect.setRect(rect.rect().x(), rect.rect().y(), width, height)
-                rect.module.width = width
-                rect.module.height = height
-                rect.center_text()
-
-    def rotate_module(self):
-        angle, ok = QInputDialog.getInt(self, "Rotacionar Módulo", "Novo Ângulo:", min=0, max=360)
-        if ok:
-            for rect in self.scene.selectedItems():
-                if isinstance(rect, DraggableRect):
-                    rect.setRotation(angle)
-                    rect.module.rotation = angle
-
-    def group_modules(self):
-        selected_items = self.scene.selectedItems()
-        if len(selected_items) > 1:
-            group = QGraphicsItemGroup()
-            for item in selected_items:
-                if isinstance(item, DraggableRect):
-                    group.addToGroup(item)
-            self.scene.addItem(group)
-
-    def ungroup_modules(self):
-        selected_items = self.scene.selectedItems()
-        for item in selected_items:
-            if isinstance(item, QGraphicsItemGroup):
-                for child in item.childItems():
-                    item.removeFromGroup(child)
-                self.scene.removeItem(item)
-
-    def add_module(self):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        # Adiciona um novo módulo na primeira coluna e na primeira linha disponível
-        column_index = 0
-        row_index = len(self.modules) // self.num_columns
-        module_id = len(self.modules)
-        module_width = 60  # Largura do módulo inicial
-        module_height = 40  # Altura do módulo inicial
-        grid_size = 20
-
-        module = Module(
-            module_id=module_id,
-            column=column_index,
-            row=row_index,
-            x=column_index * (module_width + grid_size),
-            y=row_index * (module_height + grid_size),
-            name=f"Module {module_id}",
-            width=module_width,
-            height=module_height
-        )
-        self.modules[module_id] = module
-
-        rect = DraggableRect(module)
-        rect.setPos(module.x, module.y)  # Define a posição do retângulo
-        self.scene.addItem(rect)
-
-    def remove_module(self):
-        selected_items = self.scene.selectedItems()
-        for item in selected_items:
-            if isinstance(item, DraggableRect):
-                module_id = item.module.module_id
-                self.scene.removeItem(item)
-                del self.modules[module_id]
-
-    def save_as_pdf(self):
-        printer = QPrinter(QPrinter.HighResolution)
-        printer.setOutputFormat(QPrinter.PdfFormat)
-        printer.setOutputFileName("store_layout.pdf")
-
-        painter = QPainter(printer)
-        self.view.render(painter)
-        painter.end()
-
-        print("Layout salvo como PDF.")
-
-    def print_layout(self):
-        printer = QPrinter(QPrinter.HighResolution)
-        print_dialog = QPrintDialog(printer, self)
-
-        if print_dialog.exec_() == QPrintDialog.Accepted:
-            painter = QPainter(printer)
-            self.view.render(painter)
-            painter.end()
-
-            print("Layout enviado para impressão.")
-
-    def save_as_json(self):
-        if not self.store_id:
-            print("Crie uma loja primeiro.")
-            return
-
-        # Abre um diálogo para escolher o nome e o diretório do arquivo
-        options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getSaveFileName(self, "Salvar Layout como JSON", "", "JSON Files (*.json);;All Files (*)", options=options)
-        if not file_name:
-            return
-
-        # Converte o layout para o formato da API
-        columns_data = [[] for _ in range(self.num_columns)]
-        for module_id, rect in self.modules.items():
-            module = rect.module
-            columns_data[module.column].append(module.dict())
-
-        layout_data = StoreLayoutData(store_id=self.store_id, columns=columns_data)
-
-        with open(file_name, "w") as json_file:
-            json.dump(layout_data.dict(), json_file, indent=4)
-
-        print(f"Layout salvo como JSON em {file_name}.")
-
-    def load_from_json(self):
-        # Abre um diálogo para escolher o arquivo JSON
-        options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getOpenFileName(self, "Carregar Layout do JSON", "", "JSON Files (*.json);;All Files (*)", options=options)
-        if not file_name:
-            return
-
-        try:
-            with open(file_name, "r") as json_file:
-                layout_data = json.load(json_file)
-                store_id = layout_data['store_id']
-                num_columns = len(layout_data['columns'])
-                modules_per_column = max(len(column) for column in layout_data['columns'])
-
-                # Cria a loja automaticamente se não existir
-                if store_id not in stores:
-                    store = Store(id=store_id, name=f"Loja {store_id}", num_columns=num_columns, modules_per_column=modules_per_column)
-                    stores[store_id] = store
-                    store_layouts[store_id] = layout_data
-
-                # Atualiza a interface do usuário
-                self.store_id = store_id
-                self.num_columns = num_columns
-                self.modules_per_column = modules_per_column
-                self.update_layout_from_api(layout_data)
-                print(f"Layout carregado do JSON de {file_name}.")
-        except FileNotFoundError:
-            print("Arquivo JSON não encontrado.")
-        except json.JSONDecodeError:
-            print("Erro ao decodificar o arquivo JSON.")
-        except Exception as e:
-            print(f"Erro ao carregar layout do JSON: {e}")
-
-    def snap_selected_items_to_grid(self):
-        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
-        selected_items = self.scene.selectedItems()
-        if not selected_items:
-            return
-
-        for item in selected_items:
-            if isinstance(item, DraggableRect):
-                item.snap_to_grid()
-
-    def mouseReleaseEvent(self, event):
-        super().mouseReleaseEvent(event)
-        self.snap_selected_items_to_grid()
-
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    store_layout = StoreLayoutApp()
-    store_layout.setWindowTitle("Store Layout")
-    store_layout.setGeometry(100, 100, 1000, 700)
-    store_layout.show()
-    sys.exit(app.exec_())
-    
-print("Fim do código")
+import sys
+from layout_startup import profile as startup_profile
+
+with startup_profile.section("import PyQt5"):
+    from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout,
+                                 QHBoxLayout, QPushButton, QLineEdit, QListWidget,
+                                 QGraphicsScene, QGraphicsView, QGraphicsRectItem,
+                                 QDialog, QFormLayout, QDialogButtonBox, QGraphicsTextItem,
+                                 QInputDialog, QMessageBox, QGraphicsItemGroup, QMenuBar, QMenu, QAction, QFileDialog,
+                                 QProgressDialog, QStyleOptionGraphicsItem, QGraphicsItem)  # Import QInputDialog para editar o nome
+    from PyQt5.QtCore import Qt, QRect, QRectF, QLineF, QPointF, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+    from PyQt5.QtGui import (QBrush, QColor, QFont, QPen, QDrag, QPixmap, QPainter, QTextOption, QStaticText, QTransform,
+                             QPolygonF, QKeySequence)
+    from PyQt5.QtWidgets import QListWidgetItem
+    from PyQt5.QtCore import QMimeData
+import random
+import os
+import threading
+import time
+import json
+import uuid
+from collections import OrderedDict
+# QtPrintSupport, requests, layout_export e o servidor são importados só quando usados
+with startup_profile.section("import modelos (pydantic)"):
+    from layout_models import Module, Store, columnar_to_layout, layout_to_columnar
+with startup_profile.section("import módulos do layout"):
+    from layout_io import iter_layout_json, write_layout_json
+    from layout_spatial import SpatialIndex
+    from layout_undo import ChangeSet, EditCommand, ModuleDelta, UndoStack, delta_from_op, update_module
+    from layout_diagnostics import diagnostics
+
+API_URL = os.environ.get("LAYOUT_API_URL", "http://127.0.0.1:8000")
+GRID_TILE_MAX_CELLS = 64  # Células testadas até achar um tile com tamanho inteiro em pixels
+GRID_TILE_MIN_SIZE = 256  # Tiles menores são repetidos até este tamanho
+GRID_TILE_MAX_SIZE = 2048
+
+def start_local_server(host="127.0.0.1", port=8000):
+    """Sobe o backend em uma thread deste processo (opção --server do editor)."""
+    import threading
+    from layout_server import run_server
+    threading.Thread(target=run_server, args=(host, port), daemon=True).start()
+
+# PyQt5 Frontend
+class CategoryDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Adicionar Categoria")
+        layout = QFormLayout(self)
+
+        self.id_edit = QLineEdit(self)
+        self.name_edit = QLineEdit(self)
+
+        layout.addRow("ID:", self.id_edit)
+        layout.addRow("Nome:", self.name_edit)
+
+        self.buttons = QDialogButtonBox(
+            QDialogButtonBox.Ok | QDialogButtonBox.Cancel,
+            Qt.Horizontal, self)
+        layout.addWidget(self.buttons)
+
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+
+    def get_category_data(self):
+        return {"id": self.id_edit.text(), "name": self.name_edit.text()}
+
+class DraggableRect(QGraphicsRectItem):
+    conflict_pen = QPen(QColor("red"), 2)  # Contorno dos módulos com problema de posicionamento
+    use_static_labels = False  # Modo de rótulo dos novos módulos (ver set_static_label)
+    label_min_pixel_size = 4  # Tamanho mínimo do texto na tela para o rótulo ser pintado
+
+    def __init__(self, module: Module):
+        super().__init__(module.x, module.y, module.width, module.height)
+        self.module = module
+        self.setRect(0, 0, module.width, module.height)  # Define o tamanho do retângulo
+        self.setFlag(QGraphicsRectItem.ItemIsMovable)
+        self.setFlag(QGraphicsRectItem.ItemIsSelectable)
+        self.setAcceptHoverEvents(True)
+        self.setAcceptDrops(True)  # Aceita drops
+        self.setBrush(QBrush(QColor("white")))
+        self.label_text = module.name
+        self.label_font = QFont("Arial", 8)
+        self.label_rotation = 0
+        self.text_item = None  # Rótulo como QGraphicsTextItem filho (modo padrão)
+        self.static_text = None  # Rótulo pintado em paint() a partir de um QStaticText (modo rápido)
+        self.label_pos = QPointF()
+        self.set_static_label(self.use_static_labels)
+        self.in_conflict = False
+
+    def set_static_label(self, enabled):
+        """
+        Alterna o rótulo entre o QGraphicsTextItem filho e o QStaticText em cache.
+
+        No modo rápido o item também usa DeviceCoordinateCache e o rótulo
+        deixa de ser pintado quando fica pequeno demais para ser lido.
+        """
+        if enabled:
+            if self.text_item is not None:
+                self.text_item.setParentItem(None)
+                if self.text_item.scene() is not None:
+                    self.text_item.scene().removeItem(self.text_item)
+                self.text_item = None
+            self.static_text = QStaticText()
+            self.static_text.setTextFormat(Qt.PlainText)
+            text_option = QTextOption()
+            text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+            text_option.setAlignment(Qt.AlignHCenter)
+            self.static_text.setTextOption(text_option)
+            self.setCacheMode(QGraphicsRectItem.DeviceCoordinateCache)
+        else:
+            self.static_text = None
+            if self.text_item is None:
+                self.text_item = QGraphicsTextItem(self.label_text, self)  # Texto
+                self.text_item.setFont(self.label_font)
+                self.text_item.setRotation(self.label_rotation)
+                self.text_item.setDefaultTextColor(QColor("black"))
+                text_option = QTextOption()
+                text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+                self.text_item.document().setDefaultTextOption(text_option)
+            self.setCacheMode(QGraphicsRectItem.NoCache)
+        self.center_text()
+        self.update()
+
+    def itemChange(self, change, value):
+        # Só é chamado para a posição quando a checagem de posicionamento liga ItemSendsGeometryChanges
+        if change == QGraphicsRectItem.ItemPositionHasChanged:
+            scene = self.scene()
+            if scene is not None:
+                scene.module_moved(self)
+        return super().itemChange(change, value)
+
+    def set_conflict(self, in_conflict):
+        if in_conflict != self.in_conflict:
+            self.in_conflict = in_conflict
+            self.setPen(self.conflict_pen if in_conflict else QPen())
+
+    def mousePressEvent(self, event):
+        self.setSelected(True)
+        super().mousePressEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        # Abre uma caixa de diálogo para editar o nome
+        view = self.scene().views()[0]  # Obtém a primeira view associada à cena
+        parent_widget = view.parent()  # Pega o widget pai correto
+        new_name, ok = QInputDialog.getText(parent_widget, "Editar Nome do Módulo", "Novo Nome:", QLineEdit.Normal, self.module.name)
+
+        if ok and new_name:
+            delta = update_module(self.module, {"name": new_name})  # Atualiza o nome no objeto Module
+            self.set_label_text(new_name)  # Atualiza o texto
+            self.scene().record_edit("Renomear Módulo", [delta])
+            print(f"Nome do módulo {self.module.module_id} alterado para: {new_name}")
+
+    def set_label_text(self, text):
+        self.label_text = text
+        if self.text_item is not None:
+            self.text_item.setPlainText(text)
+        self.center_text()
+
+    def set_label_font(self, font):
+        self.label_font = font
+        if self.text_item is not None:
+            self.text_item.setFont(font)
+        self.center_text()
+
+    def rotate_text(self, angle):
+        self.label_rotation = angle
+        if self.text_item is not None:
+            self.text_item.setRotation(angle)
+        self.update()
+
+    @diagnostics.timed
+    def center_text(self):
+        """
+        Recalcula as métricas e a posição do rótulo.
+
+        O rótulo acompanha o retângulo, então isso só é necessário quando o
+        nome, a fonte ou o tamanho do módulo mudam, e não a cada movimento.
+        """
+        rect = self.rect()
+        if self.static_text is not None:
+            self.static_text.setText(self.label_text)
+            self.static_text.setTextWidth(rect.width())
+            self.static_text.prepare(QTransform(), self.label_font)
+            text_size = self.static_text.size()
+            self.label_pos = QPointF(rect.left() + (rect.width() - text_size.width()) / 2,
+                                     rect.top() + (rect.height() - text_size.height()) / 2)
+            self.update()
+            return
+
+        self.text_item.setTextWidth(rect.width())
+        text_rect = self.text_item.boundingRect()
+        x = rect.left() + (rect.width() - text_rect.width()) / 2
+        y = rect.top() + (rect.height() - text_rect.height()) / 2
+        self.text_item.setPos(x, y)
+        self.text_item.setTransformOriginPoint(text_rect.center())
+
+    def paint(self, painter, option, widget=None):
+        super().paint(painter, option, widget)
+        if self.static_text is None:
+            return
+
+        # Abaixo do limite de zoom o texto ficaria ilegível; pula o rótulo
+        level_of_detail = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        if level_of_detail * self.label_font.pointSizeF() < self.label_min_pixel_size:
+            return
+
+        painter.save()
+        painter.setFont(self.label_font)
+        painter.setPen(QColor("black"))
+        if self.label_rotation:
+            center = self.rect().center()
+            painter.translate(center)
+            painter.rotate(self.label_rotation)
+            painter.translate(-center)
+        painter.drawStaticText(self.label_pos, self.static_text)
+        painter.restore()
+
+    def snap_to_grid(self):
+        """Alinha o retângulo à grade e retorna o ModuleDelta da mudança (ou None)."""
+        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
+        x = round(self.x() / grid_size) * grid_size
+        y = round(self.y() / grid_size) * grid_size
+        self.setPos(x, y)
+        return update_module(self.module, {"x": x, "y": y})
+
+class StoreLayoutScene(QGraphicsScene):
+    module_edited = pyqtSignal(str, object)  # Nome da ação e lista de ModuleDelta
+    grid_size = 20  # Tamanho base da grade em pixels
+    min_grid_spacing = 8  # Espaçamento mínimo (em pixels de tela) entre linhas desenhadas
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSceneRect(QRectF(0, 0, 6000, 5500))  # Aumenta o espaço útil
+        self.grid_pen = QPen(QColor(200, 200, 200))  # Cor da grade
+        self.grid_pen.setCosmetic(True)  # Linha de 1px independente do zoom
+        self.use_grid_tile = False  # Usa um tile pré-renderizado em vez de desenhar linhas
+        self._grid_tiles = {}
+        self.placement_index = None  # SpatialIndex, quando a checagem durante o arraste está ligada
+        self.aisle_width = 0
+        self.placement_items = {}  # module_id -> DraggableRect registrado no índice
+        self.placement_conflicts = {}  # module_id -> IDs dos módulos em conflito com ele
+
+    @diagnostics.timed
+    def record_edit(self, label, deltas):
+        # Publica uma ação do usuário; todos os módulos afetados formam uma única entrada do histórico
+        deltas = [delta for delta in deltas if delta is not None]
+        if deltas:
+            self.module_edited.emit(label, deltas)
+
+    def clear(self):
+        super().clear()
+        self.placement_items = {}
+        self.placement_conflicts = {}
+        if self.placement_index is not None:
+            self.placement_index = SpatialIndex()
+
+    def set_static_labels(self, enabled):
+        # Vale para os módulos existentes e para os criados depois
+        DraggableRect.use_static_labels = enabled
+        for item in self.items():
+            if isinstance(item, DraggableRect):
+                item.set_static_label(enabled)
+
+    def set_placement_check(self, enabled, aisle_width=0):
+        """
+        Liga ou desliga a checagem de sobreposição e corredor durante o arraste.
+
+        Cada movimento atualiza só a entrada do módulo no índice espacial e o
+        compara com os vizinhos, sem varrer a cena inteira.
+        """
+        for rect in self.placement_items.values():
+            rect.set_conflict(False)
+        self.placement_items = {}
+        self.placement_conflicts = {}
+        self.placement_index = SpatialIndex() if enabled else None
+        self.aisle_width = aisle_width
+        for item in self.items():
+            if isinstance(item, DraggableRect):
+                item.setFlag(QGraphicsRectItem.ItemSendsGeometryChanges, enabled)
+                self.track_module(item)
+
+    def track_module(self, rect):
+        if self.placement_index is None:
+            return
+        rect.setFlag(QGraphicsRectItem.ItemSendsGeometryChanges)
+        self.placement_items[rect.module.module_id] = rect
+        self.module_moved(rect)
+
+    def untrack_module(self, rect):
+        if self.placement_index is None:
+            return
+        module_id = rect.module.module_id
+        self.placement_index.remove(module_id)
+        self.placement_items.pop(module_id, None)
+        self._set_conflicts(module_id, set())
+
+    @diagnostics.timed
+    def module_moved(self, rect):
+        if self.placement_index is None or rect.module.module_id not in self.placement_items:
+            return
+        module = rect.module
+        self.placement_index.update(module.module_id, rect.x(), rect.y(), module.width, module.height,
+                                    rect.rotation(), module.column)
+        overlaps, aisles = self.placement_index.conflicts(module.module_id, self.aisle_width)
+        self._set_conflicts(module.module_id, overlaps | set(aisles))
+
+    def _set_conflicts(self, module_id, partners):
+        # Atualiza os conflitos do módulo e dos vizinhos que entraram ou saíram da lista
+        old = self.placement_conflicts.pop(module_id, set())
+        if partners:
+            self.placement_conflicts[module_id] = partners
+        for other_id in old - partners:
+            others = self.placement_conflicts.get(other_id)
+            if others is not None:
+                others.discard(module_id)
+                if not others:
+                    del self.placement_conflicts[other_id]
+        for other_id in partners - old:
+            self.placement_conflicts.setdefault(other_id, set()).add(module_id)
+        for changed_id in (old ^ partners) | {module_id}:
+            rect = self.placement_items.get(changed_id)
+            if rect is not None:
+                rect.set_conflict(changed_id in self.placement_conflicts)
+
+    def draw_grid(self):
+        """
+        Solicita o redesenho da grade.
+
+        A grade não é mais composta por itens da cena: ela é pintada em
+        drawBackground apenas na área exposta, então basta invalidar a
+        camada de fundo.
+        """
+        self.invalidate(self.sceneRect(), QGraphicsScene.BackgroundLayer)
+
+    def set_grid_tile_enabled(self, enabled):
+        self.use_grid_tile = enabled
+        self._grid_tiles = {}
+        self.draw_grid()
+
+    def grid_step_for_scale(self, scale):
+        # Dobra o passo da grade até que as linhas fiquem legíveis no zoom atual
+        step = self.grid_size
+        while scale > 0 and step * scale < self.min_grid_spacing:
+            step *= 2
+        return step
+
+    def drawBackground(self, painter, rect):
+        super().drawBackground(painter, rect)
+
+        exposed = rect.intersected(self.sceneRect())
+        if exposed.isEmpty():
+            return
+
+        step = self.grid_step_for_scale(painter.worldTransform().m11())
+        left = int(exposed.left()) - int(exposed.left()) % step
+        top = int(exposed.top()) - int(exposed.top()) % step
+
+        if self.use_grid_tile and self.draw_grid_tile(painter, exposed, left, top, step):
+            return
+
+        painter.setPen(self.grid_pen)
+        lines = [QLineF(x, exposed.top(), x, exposed.bottom())
+                 for x in range(left, int(exposed.right()) + 1, step)]
+        lines.extend(QLineF(exposed.left(), y, exposed.right(), y)
+                     for y in range(top, int(exposed.bottom()) + 1, step))
+        painter.drawLines(lines)
+
+    def draw_grid_tile(self, painter, exposed, left, top, step):
+        """
+        Desenha a grade com o tile, em pixels do dispositivo e sem a escala do zoom.
+
+        Returns:
+            bool: False se não há tile para a transformação atual (rotação, ou células
+            que nunca fecham um número inteiro de pixels); aí a grade vai por linhas.
+        """
+        transform = painter.worldTransform()
+        if transform.isRotating() or transform.m11() != transform.m22():
+            return False
+        ratio = painter.device().devicePixelRatioF()
+        tile = self.grid_tile(step * transform.m11() * ratio)
+        if tile is None:
+            return False
+        tile.setDevicePixelRatio(ratio)
+        # O tile começa sempre numa linha da grade, arredondada para o pixel mais próximo
+        origin = transform.map(QPointF(left, top))
+        corner = transform.map(exposed.bottomRight())
+        x, y = round(origin.x() * ratio) / ratio, round(origin.y() * ratio) / ratio
+        painter.save()
+        painter.resetTransform()
+        painter.drawTiledPixmap(QRectF(x, y, corner.x() - x, corner.y() - y), tile)
+        painter.restore()
+        return True
+
+    def grid_tile(self, cell):
+        """
+        Tile da grade com linhas de 1 pixel para células de `cell` pixels do dispositivo.
+
+        O tile cobre células suficientes para somar um número inteiro de pixels; assim
+        as linhas não se deslocam de um tile para o outro.
+
+        Returns:
+            QPixmap | None: None se nenhum tamanho razoável fecha em pixels inteiros.
+        """
+        key = round(cell, 6)
+        if key not in self._grid_tiles:
+            cells = next((count for count in range(1, GRID_TILE_MAX_CELLS + 1)
+                          if abs(count * cell - round(count * cell)) < 0.01), None)
+            tile = None
+            if cells is not None and round(cells * cell) <= GRID_TILE_MAX_SIZE:
+                period = round(cells * cell)
+                size = period * max(1, GRID_TILE_MIN_SIZE // period)
+                tile = QPixmap(size, size)
+                tile.fill(Qt.transparent)
+                tile_painter = QPainter(tile)
+                tile_painter.setPen(QPen(self.grid_pen.color(), 1))
+                offsets = [start + round(index * cell) for start in range(0, size, period) for index in range(cells)]
+                for offset in offsets:
+                    tile_painter.drawLine(offset, 0, offset, size)
+                    tile_painter.drawLine(0, offset, size, offset)
+                tile_painter.end()
+            if len(self._grid_tiles) >= 16:  # Um tile por nível de zoom visitado
+                self._grid_tiles.clear()
+            self._grid_tiles[key] = tile
+        return self._grid_tiles[key]
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        self.snap_selected_items_to_grid()
+
+    @diagnostics.timed
+    def snap_selected_items_to_grid(self):
+        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
+        selected_items = self.selectedItems()
+        if not selected_items:
+            return
+
+        deltas = []
+        for item in selected_items:
+            if isinstance(item, QGraphicsItemGroup):
+                for child in item.childItems():
+                    if isinstance(child, DraggableRect):
+                        deltas.append(child.snap_to_grid())
+            elif isinstance(item, DraggableRect):
+                deltas.append(item.snap_to_grid())
+        self.record_edit("Mover Módulos", deltas)
+
+class StoreLayoutView(QGraphicsView):
+    viewport_changed = pyqtSignal()  # Rolagem, zoom ou redimensionamento da área visível
+
+    def __init__(self, scene: StoreLayoutScene, parent=None):
+        super().__init__(scene, parent)
+        self.setDragMode(QGraphicsView.RubberBandDrag)
+        self.setScene(scene)
+        self.setRenderHint(QPainter.Antialiasing)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setResizeAnchor(QGraphicsView.AnchorUnderMouse)
+        # Mantém o fundo (grade) em cache durante a rolagem
+        self.setCacheMode(QGraphicsView.CacheBackground)
+        self.overlay_rect = QRect()  # Área do resumo do diagnóstico, em coordenadas do viewport
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.setInterval(250)
+        self.overlay_timer.timeout.connect(lambda: self.viewport().update(self.overlay_rect))
+
+    def set_diagnostics_overlay(self, enabled):
+        if enabled:
+            self.overlay_timer.start()
+        else:
+            self.overlay_timer.stop()
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        if not diagnostics.enabled:
+            super().paintEvent(event)
+            return
+        started = time.perf_counter()
+        super().paintEvent(event)
+        duration = time.perf_counter() - started
+        if not self.overlay_rect.contains(event.rect()):  # Os repaints só do resumo não contam como quadro
+            diagnostics.record_frame(started, duration, len(self.items(self.viewport().rect())))
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if not diagnostics.enabled:
+            return
+        # Resumo do diagnóstico no canto da área visível, fora da transformação da cena
+        lines = diagnostics.overlay_lines()
+        painter.save()
+        painter.resetTransform()
+        painter.setFont(QFont("Monospace", 9))
+        metrics = painter.fontMetrics()
+        self.overlay_rect = QRect(4, 4, max(metrics.horizontalAdvance(line) for line in lines) + 12,
+                                  metrics.height() * len(lines) + 8)
+        painter.fillRect(self.overlay_rect, QColor(0, 0, 0, 170))
+        painter.setPen(QColor("white"))
+        for i, line in enumerate(lines):
+            painter.drawText(10, 8 + metrics.ascent() + i * metrics.height(), line)
+        painter.restore()
+
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.viewport_changed.emit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.viewport_changed.emit()
+
+    def visible_scene_rect(self):
+        return self.mapToScene(self.viewport().rect()).boundingRect()
+
+    def wheelEvent(self, event):
+        zoom_in_factor = 1.25
+        zoom_out_factor = 1 / zoom_in_factor
+
+        if event.angleDelta().y() > 0:
+            zoom_factor = zoom_in_factor
+        else:
+            zoom_factor = zoom_out_factor
+
+        self.scale(zoom_factor, zoom_factor)
+        self.viewport_changed.emit()
+
+    def zoom_in(self):
+        self.scale(1.25, 1.25)
+        self.viewport_changed.emit()
+
+    def zoom_out(self):
+        self.scale(0.8, 0.8)
+        self.viewport_changed.emit()
+
+class ModulePlaceholderItem(QGraphicsItem):
+    """
+    Desenha, em um único item, os módulos sem DraggableRect no modo virtualizado.
+
+    Os módulos da área exposta são buscados no índice espacial, então o
+    custo de cada repintura depende só do que está na tela.
+    """
+    pen = QPen(QColor(160, 160, 160))
+    pen.setCosmetic(True)
+    brush = QBrush(QColor(235, 235, 235))
+
+    def __init__(self, models, index, materialized, bounds):
+        super().__init__()
+        self.models = models  # module_id -> Module
+        self.index = index  # SpatialIndex com a posição dos módulos
+        self.materialized = materialized  # module_id -> DraggableRect já criado
+        self.bounds = QRectF(bounds)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.setAcceptedMouseButtons(Qt.NoButton)
+        self.setZValue(-1)
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        rects, polygons = [], []
+        for module_id in self.index.candidates((exposed.left(), exposed.top(), exposed.right(), exposed.bottom())):
+            module = self.models.get(module_id)
+            if module is None or module_id in self.materialized:
+                continue
+            if module.rotation % 360:
+                polygons.append(QPolygonF([QPointF(x, y) for x, y in self.index.entries[module_id].corners]))
+            else:
+                rects.append(QRectF(module.x, module.y, module.width, module.height))
+
+        painter.setPen(self.pen)
+        painter.setBrush(self.brush)
+        if rects:
+            painter.drawRects(rects)
+        for polygon in polygons:
+            painter.drawPolygon(polygon)
+
+class ChunkedTask(QObject):
+    """
+    Executa os passos de um iterador no event loop, em fatias de tempo limitado.
+
+    Entre uma fatia e outra o Qt processa a fila de eventos (pintura, mouse),
+    então a interface continua respondendo durante tarefas longas.
+    """
+    progress = pyqtSignal(int)  # Passos executados até agora
+    finished = pyqtSignal(bool)  # True se terminou, False se foi cancelada
+
+    def __init__(self, steps, time_slice=0.015, parent=None):
+        super().__init__(parent)
+        self.steps = iter(steps)
+        self.time_slice = time_slice
+        self.done = 0
+        self.running = False
+
+    def start(self):
+        self.running = True
+        QTimer.singleShot(0, self._run_slice)
+
+    def cancel(self):
+        if self.running:
+            self.running = False
+            self.finished.emit(False)
+
+    @diagnostics.timed
+    def _run_slice(self):
+        if not self.running:
+            return
+        deadline = time.perf_counter() + self.time_slice
+        for _ in self.steps:
+            self.done += 1
+            if time.perf_counter() >= deadline:
+                break
+        else:
+            self.running = False
+            self.progress.emit(self.done)
+            self.finished.emit(True)
+            return
+        self.progress.emit(self.done)
+        QTimer.singleShot(0, self._run_slice)
+
+class DraggableCategory(QListWidgetItem):
+    def __init__(self, category_id, category_name, parent=None):
+        super().__init__(f"{category_name} ({category_id})", parent)
+        self.category_id = category_id
+        self.category_name = category_name
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() == Qt.LeftButton:
+            drag = QDrag(event.widget())
+            mimeData = QMimeData()
+            mimeData.setText(str(self.category_id)) # Passa o ID como texto
+            mimeData.setData("application/x-category", str(self.category_id).encode())  # Para identificar o tipo
+            pixmap = QPixmap(self.listWidget().visualItemRect(self).size())
+            painter = QPainter(pixmap)
+            painter.fillRect(pixmap.rect(), QColor("lightgray"))  # Cor de fundo do item
+            painter.drawText(pixmap.rect(), Qt.AlignCenter, self.text())  # Desenha o texto
+            painter.end()
+            drag.setPixmap(pixmap)
+            drag.setHotSpot(event.pos() - self.listWidget().visualItemRect(self).topLeft())
+            drag.exec_(Qt.CopyAction | Qt.MoveAction)
+
+class ApiSignals(QObject):
+    # Emitidos pela thread de trabalho e entregues na thread da interface
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+class ApiRequest(QRunnable):
+    def __init__(self, client, method, path, kwargs, on_success, on_error, parse, channel, cache=False):
+        super().__init__()
+        self.client = client
+        self.method = method
+        self.path = path
+        self.kwargs = kwargs
+        self.on_success = on_success
+        self.on_error = on_error
+        self.parse = parse
+        self.channel = channel
+        self.cache = cache
+        self.generation = client.generations.get(channel, 0)
+
+    def run(self):
+        try:
+            kwargs = dict(self.kwargs)
+            cached = self.client.cached_response(self.path) if self.cache else None
+            if cached is not None:
+                kwargs["headers"] = {**kwargs.get("headers", {}), "If-None-Match": cached[0]}
+            with diagnostics.measure(f"api {self.method} {self.path}"):
+                response = self.client.session.request(self.method, f"{self.client.base_url}{self.path}",
+                                                       timeout=self.client.timeout, **kwargs)
+            if cached is not None and response.status_code == 304:
+                result = cached[1]  # Não mudou: reaproveita a resposta já convertida
+            else:
+                response.raise_for_status()
+                result = response.json()
+                if self.parse is not None:
+                    result = self.parse(result)  # Conversões pesadas também ficam fora da thread da interface
+                if self.cache and response.headers.get("ETag"):
+                    self.client.cache_response(self.path, response.headers["ETag"], result)
+        except Exception as e:
+            self._emit("failed", e)
+        else:
+            self._emit("finished", result)
+
+    def _emit(self, signal_name, value):
+        try:
+            getattr(self.client.signals, signal_name).emit(self, value)
+        except RuntimeError:
+            pass  # O ApiClient já foi destruído (editor fechado); ninguém espera mais o resultado
+
+class ApiClient(QObject):
+    """
+    Acesso à API em threads de trabalho, sem travar a interface.
+
+    Usa uma única Session com conexões keep-alive, timeout e novas tentativas.
+    Os resultados voltam para a thread da interface por sinais. Cada
+    requisição pertence a um canal; cancel(canal) descarta as respostas
+    pendentes daquele canal (ex.: o layout de uma loja que não está mais aberta).
+
+    Requisições com cache=True guardam a resposta junto com o ETag e, nas
+    seguintes, mandam If-None-Match; um 304 devolve a resposta guardada.
+    """
+
+    def __init__(self, base_url, timeout=(3.05, 30), retries=3, max_workers=4, cache_size=4, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.response_cache = OrderedDict()  # path -> (ETag, resposta convertida), do menos para o mais recente
+        self.cache_lock = threading.Lock()
+        self.retries = retries
+        self.max_workers = max_workers
+        self.generations = {}  # canal -> geração atual; respostas de gerações antigas são descartadas
+        self.closed = False  # Depois de shutdown() nenhuma resposta é entregue
+        self.session = None  # Criada na primeira requisição; requests não entra no tempo de abertura
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.signals = ApiSignals()
+        self.signals.finished.connect(self._deliver)
+        self.signals.failed.connect(self._fail)
+
+    def request(self, method, path, on_success=None, on_error=None, parse=None, channel=None, cache=False, **kwargs):
+        """
+        Agenda uma requisição.
+
+        Args:
+            method (str): Método HTTP.
+            path (str): Caminho relativo a base_url.
+            on_success (callable): Recebe o JSON da resposta (ou o resultado de `parse`).
+            on_error (callable): Recebe a exceção.
+            parse (callable): Conversão executada na thread de trabalho.
+            channel (str): Canal usado por cancel().
+            cache (bool): Revalida com If-None-Match uma resposta já guardada (só para GET).
+            **kwargs: Repassados para Session.request (json, params, ...).
+        """
+        if self.session is None:
+            self.session = self._create_session()
+        self.pool.start(ApiRequest(self, method, path, kwargs, on_success, on_error, parse, channel, cache))
+
+    def cached_response(self, path):
+        with self.cache_lock:
+            return self.response_cache.get(path)
+
+    def cache_response(self, path, etag, result):
+        # Chamado pelas threads de trabalho
+        with self.cache_lock:
+            self.response_cache[path] = (etag, result)
+            self.response_cache.move_to_end(path)
+            while len(self.response_cache) > self.cache_size:
+                self.response_cache.popitem(last=False)
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        retry = Retry(total=self.retries, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({"GET", "PUT"}))
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def cancel(self, *channels):
+        # As requisições em andamento continuam, mas os resultados delas são descartados
+        for channel in channels:
+            self.generations[channel] = self.generations.get(channel, 0) + 1
+
+    def shutdown(self, timeout_ms=5000):
+        """
+        Descarta todas as respostas pendentes e espera as requisições em andamento.
+
+        Chamado ao fechar o editor, antes de o ApiClient ser destruído; as
+        requisições que passarem de `timeout_ms` terminam sem entregar nada.
+        """
+        self.closed = True
+        self.pool.clear()  # Requisições ainda na fila nem começam
+        self.pool.waitForDone(timeout_ms)
+
+    def is_current(self, request):
+        return not self.closed and request.generation == self.generations.get(request.channel, 0)
+
+    def _deliver(self, request, result):
+        if self.is_current(request) and request.on_success is not None:
+            request.on_success(result)
+
+    def _fail(self, request, error):
+        if not self.is_current(request):
+            return
+        if request.on_error is not None:
+            request.on_error(error)
+        else:
+            print(f"Erro na requisição {request.method} {request.path}: {error}")
+
+class LayoutEventStream(QObject):
+    """
+    Acompanha as alterações de uma loja feitas por outros editores.
+
+    Lê o fluxo Server-Sent Events de /store-layout/{id}/events em uma thread
+    própria e entrega cada evento na thread da interface pelo sinal
+    `received`. Se a conexão cair, reconecta com espera crescente e retoma a
+    partir do último evento recebido. Depois de um "reset" a leitura para; o
+    editor recarrega o layout e chama start() de novo.
+    """
+
+    received = pyqtSignal(int, str, object)  # store_id, tipo do evento ("delta" ou "reset") e dados
+
+    def __init__(self, base_url, read_timeout=60, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.read_timeout = read_timeout  # Maior que o intervalo dos pings do servidor
+        self.store_id = None
+        self.stop_event = None
+        self.response = None
+
+    def is_running(self):
+        return self.stop_event is not None
+
+    def start(self, store_id, after_version):
+        self.stop()
+        self.store_id = store_id
+        self.stop_event = threading.Event()
+        threading.Thread(target=self._run, args=(store_id, after_version, self.stop_event), daemon=True).start()
+
+    def stop(self):
+        stop_event, self.stop_event = self.stop_event, None
+        self.store_id = None
+        if stop_event is not None:
+            stop_event.set()
+            response = self.response
+            if response is not None:
+                response.close()  # Interrompe a leitura bloqueada na thread
+
+    def _run(self, store_id, last_id, stop_event):
+        import requests
+
+        session = requests.Session()
+        delay = 0.5
+        while not stop_event.is_set():
+            try:
+                with session.get(f"{self.base_url}/store-layout/{store_id}/events", params={"after": last_id},
+                                 headers={"Accept": "text/event-stream"}, stream=True,
+                                 timeout=(3.05, self.read_timeout)) as response:
+                    response.raise_for_status()
+                    self.response = response
+                    delay = 0.5
+                    event_type, data = "message", []
+                    for line in response.iter_lines(decode_unicode=True):
+                        if stop_event.is_set():
+                            return
+                        if line:
+                            field, _, value = line.partition(":")
+                            value = value[1:] if value.startswith(" ") else value
+                            if field == "event":
+                                event_type = value
+                            elif field == "data":
+                                data.append(value)
+                            elif field == "id":
+                                last_id = int(value)
+                            continue
+                        if data:
+                            try:
+                                self.received.emit(store_id, event_type, json.loads("\n".join(data)))
+                            except RuntimeError:
+                                return  # Editor fechado enquanto o evento chegava
+                            if event_type == "reset":
+                                return
+                        event_type, data = "message", []
+            except Exception as e:
+                if stop_event.is_set():
+                    return
+                print(f"Conexão de sincronização ao vivo perdida ({e}); reconectando em {delay:.1f} s")
+            finally:
+                self.response = None
+            if stop_event.wait(delay):
+                return
+            delay = min(delay * 2, 30)
+
+class StoreLayoutApp(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.API_URL = API_URL
+        self.setWindowTitle("Engenharia de Layout de Loja")
+        self.store_id = None
+        self.categories = {}
+        self.module_models = {}  # module_id -> Module; fonte de verdade para salvar e exportar
+        self.modules = {}  # module_id -> DraggableRect dos módulos presentes na cena
+        self.category_colors = {}
+        self.layout_version = None  # Versão do layout carregado do servidor
+        self.changes = ChangeSet()  # Mudanças desde a última sincronização, enviadas no próximo salvamento
+        self.undo_stack = UndoStack(int(os.environ.get("LAYOUT_UNDO_MEMORY_MB", "16")) * 1024 * 1024)
+        self.use_columnar_format = False  # Troca layouts completos com o servidor em arrays paralelos
+        self.save_in_progress = False
+        self.aisle_width = 0  # Corredor mínimo usado na validação do posicionamento
+        self.scene_build = None  # ChunkedTask da montagem da cena em andamento
+        self.virtual_scene = False  # Cria DraggableRects só para os módulos perto da área visível
+        self.virtual_index = None  # SpatialIndex de module_models no modo virtualizado
+        self.placeholders = None
+        self.api = ApiClient(self.API_URL, parent=self)
+        self.client_id = uuid.uuid4().hex  # Identifica os eventos gerados por este editor
+        self.live_sync = True  # Aplica na hora as alterações de outros editores
+        self.live_events = LayoutEventStream(self.API_URL, parent=self)
+        self.live_events.received.connect(self.apply_remote_event)
+        self.export_pool = QThreadPool(self)
+        self.export_pool.setMaxThreadCount(1)
+        self.export_task = None  # ExportTask em andamento
+
+        self.initUI()
+
+        self.virtual_refresh_timer = QTimer(self)
+        self.virtual_refresh_timer.setSingleShot(True)
+        self.virtual_refresh_timer.setInterval(30)
+        self.virtual_refresh_timer.timeout.connect(self.refresh_virtual_scene)
+        self.view.viewport_changed.connect(self.schedule_virtual_refresh)
+        self.scene.module_edited.connect(self.record_edit)
+        if os.environ.get("LAYOUT_DIAGNOSTICS", "0") not in ("", "0"):
+            self.diagnostics_action.setChecked(True)
+
+    def initUI(self):
+        # Layout Principal
+        main_layout = QHBoxLayout(self)
+
+        # Left Side (Store and Category Management)
+        left_layout = QVBoxLayout()
+
+        # Store Management
+        store_layout = QVBoxLayout()
+        store_layout.addWidget(QLabel("Cod da Loja:"))
+        self.store_id_edit = QLineEdit(self)
+        store_layout.addWidget(self.store_id_edit)
+
+        store_layout.addWidget(QLabel("Nome da Loja:"))
+        self.store_name_edit = QLineEdit(self)
+        store_layout.addWidget(self.store_name_edit)
+
+        store_layout.addWidget(QLabel("Número de Colunas:"))
+        self.num_columns_edit = QLineEdit(self)
+        store_layout.addWidget(self.num_columns_edit)
+
+        store_layout.addWidget(QLabel("Módulos por Coluna:"))
+        self.modules_per_column_edit = QLineEdit(self)
+        store_layout.addWidget(self.modules_per_column_edit)
+
+        self.create_store_btn = QPushButton("Criar Loja", self)
+        self.create_store_btn.clicked.connect(self.create_store)
+        store_layout.addWidget(self.create_store_btn)
+        left_layout.addLayout(store_layout)
+
+        # Category Management
+        category_layout = QVBoxLayout()
+        self.add_category_btn = QPushButton("Adicionar Categoria", self)
+        self.add_category_btn.clicked.connect(self.add_category)
+        category_layout.addWidget(self.add_category_btn)
+
+        self.category_list = QListWidget(self)
+        self.category_list.setDragEnabled(True)  # Permite "drag" na lista
+        left_layout.addLayout(category_layout)
+        category_layout.addWidget(self.category_list)  # Exibe as categorias
+
+        # Module Management
+        module_layout = QVBoxLayout()
+        self.add_module_btn = QPushButton("Incluir Módulo", self)
+        self.add_module_btn.clicked.connect(self.add_module)
+        module_layout.addWidget(self.add_module_btn)
+        
+
+        self.remove_module_btn = QPushButton("Excluir Módulo", self)
+        self.remove_module_btn.clicked.connect(self.remove_module)
+        module_layout.addWidget(self.remove_module_btn)
+        left_layout.addLayout(module_layout)
+
+        # Right Side (Store Layout Visualization)
+        self.scene = StoreLayoutScene(self)
+        self.view = StoreLayoutView(self.scene, self)
+        self.view.setAcceptDrops(True)
+        right_layout = QVBoxLayout()
+        right_layout.addWidget(self.view)
+
+        # Adding layouts to main layout
+        main_layout.addLayout(left_layout)
+        main_layout.addLayout(right_layout)
+
+        self.setLayout(main_layout)
+
+        # Adicionar a barra de menu
+        self.menu_bar = QMenuBar(self)
+        self.layout().setMenuBar(self.menu_bar)
+
+        # Adicionar menus
+        file_menu = self.menu_bar.addMenu("Arquivo")
+        edit_menu = self.menu_bar.addMenu("Editar")
+        view_menu = self.menu_bar.addMenu("Visualizar")  # Adicionar menu de visualização
+
+        # Adicionar ações ao menu Arquivo
+        get_layout_action = QAction("Obter Layout", self)
+        get_layout_action.triggered.connect(self.get_layout)
+        file_menu.addAction(get_layout_action)
+
+        save_layout_action = QAction("Salvar Layout", self)
+        save_layout_action.triggered.connect(self.save_layout)
+        file_menu.addAction(save_layout_action)
+
+        export_layout_action = QAction("Exportar Layout (PDF/PNG/SVG)", self)
+        export_layout_action.triggered.connect(self.export_layout_file)
+        file_menu.addAction(export_layout_action)
+
+        print_layout_action = QAction("Imprimir Layout", self)
+        print_layout_action.triggered.connect(self.print_layout)
+        file_menu.addAction(print_layout_action)
+
+        show_share_action = QAction("Exibir Share", self)
+        show_share_action.triggered.connect(self.show_layout_share)
+        file_menu.addAction(show_share_action)
+
+        save_as_json_action = QAction("Salvar como JSON", self)
+        save_as_json_action.triggered.connect(self.save_as_json)
+        file_menu.addAction(save_as_json_action)
+
+        load_from_json_action = QAction("Carregar do JSON", self)
+        load_from_json_action.triggered.connect(self.load_from_json)
+        file_menu.addAction(load_from_json_action)
+
+        # Adicionar ações ao menu Editar
+        self.undo_action = QAction("Desfazer", self)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.undo_action.triggered.connect(self.undo)
+        edit_menu.addAction(self.undo_action)
+
+        self.redo_action = QAction("Refazer", self)
+        self.redo_action.setShortcut(QKeySequence.Redo)
+        self.redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(self.redo_action)
+        self.update_undo_actions()
+
+        resize_text_action = QAction("Redimensionar Texto", self)
+        resize_text_action.triggered.connect(self.resize_text)
+        edit_menu.addAction(resize_text_action)
+
+        rotate_text_action = QAction("Rotacionar Texto", self)
+        rotate_text_action.triggered.connect(self.rotate_text)
+        edit_menu.addAction(rotate_text_action)
+
+        resize_module_action = QAction("Redimensionar Módulo", self)
+        resize_module_action.triggered.connect(self.resize_module)
+        edit_menu.addAction(resize_module_action)
+
+        rotate_module_action = QAction("Rotacionar Módulo", self)
+        rotate_module_action.triggered.connect(self.rotate_module)
+        edit_menu.addAction(rotate_module_action)
+
+        group_modules_action = QAction("Agrupar Módulos", self)
+        group_modules_action.triggered.connect(self.group_modules)
+        edit_menu.addAction(group_modules_action)
+
+        ungroup_modules_action = QAction("Desagrupar Módulos", self)
+        ungroup_modules_action.triggered.connect(self.ungroup_modules)
+        edit_menu.addAction(ungroup_modules_action)
+
+        # Adicionar ações ao menu Visualizar
+        zoom_in_action = QAction("Aumentar Zoom", self)
+        zoom_in_action.triggered.connect(self.view.zoom_in)
+        view_menu.addAction(zoom_in_action)
+
+        zoom_out_action = QAction("Diminuir Zoom", self)
+        zoom_out_action.triggered.connect(self.view.zoom_out)
+        view_menu.addAction(zoom_out_action)
+
+        grid_tile_action = QAction("Grade em Cache", self)
+        grid_tile_action.setCheckable(True)
+        grid_tile_action.toggled.connect(self.scene.set_grid_tile_enabled)
+        view_menu.addAction(grid_tile_action)
+
+        static_labels_action = QAction("Rótulos Rápidos", self)
+        static_labels_action.setCheckable(True)
+        static_labels_action.toggled.connect(self.scene.set_static_labels)
+        view_menu.addAction(static_labels_action)
+
+        virtual_scene_action = QAction("Cena Virtualizada", self)
+        virtual_scene_action.setCheckable(True)
+        virtual_scene_action.toggled.connect(self.set_virtual_scene)
+        view_menu.addAction(virtual_scene_action)
+
+        self.placement_check_action = QAction("Checar Posicionamento ao Arrastar", self)
+        self.placement_check_action.setCheckable(True)
+        self.placement_check_action.toggled.connect(lambda checked: self.scene.set_placement_check(checked, self.aisle_width))
+        view_menu.addAction(self.placement_check_action)
+
+        validate_placement_action = QAction("Validar Posicionamento", self)
+        validate_placement_action.triggered.connect(self.validate_placement)
+        edit_menu.addAction(validate_placement_action)
+
+        self.diagnostics_action = QAction("Diagnóstico (tempo de quadro e travamentos)", self)
+        self.diagnostics_action.setCheckable(True)
+        self.diagnostics_action.toggled.connect(self.set_diagnostics)
+        view_menu.addAction(self.diagnostics_action)
+
+        export_diagnostics_action = QAction("Exportar Diagnóstico (JSON)", self)
+        export_diagnostics_action.triggered.connect(self.export_diagnostics)
+        file_menu.addAction(export_diagnostics_action)
+
+        live_sync_action = QAction("Sincronização ao Vivo", self)
+        live_sync_action.setCheckable(True)
+        live_sync_action.setChecked(self.live_sync)
+        live_sync_action.toggled.connect(self.set_live_sync)
+        view_menu.addAction(live_sync_action)
+
+        columnar_action = QAction("Formato Colunar", self)
+        columnar_action.setCheckable(True)
+        columnar_action.toggled.connect(self.set_columnar_format)
+        file_menu.addAction(columnar_action)
+
+    def create_store(self):
+        store_id = self.store_id_edit.text()
+        store_name = self.store_name_edit.text()
+        num_columns = self.num_columns_edit.text()
+        modules_per_column = self.modules_per_column_edit.text()
+
+        try:
+            store_id = int(store_id)
+            num_columns = int(num_columns)
+            modules_per_column = int(modules_per_column)
+        except ValueError:
+            print("Número de corredores e módulos por corredor devem ser inteiros.")
+            return
+
+        def on_created(data):
+            print(data)
+            # Atualiza a interface
+            self.store_id = store_id
+            self.num_columns = num_columns
+            self.modules_per_column = modules_per_column
+            self.categories = {}
+            self.category_list.clear()
+            self.clear_scene()
+            self.category_colors = {}
+
+            self.draw_store_layout()
+
+        # Descarta respostas pendentes da loja anterior
+        self.api.cancel("layout", "share")
+        self.api.request("POST", "/store/", on_created, lambda e: print(f"Erro ao criar loja: {e}"),
+                         json={"id": store_id, "name": store_name, "num_columns": num_columns, "modules_per_column": modules_per_column})
+
+    def add_category(self):
+        dialog = CategoryDialog(self)
+        result = dialog.exec_()
+        if result == QDialog.Accepted:
+            category_data = dialog.get_category_data()
+            try:
+                cat_id = int(category_data['id'])
+            except ValueError:
+                print("ID da categoria deve ser um inteiro.")
+                return
+            cat_name = category_data['name']
+
+            def on_created(data):
+                print(data)
+                self.categories[cat_id] = cat_name
+                self.category_colors[cat_id] = "#{:06x}".format(random.randint(0, 0xFFFFFF))
+
+                item = DraggableCategory(cat_id, cat_name)  # Usando a classe DraggableCategory
+                self.category_list.addItem(item)
+
+            self.api.request("POST", "/category/", on_created, lambda e: print(f"Erro ao adicionar categoria: {e}"),
+                             json={"id": cat_id, "name": cat_name})
+
+    def draw_store_layout(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+
+        # Obtém o layout da API; a cena é recriada quando ele chegar
+        self.fetch_layout()
+
+    def fetch_layout(self):
+        # Um novo carregamento torna obsoletas as respostas ainda pendentes
+        self.api.cancel("layout")
+        on_error = lambda e: print(f"Erro ao obter o layout: {e}")
+        if self.use_columnar_format:
+            self.api.request("GET", f"/store-layout/{self.store_id}/columnar", self.update_layout_from_api, on_error,
+                             parse=columnar_to_layout, channel="layout", cache=True)
+        else:
+            self.api.request("GET", f"/store-layout/{self.store_id}", self.update_layout_from_api, on_error,
+                             channel="layout", cache=True)
+
+    @diagnostics.timed
+    def update_layout_from_api(self, data):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+        if (data.get("store_id") == self.store_id and data.get("version") is not None
+                and data.get("version") == self.layout_version and not self.changes):
+            # A cena já mostra esta versão e não há edições pendentes: nada a recriar
+            print("O layout já está atualizado.")
+            self.follow_layout_events()
+            return
+
+        # Limpa a cena atual (a grade é pintada no fundo e não precisa ser recriada)
+        self.clear_scene()
+
+        # Obtém as colunas da API; os modelos são criados antes e a cena é montada em etapas
+        columns_data = data.get("columns", [])
+        for column_index, column_data in enumerate(columns_data):
+            for module_data in column_data:
+                module = Module(**module_data)
+                self.module_models[module.module_id] = module
+
+        self.mark_synced(data.get("version"))
+        self.rebuild_scene()
+
+    def clear_scene(self):
+        # Remove todos os módulos da cena e do modelo
+        self.cancel_scene_build()
+        self.scene.clear()
+        self.modules = {}
+        self.module_models = {}
+        self.placeholders = None
+        self.virtual_index = None
+        self.layout_version = None  # A cena vazia não corresponde a nenhuma versão do servidor
+        # O histórico se refere ao layout anterior
+        self.undo_stack.clear()
+        self.update_undo_actions()
+
+    @diagnostics.timed
+    def rebuild_scene(self):
+        """Recria os itens da cena a partir de module_models."""
+        self.cancel_scene_build()
+        for rect in self.modules.values():
+            self.scene.untrack_module(rect)
+            self.scene.removeItem(rect)
+        self.modules = {}
+        if self.placeholders is not None:
+            self.scene.removeItem(self.placeholders)
+            self.placeholders = None
+
+        if not self.virtual_scene:
+            self.virtual_index = None
+            self.build_scene_in_chunks(list(self.module_models.values()))
+            return
+
+        self.virtual_index = SpatialIndex(self.virtual_cell_size)
+        for module in self.module_models.values():
+            self.index_module(module)
+        self.placeholders = ModulePlaceholderItem(self.module_models, self.virtual_index, self.modules,
+                                                  self.scene.sceneRect())
+        self.scene.addItem(self.placeholders)
+        self.refresh_virtual_scene()
+
+    def build_scene_in_chunks(self, models):
+        """
+        Cria os DraggableRects em fatias no event loop, com progresso e cancelamento.
+
+        Cancelar deixa a cena incompleta, mas module_models continua completo,
+        então salvar e exportar não perdem módulos.
+        """
+        if not models:
+            return
+        progress = QProgressDialog("Montando o layout...", "Cancelar", 0, len(models), self)
+        progress.setMinimumDuration(500)
+        # Módulos removidos durante a montagem (ex.: por outro editor) são pulados
+        task = ChunkedTask(self.add_module_rect(module) for module in models
+                           if self.module_models.get(module.module_id) is module)
+        task.progress.connect(progress.setValue)
+        progress.canceled.connect(task.cancel)
+
+        def on_finished(completed):
+            progress.close()
+            if self.scene_build is not task:
+                return  # Substituída por outra montagem
+            self.scene_build = None
+            if not completed:
+                print(f"Montagem da cena interrompida: {task.done} de {len(models)} módulos exibidos.")
+
+        task.finished.connect(on_finished)
+        self.scene_build = task
+        task.start()
+
+    def closeEvent(self, event):
+        # Nada que ainda esteja em outra thread pode entregar resultados a objetos já destruídos
+        self.live_events.stop()
+        self.cancel_scene_build()
+        diagnostics.stop()
+        self.api.shutdown()
+        super().closeEvent(event)
+
+    def cancel_scene_build(self):
+        task, self.scene_build = self.scene_build, None
+        if task is not None:
+            task.cancel()
+
+    def set_virtual_scene(self, enabled):
+        self.virtual_scene = enabled
+        if self.module_models:
+            self.rebuild_scene()
+
+    def index_module(self, module):
+        self.virtual_index.insert(module.module_id, module.x, module.y, module.width, module.height,
+                                  module.rotation, module.column)
+
+    def schedule_virtual_refresh(self):
+        if self.virtual_index is not None:
+            self.virtual_refresh_timer.start()
+
+    @diagnostics.timed
+    def refresh_virtual_scene(self):
+        """
+        Cria os DraggableRects dos módulos perto da área visível e troca os
+        demais por placeholders.
+
+        Módulos selecionados ou sendo arrastados continuam na cena.
+        """
+        if self.virtual_index is None or self.placeholders is None:
+            return
+
+        region = self.view.visible_scene_rect()
+        margin = max(region.width(), region.height()) / 2
+        region.adjust(-margin, -margin, margin, margin)
+        wanted = self.virtual_index.candidates((region.left(), region.top(), region.right(), region.bottom()))
+        if len(wanted) > self.max_materialized_modules:
+            # Zoom muito afastado: os placeholders bastam
+            wanted = set()
+
+        grabber = self.scene.mouseGrabberItem()
+        for module_id, rect in list(self.modules.items()):
+            if module_id in wanted or rect.isSelected() or rect is grabber:
+                continue
+            if rect.sceneBoundingRect().intersects(region) and len(wanted) > 0:
+                continue
+            # Atualiza a posição no índice antes de trocar o item pelo placeholder
+            self.index_module(rect.module)
+            self.scene.untrack_module(rect)
+            self.scene.removeItem(rect)
+            del self.modules[module_id]
+
+        for module_id in wanted:
+            module = self.module_models.get(module_id)
+            if module is not None and module_id not in self.modules:
+                self.add_module_rect(module)
+        self.placeholders.update()
+
+    def add_module_rect(self, module):
+        rect = DraggableRect(module)
+        rect.setPos(module.x, module.y)  # Define a posição do retângulo
+        if module.rotation:
+            rect.setRotation(module.rotation)
+        self.scene.addItem(rect)
+        self.modules[module.module_id] = rect
+
+        if module.category_id is not None:
+            rect.setBrush(self.category_brush(module.category_id))
+        self.scene.track_module(rect)
+        return rect
+
+    def category_brush(self, category_id):
+        # Cor da categoria (cinza se ela não estiver na lista carregada); branco para módulos sem categoria
+        if category_id is None:
+            return QBrush(QColor("white"))
+        return QBrush(QColor(self.category_colors.get(category_id, "gray")))
+
+    virtual_cell_size = 400  # Células maiores que as da validação: a consulta é por área visível
+    max_materialized_modules = 3000
+
+    def set_diagnostics(self, enabled):
+        if enabled:
+            diagnostics.start(self)
+        else:
+            diagnostics.stop()
+        self.view.set_diagnostics_overlay(enabled)
+
+    def export_diagnostics(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "Exportar Diagnóstico", "diagnostico.json",
+                                                   "JSON Files (*.json);;All Files (*)")
+        if not file_name:
+            return
+        diagnostics.export(file_name)
+        print(f"Diagnóstico exportado em {file_name} (abra no chrome://tracing ou no Perfetto).")
+
+    def set_columnar_format(self, enabled):
+        self.use_columnar_format = enabled
+
+    def mark_synced(self, version):
+        # O layout atual é o do servidor; o próximo salvamento parte dele
+        self.layout_version = version
+        self.changes.clear()
+        self.follow_layout_events()
+
+    def set_live_sync(self, enabled):
+        self.live_sync = enabled
+        if enabled:
+            self.follow_layout_events()
+        else:
+            self.live_events.stop()
+
+    def follow_layout_events(self):
+        # Acompanha a loja aberta a partir da versão carregada, se ainda não estiver acompanhando
+        if not self.live_sync or not self.store_id or self.layout_version is None:
+            return
+        if self.live_events.is_running() and self.live_events.store_id == self.store_id:
+            return
+        self.live_events.start(self.store_id, self.layout_version)
+
+    @diagnostics.timed
+    def apply_remote_event(self, store_id, event_type, event):
+        """
+        Aplica uma alteração do layout recebida pela sincronização ao vivo.
+
+        As operações de outros editores são aplicadas direto na cena. Em
+        conflito com edições locais ainda não salvas, a versão do servidor
+        prevalece nos campos alterados. Se faltar algum evento (ou o layout
+        tiver sido substituído), o layout é obtido de novo.
+        """
+        if store_id != self.store_id or self.layout_version is None:
+            return
+        if event_type == "reset":
+            self.live_events.stop()  # Volta a acompanhar quando o layout recarregado chegar
+            self.reload_remote_layout()
+            return
+
+        version = event["version"]
+        if version <= self.layout_version:
+            return  # Já conhecida (ex.: resposta do nosso próprio salvamento)
+        if version != self.layout_version + 1:
+            self.reload_remote_layout()
+            return
+        if event.get("origin") == self.client_id:
+            self.layout_version = version  # Nosso próprio salvamento; a cena já está assim
+            return
+        if event["kind"] != "ops":
+            self.reload_remote_layout()
+            return
+
+        conflicts = 0
+        touched = set()
+        for op in event["ops"]:
+            delta = delta_from_op(self.module_models.get(op["module_id"]), op)
+            if delta is None:
+                continue
+            if delta.module_id in self.changes.module_ids():
+                conflicts += 1
+                fields = None if delta.before is None or delta.after is None else delta.after.keys()
+                self.changes.discard(delta.module_id, fields)
+            self.apply_delta(delta, record=False)
+            touched.add(delta.module_id)
+        if touched:
+            # O histórico local não pode desfazer por cima da alteração do outro editor
+            self.undo_stack.discard_modules(touched)
+            self.update_undo_actions()
+        self.layout_version = version
+        if conflicts:
+            print(f"{conflicts} módulo(s) alterado(s) também por outro editor; a versão do servidor prevaleceu.")
+
+    def reload_remote_layout(self):
+        if self.changes:
+            print("O layout foi substituído por outro editor; as edições locais não salvas serão descartadas.")
+        self.fetch_layout()
+
+    @diagnostics.timed
+    def record_edit(self, label, deltas):
+        self.undo_stack.push(EditCommand(label, deltas))
+        for delta in deltas:
+            self.changes.record(delta)
+        self.update_undo_actions()
+
+    @diagnostics.timed
+    def undo(self):
+        command = self.undo_stack.undo()
+        if command is None:
+            return
+        for delta in reversed(command.deltas):
+            self.apply_delta(delta.inverted())
+        self.update_undo_actions()
+        print(f"Desfeito: {command.label}")
+
+    @diagnostics.timed
+    def redo(self):
+        command = self.undo_stack.redo()
+        if command is None:
+            return
+        for delta in command.deltas:
+            self.apply_delta(delta)
+        self.update_undo_actions()
+        print(f"Refeito: {command.label}")
+
+    def update_undo_actions(self):
+        self.undo_action.setEnabled(self.undo_stack.can_undo())
+        self.redo_action.setEnabled(self.undo_stack.can_redo())
+
+    def apply_delta(self, delta, record=True):
+        # Aplica um delta ao modelo e à cena; os de desfazer/refazer (record) também entram no próximo salvamento
+        if record:
+            self.changes.record(delta)
+        module_id = delta.module_id
+        if delta.after is None:
+            self.module_models.pop(module_id, None)
+            rect = self.modules.pop(module_id, None)
+            if rect is not None:
+                self.scene.untrack_module(rect)
+                self.scene.removeItem(rect)
+            if self.virtual_index is not None:
+                self.virtual_index.remove(module_id)
+        elif delta.before is None:
+            module = Module(**delta.after)
+            self.module_models[module_id] = module
+            if self.virtual_index is not None:
+                self.index_module(module)
+                self.schedule_virtual_refresh()
+            else:
+                self.add_module_rect(module)
+        else:
+            module = self.module_models[module_id]
+            for field, value in delta.after.items():
+                setattr(module, field, value)
+            if self.virtual_index is not None:
+                self.index_module(module)
+            rect = self.modules.get(module_id)
+            if rect is not None:
+                self.sync_rect(rect)
+        if self.placeholders is not None:
+            self.placeholders.update()
+
+    def sync_rect(self, rect):
+        # Leva o estado do Module para o DraggableRect
+        module = rect.module
+        rect.setPos(module.x, module.y)
+        if (rect.rect().width(), rect.rect().height()) != (module.width, module.height):
+            rect.setRect(0, 0, module.width, module.height)
+            rect.center_text()
+        rect.setRotation(module.rotation)
+        if rect.label_text != module.name:
+            rect.set_label_text(module.name)
+        brush = self.category_brush(module.category_id)
+        if rect.brush() != brush:
+            rect.setBrush(brush)  # set_category remoto (ex.: /optimize com apply) ou desfeito/refeito
+        self.scene.module_moved(rect)
+
+    def take_changes(self):
+        # Mudanças pendentes e o estado atual dos módulos envolvidos; elas deixam de estar pendentes
+        sent = self.changes.take()
+        states = {module_id: self.module_models[module_id].dict()
+                  for module_id in sent.module_ids() if module_id in self.module_models}
+        return sent, states
+
+    @diagnostics.timed
+    def save_layout(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+        if self.save_in_progress:
+            print("Aguarde o salvamento anterior terminar.")
+            return
+
+        if self.layout_version is not None:
+            self.save_layout_changes()
+            return
+
+        # Converte o layout para o formato da API, agrupando cada módulo na sua coluna
+        columns_data = [[] for _ in range(self.num_columns)]
+        for module_id, module in self.module_models.items():
+            module = module.dict()
+            while len(columns_data) <= module["column"]:
+                columns_data.append([])
+            columns_data[module["column"]].append(module)
+
+        layout_data = {"store_id": self.store_id, "columns": columns_data}
+        path = f"/store-layout/{self.store_id}"
+        if self.use_columnar_format:
+            layout_data = layout_to_columnar(layout_data)
+            path += "/columnar"
+
+        sent = self.changes.take()
+        store_id = self.store_id
+
+        def on_saved(data):
+            print(data["message"])
+            self.finish_save(data.get("version"), store_id=store_id)
+
+        self.save_in_progress = True
+        self.api.request("PUT", path, on_saved, lambda e: self.fail_save(sent, e, store_id), json=layout_data,
+                         headers={"X-Layout-Client": self.client_id})
+
+    def save_layout_changes(self):
+        # Envia apenas os módulos alterados desde a última sincronização, a partir dos deltas das edições
+        sent, states = self.take_changes()
+        ops = sent.ops(states)
+        if not ops:
+            print("Nenhuma alteração para salvar.")
+            return
+
+        store_id = self.store_id
+
+        def on_saved(data):
+            print(data)
+            self.finish_save(data["version"], store_id=store_id)
+
+        self.save_in_progress = True
+        self.api.request("PATCH", f"/store-layout/{store_id}", on_saved, lambda e: self.fail_save(sent, e, store_id),
+                         json={"base_version": self.layout_version, "ops": ops},
+                         headers={"X-Layout-Client": self.client_id})
+
+    def finish_save(self, version, store_id=None):
+        # As mudanças enviadas já saíram de self.changes; edições feitas durante o envio continuam pendentes
+        self.save_in_progress = False
+        if store_id != self.store_id:
+            return  # O usuário trocou de loja durante o salvamento
+        if self.live_events.is_running() and self.layout_version is not None:
+            # Alterações de outros editores podem ter chegado antes ou depois; os eventos mantêm a versão em ordem
+            if version == self.layout_version + 1:
+                self.layout_version = version
+            return
+        self.layout_version = version
+        self.follow_layout_events()
+
+    def fail_save(self, sent, error, store_id=None):
+        self.save_in_progress = False
+        if store_id == self.store_id:
+            self.changes.restore(sent)
+        response = getattr(error, "response", None)
+        if response is not None and response.status_code == 409:
+            print("O layout foi alterado por outro usuário. Obtenha o layout novamente antes de salvar.")
+        else:
+            print(f"Erro ao salvar o layout: {error}")
+
+    def show_layout_share(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+
+        def on_share(share_data):
+            message = "Participação das Categorias:\n"
+            for cat_id, share in share_data.items():
+                cat_name = self.categories.get(int(cat_id), "Desconhecido")
+                message += f"{cat_name} ({cat_id}): {share:.2f}%\n"
+
+            msg_box = QMessageBox()
+            msg_box.setWindowTitle("Share do Layout")
+            msg_box.setText(message)
+            msg_box.exec_()
+
+        self.api.request("GET", f"/store-layout/{self.store_id}/share", on_share,
+                         lambda e: print(f"Erro ao obter o share do layout: {e}"), channel="share")
+
+    def get_layout(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+
+        self.fetch_layout()
+
+    def validate_placement(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+
+        aisle_width, ok = QInputDialog.getInt(self, "Validar Posicionamento", "Largura Mínima do Corredor:",
+                                              value=self.aisle_width, min=0, max=500)
+        if not ok:
+            return
+        if aisle_width != self.aisle_width:
+            self.aisle_width = aisle_width
+            if self.scene.placement_index is not None:
+                self.scene.set_placement_check(True, aisle_width)
+
+        def on_report(report):
+            # Seleciona os módulos envolvidos para facilitar a correção
+            involved = set(report["out_of_bounds"])
+            involved.update(module_id for pair in report["overlaps"] for module_id in pair)
+            involved.update(module_id for violation in report["aisle_violations"] for module_id in violation["modules"])
+            self.scene.clearSelection()
+            for module_id in involved:
+                rect = self.modules.get(module_id)
+                if rect is not None:
+                    rect.setSelected(True)
+
+            msg_box = QMessageBox()
+            msg_box.setWindowTitle("Validação do Posicionamento")
+            msg_box.setText(f"Layout salvo (versão {report['version']}):\n"
+                            f"Sobreposições: {len(report['overlaps'])}\n"
+                            f"Módulos fora da loja: {len(report['out_of_bounds'])}\n"
+                            f"Corredores estreitos: {len(report['aisle_violations'])}")
+            msg_box.exec_()
+
+        bounds = self.scene.sceneRect()
+        self.api.request("POST", f"/store-layout/{self.store_id}/validate", on_report,
+                         lambda e: print(f"Erro ao validar o posicionamento: {e}"), channel="validate",
+                         json={"width": bounds.width(), "height": bounds.height(), "aisle_width": aisle_width})
+
+    # Métodos para redimensionar e rotacionar o texto
+    def resize_text(self):
+        try:
+            size, ok = QInputDialog.getInt(self, "Redimensionar Texto", "Novo Tamanho:", min=1, max=100)
+            if ok:
+                for rect in self.scene.selectedItems():
+                    if isinstance(rect, DraggableRect):
+                        rect.set_label_font(QFont("Arial", size))
+        except Exception as e:
+            print(f"Erro ao redimensionar texto: {e}")
+
+    def rotate_text(self):
+        angle, ok = QInputDialog.getInt(self, "Rotacionar Texto", "Novo Ângulo:", min=0, max=360)
+        if ok:
+            for rect in self.scene.selectedItems():
+                if isinstance(rect, DraggableRect):
+                    rect.rotate_text(angle)
+
+    def resize_module(self):
+        width, ok_width = QInputDialog.getInt(self, "Redimensionar Módulo", "Nova Largura:", min=10, max=200)
+        if not ok_width:
+            return
+
+        height, ok_height = QInputDialog.getInt(self, "Redimensionar Módulo", "Nova Altura:", min=10, max=200)
+        if not ok_height:
+            return
+
+        deltas = []
+        for rect in self.scene.selectedItems():
+            if isinstance(rect, DraggableRect):
+                rect.prepareGeometryChange()
+                rect.setRect(rect.rect().x(), rect.rect().y(), width, height)
+                deltas.append(update_module(rect.module, {"width": width, "height": height}))
+                rect.center_text()
+                self.scene.module_moved(rect)
+        self.scene.record_edit("Redimensionar Módulos", deltas)
+
+    def rotate_module(self):
+        angle, ok = QInputDialog.getInt(self, "Rotacionar Módulo", "Novo Ângulo:", min=0, max=360)
+        if ok:
+            deltas = []
+            for rect in self.scene.selectedItems():
+                if isinstance(rect, DraggableRect):
+                    rect.setRotation(angle)
+                    deltas.append(update_module(rect.module, {"rotation": angle}))
+                    self.scene.module_moved(rect)
+            self.scene.record_edit("Rotacionar Módulos", deltas)
+
+    def group_modules(self):
+        selected_items = self.scene.selectedItems()
+        if len(selected_items) > 1:
+            group = QGraphicsItemGroup()
+            for item in selected_items:
+                if isinstance(item, DraggableRect):
+                    group.addToGroup(item)
+            self.scene.addItem(group)
+
+    def ungroup_modules(self):
+        selected_items = self.scene.selectedItems()
+        for item in selected_items:
+            if isinstance(item, QGraphicsItemGroup):
+                for child in item.childItems():
+                    item.removeFromGroup(child)
+                self.scene.removeItem(item)
+
+    def add_module(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+
+        # Adiciona um novo módulo na primeira coluna e na primeira linha disponível
+        column_index = 0
+        row_index = len(self.module_models) // self.num_columns
+        module_id = max(self.module_models, default=-1) + 1
+        module_width = 60  # Largura do módulo inicial
+        module_height = 40  # Altura do módulo inicial
+        grid_size = 20
+
+        module = Module(
+            module_id=module_id,
+            column=column_index,
+            row=row_index,
+            x=column_index * (module_width + grid_size),
+            y=row_index * (module_height + grid_size),
+            name=f"Module {module_id}",
+            width=module_width,
+            height=module_height
+        )
+        self.module_models[module_id] = module
+        if self.virtual_index is not None:
+            self.index_module(module)
+        self.add_module_rect(module)
+        self.scene.record_edit("Incluir Módulo", [ModuleDelta(module_id, None, module.dict())])
+
+    def remove_module(self):
+        selected_items = self.scene.selectedItems()
+        deltas = []
+        for item in selected_items:
+            if isinstance(item, DraggableRect):
+                module_id = item.module.module_id
+                self.scene.untrack_module(item)
+                self.scene.removeItem(item)
+                del self.modules[module_id]
+                del self.module_models[module_id]
+                if self.virtual_index is not None:
+                    self.virtual_index.remove(module_id)
+                deltas.append(ModuleDelta(module_id, item.module.dict(), None))
+        self.scene.record_edit("Excluir Módulos", deltas)
+
+    @diagnostics.timed
+    def export_layout_file(self):
+        from layout_export import EXPORT_FORMATS, SCENE_DPI, ExportTask
+
+        if not self.module_models:
+            print("Não há módulos para exportar.")
+            return
+        if self.export_task is not None:
+            print("Já existe uma exportação em andamento.")
+            return
+
+        options = QFileDialog.Options()
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self, "Exportar Layout", f"store_layout_{self.store_id or 'sem_loja'}.pdf",
+            "PDF (*.pdf);;Imagem PNG (*.png);;SVG (*.svg)", options=options)
+        if not file_name:
+            return
+        fmt = os.path.splitext(file_name)[1].lower().lstrip(".")
+        if fmt not in EXPORT_FORMATS:
+            fmt = selected_filter.split("*.")[-1].rstrip(")")
+            file_name += f".{fmt}"
+        dpi, ok = QInputDialog.getInt(self, "Exportar Layout", "Resolução (DPI):",
+                                      value=300 if fmt == "pdf" else SCENE_DPI, min=36, max=1200)
+        if not ok:
+            return
+
+        # A exportação trabalha sobre uma cópia dos módulos; o editor continua livre durante a renderização
+        modules = [module.dict() for module in self.module_models.values()]
+        self.export_task = ExportTask(modules, file_name, fmt, dpi, self.category_colors)
+        self.export_task.signals.progress.connect(self.show_export_progress)
+        self.export_task.signals.finished.connect(self.finish_export)
+        self.export_task.signals.failed.connect(self.fail_export)
+        self.export_pool.start(self.export_task)
+        print(f"Exportando layout para {file_name}...")
+
+    def show_export_progress(self, done, total):
+        print(f"Exportação: {done}/{total}")
+
+    def finish_export(self, paths):
+        self.export_task = None
+        print(f"Layout exportado em {', '.join(paths)}.")
+
+    def fail_export(self, error):
+        self.export_task = None
+        print(f"Erro ao exportar o layout: {error}")
+
+    @diagnostics.timed
+    def print_layout(self):
+        from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
+        from layout_export import build_export_scene, export_bounds, render_pages
+
+        if not self.module_models:
+            print("Não há módulos para imprimir.")
+            return
+        printer = QPrinter(QPrinter.HighResolution)
+        print_dialog = QPrintDialog(printer, self)
+
+        if print_dialog.exec_() == QPrintDialog.Accepted:
+            # Imprime o layout inteiro (não só a área visível), em quantas páginas forem necessárias
+            scene = build_export_scene((module.dict() for module in self.module_models.values()), self.category_colors)
+            pages = render_pages(scene, printer, export_bounds(scene), printer.resolution())
+
+            print(f"Layout enviado para impressão ({pages} páginas).")
+
+    @diagnostics.timed
+    def save_as_json(self):
+        if not self.store_id:
+            print("Crie uma loja primeiro.")
+            return
+
+        # Abre um diálogo para escolher o nome e o diretório do arquivo
+        options = QFileDialog.Options()
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self, "Salvar Layout como JSON", "",
+            "JSON Files (*.json);;JSON compacto (*.json);;All Files (*)", options=options)
+        if not file_name:
+            return
+
+        # Agrupa os módulos por coluna; cada módulo só é convertido em dict na hora de gravar
+        columns_data = [[] for _ in range(self.num_columns)]
+        for module_id, module in self.module_models.items():
+            while len(columns_data) <= module.column:
+                columns_data.append([])
+            columns_data[module.column].append(module)
+
+        indent = None if selected_filter.startswith("JSON compacto") else 4
+        with open(file_name, "w") as json_file:
+            write_layout_json(json_file, {"store_id": self.store_id},
+                              ((module.dict() for module in column) for column in columns_data), indent=indent)
+
+        print(f"Layout salvo como JSON em {file_name}.")
+
+    def load_from_json(self):
+        # Abre um diálogo para escolher o arquivo JSON
+        options = QFileDialog.Options()
+        file_name, _ = QFileDialog.getOpenFileName(self, "Carregar Layout do JSON", "", "JSON Files (*.json);;All Files (*)", options=options)
+        if not file_name:
+            return
+
+        try:
+            self.stream_layout_file(file_name)
+        except FileNotFoundError:
+            print("Arquivo JSON não encontrado.")
+        except ValueError as e:
+            print(f"Erro ao decodificar o arquivo JSON: {e}")
+        except Exception as e:
+            print(f"Erro ao carregar layout do JSON: {e}")
+
+    @diagnostics.timed
+    def stream_layout_file(self, file_name, batch_size=2000):
+        """
+        Carrega o layout do arquivo em streaming.
+
+        Os módulos são adicionados à cena à medida que são lidos; o arquivo
+        nunca é carregado inteiro na memória. Se a loja ainda não existir no
+        servidor, ela é criada pela API e recebe o layout carregado, em um
+        único PUT depois que o arquivo foi lido até o fim. Se o carregamento
+        for cancelado ou falhar, nada é enviado e a cena volta à loja atual.
+        """
+        file_size = max(os.path.getsize(file_name), 1)
+        progress = QProgressDialog("Carregando layout...", "Cancelar", 0, 1000, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+
+        def report(bytes_read):
+            progress.setValue(int(bytes_read * 1000 / file_size))
+            QApplication.processEvents()
+
+        self.api.cancel("layout", "share")
+        self.clear_scene()
+
+        store_id = None
+        num_columns = 0
+        modules_per_column = 0
+        column_size = 0
+        loaded = 0
+
+        canceled = False
+        try:
+            with open(file_name, "rb") as json_file:
+                for event in iter_layout_json(json_file, report):
+                    if progress.wasCanceled():
+                        break
+                    if event[0] == "key":
+                        if event[1] == "store_id":
+                            store_id = event[2]
+                    elif event[0] == "column":
+                        num_columns += 1
+                        column_size = 0
+                    else:
+                        module = Module(**event[2])
+                        self.module_models[module.module_id] = module
+                        if not self.virtual_scene:
+                            self.add_module_rect(module)
+                        column_size += 1
+                        modules_per_column = max(modules_per_column, column_size)
+                        loaded += 1
+                        if loaded % batch_size == 0:
+                            QApplication.processEvents()
+            canceled = progress.wasCanceled()  # Antes de close(), que também emite canceled
+            if store_id is None and not canceled:
+                raise ValueError("store_id não encontrado no arquivo")
+        except Exception:
+            self.discard_partial_load()
+            raise
+        finally:
+            progress.close()
+
+        if canceled:
+            # Um layout pela metade nunca vai para o servidor
+            self.discard_partial_load()
+            print("Carregamento do JSON cancelado.")
+            return
+
+        # Atualiza a interface do usuário
+        self.store_id = store_id
+        self.num_columns = num_columns
+        self.modules_per_column = modules_per_column
+        self.mark_synced(None)
+        if self.virtual_scene:
+            self.rebuild_scene()
+        print(f"Layout carregado do JSON de {file_name}.")
+
+        def on_created(data):
+            # Loja nova: o layout inicial criado pelo servidor é substituído pelo do arquivo
+            if self.store_id == store_id:
+                self.save_layout()
+
+        def on_error(error):
+            response = getattr(error, "response", None)
+            if response is None or response.status_code != 400:  # 400: a loja já existe
+                print(f"Erro ao criar a loja {store_id}: {error}")
+
+        store = Store(id=store_id, name=f"Loja {store_id}", num_columns=num_columns, modules_per_column=modules_per_column)
+        self.api.request("POST", "/store/", on_created, on_error, json=store.dict())
+
+    def discard_partial_load(self):
+        # Descarta os módulos lidos do arquivo e recarrega a loja atual do servidor (se houver)
+        self.clear_scene()
+        if self.store_id:
+            self.fetch_layout()
+
+    @diagnostics.timed
+    def snap_selected_items_to_grid(self):
+        grid_size = 20  # Ajusta o tamanho da grade para 20 pixels
+        selected_items = self.scene.selectedItems()
+        if not selected_items:
+            return
+
+        self.scene.record_edit("Mover Módulos", [item.snap_to_grid() for item in selected_items
+                                                 if isinstance(item, DraggableRect)])
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        self.snap_selected_items_to_grid()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Editor de layout de lojas.")
+    parser.add_argument("--server", action="store_true",
+                        help="Sobe também o backend neste processo (senão use layout_server.py)")
+    parser.add_argument("--startup-check", action="store_true",
+                        help="Abre a janela, mostra o tempo de abertura e sai com erro se passar do orçamento")
+    args, qt_args = parser.parse_known_args()
+    if args.server:
+        start_local_server()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    startup_profile.mark("QApplication")
+    store_layout = StoreLayoutApp()
+    store_layout.setWindowTitle("Store Layout")
+    store_layout.setGeometry(100, 100, 1000, 700)
+    startup_profile.mark("janela criada")
+    store_layout.show()
+    if startup_profile.enabled or args.startup_check:
+        def event_loop_started():
+            startup_profile.mark("janela exibida (loop de eventos ativo)")
+            startup_profile.report()
+            if args.startup_check:
+                app.exit(0 if startup_profile.within_budget() else 1)
+        QTimer.singleShot(0, event_loop_started)
+    sys.exit(app.exec_())
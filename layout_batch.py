@@ -0,0 +1,186 @@
+"""
+Renderização em lote dos layouts, sem interface gráfica.
+
+Lê os layouts do backend (todas as lojas ou as escolhidas) ou de arquivos
+gerados por "Salvar como JSON" e exporta cada um para PDF/PNG/SVG com
+layout_export, distribuindo as lojas entre processos (um QApplication
+offscreen por processo). Um manifesto na pasta de saída guarda o hash de
+cada layout renderizado, e as lojas que não mudaram são puladas na próxima
+execução.
+
+Uso:
+    python layout_batch.py --api http://127.0.0.1:8000 --out renders --format pdf
+    python layout_batch.py --out renders --format png --dpi 150 loja_1.json loja_2.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+MANIFEST_NAME = ".layout_batch.json"
+
+_qt_app = None  # QApplication do processo de trabalho
+
+
+def category_color(category_id):
+    """Cor fixa por categoria, para que a mesma loja gere sempre o mesmo arquivo."""
+    from PyQt5.QtGui import QColor
+    return QColor.fromHsv(category_id * 137 % 360, 90, 240).name()
+
+
+def layout_hash(modules, fmt, dpi):
+    """Hash do conteúdo do layout e dos parâmetros de renderização (a versão do servidor não entra)."""
+    digest = hashlib.sha256(f"{fmt}:{dpi}:".encode())
+    for module in sorted(modules, key=lambda module: module["module_id"]):
+        digest.update(json.dumps(module, sort_keys=True, separators=(",", ":")).encode())
+    return digest.hexdigest()
+
+
+def load_modules(source):
+    """
+    Carrega os módulos de uma origem.
+
+    Args:
+        source (tuple): ("api", base_url, store_id) ou ("json", caminho).
+
+    Returns:
+        list: Módulos no formato de Module.dict().
+    """
+    if source[0] == "api":
+        import requests
+        _, base_url, store_id = source
+        response = requests.get(f"{base_url}/store-layout/{store_id}", timeout=60)
+        response.raise_for_status()
+        return [module for column in response.json()["columns"] for module in column]
+
+    from layout_io import iter_layout_json
+    with open(source[1], "rb") as json_file:
+        return [event[2] for event in iter_layout_json(json_file) if event[0] == "module"]
+
+
+def _init_worker():
+    global _qt_app
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PyQt5.QtWidgets import QApplication
+    _qt_app = QApplication.instance() or QApplication([])
+
+
+def render_store(key, source, out_path, fmt, dpi, previous_hash=None):
+    """
+    Carrega e renderiza uma loja (executado nos processos de trabalho).
+
+    Returns:
+        dict: key, hash, files, modules, skipped e seconds (tempo de carga + renderização).
+    """
+    from layout_export import export_layout
+
+    started = time.perf_counter()
+    modules = load_modules(source)
+    digest = layout_hash(modules, fmt, dpi)
+    result = {"key": key, "hash": digest, "files": [], "modules": len(modules), "skipped": False}
+    if digest == previous_hash:
+        result["skipped"] = True
+    else:
+        colors = {module["category_id"]: category_color(module["category_id"])
+                  for module in modules if module.get("category_id")}
+        result["files"] = export_layout(modules, out_path, fmt, dpi, colors)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def list_sources(args):
+    """Retorna [(chave no manifesto, origem, nome base do arquivo de saída)]."""
+    if args.api:
+        import requests
+        response = requests.get(f"{args.api}/store/", timeout=60)
+        response.raise_for_status()
+        store_ids = [store["id"] for store in response.json()["stores"]]
+        if args.stores:
+            wanted = set(args.stores)
+            store_ids = [store_id for store_id in store_ids if store_id in wanted]
+        return [(f"store:{store_id}", ("api", args.api, store_id), f"store_{store_id}") for store_id in store_ids]
+    return [(f"json:{os.path.abspath(path)}", ("json", path), os.path.splitext(os.path.basename(path))[0])
+            for path in args.files]
+
+
+def read_manifest(path):
+    try:
+        with open(path) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(path, manifest):
+    # Grava em um arquivo temporário e troca, para não deixar um manifesto pela metade
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def run_batch(args):
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, MANIFEST_NAME)
+    manifest = {} if args.force else read_manifest(manifest_path)
+    sources = list_sources(args)
+
+    rendered = skipped = failed = modules = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        futures = {}
+        for key, source, base_name in sources:
+            entry = manifest.get(key)
+            # Só pula se os arquivos da execução anterior ainda existirem
+            previous_hash = entry["hash"] if entry and all(os.path.exists(path) for path in entry["files"]) else None
+            out_path = os.path.join(args.out, f"{base_name}.{args.format}")
+            futures[pool.submit(render_store, key, source, out_path, args.format, args.dpi, previous_hash)] = key
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{done}/{len(futures)}] {key}: erro: {e}", file=sys.stderr)
+                    continue
+                modules += result["modules"]
+                if result["skipped"]:
+                    skipped += 1
+                else:
+                    rendered += 1
+                    manifest[key] = {"hash": result["hash"], "files": result["files"]}
+                if args.verbose:
+                    status = "sem mudanças" if result["skipped"] else f"{len(result['files'])} arquivo(s)"
+                    print(f"[{done}/{len(futures)}] {key}: {status} em {result['seconds']:.2f} s")
+        finally:
+            write_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(sources)} lojas em {elapsed:.1f} s ({len(sources) / max(elapsed, 1e-9):.1f} lojas/s, "
+          f"{modules / max(elapsed, 1e-9):.0f} módulos/s): {rendered} renderizadas, "
+          f"{skipped} sem mudanças, {failed} com erro")
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Renderiza layouts de lojas em lote, sem interface gráfica.")
+    parser.add_argument("files", nargs="*", help="Arquivos JSON gerados por 'Salvar como JSON'")
+    parser.add_argument("--api", help="URL do backend; renderiza as lojas cadastradas")
+    parser.add_argument("--stores", type=int, nargs="+", help="Com --api, renderiza só estas lojas")
+    parser.add_argument("--out", default="renders", help="Pasta de saída (default: renders)")
+    parser.add_argument("--format", choices=("pdf", "png", "svg"), default="pdf")
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processos de renderização")
+    parser.add_argument("--force", action="store_true", help="Renderiza mesmo as lojas sem mudanças")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Mostra o resultado de cada loja")
+    args = parser.parse_args(argv)
+    if bool(args.api) == bool(args.files):
+        parser.error("informe --api ou arquivos JSON (e não os dois)")
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(run_batch(parse_args()))
@@ -0,0 +1,363 @@
+"""
+Benchmarks do backend, da montagem da cena e do JSON de layout.
+
+Mede, em tamanhos parametrizáveis (quantidade de módulos por loja e de lojas):
+
+- api: create_store, get_store_layout (com e sem o cache de respostas),
+  update_store_layout e get_store_layout_share pelo TestClient do FastAPI;
+  criação em lote e share agregado de várias lojas;
+- scene: StoreLayoutApp.update_layout_from_api (até a cena ficar pronta) e
+  draw_grid (com o repaint da área visível), no Qt offscreen;
+- io: save_as_json e stream_layout_file (o carregamento de load_from_json)
+  do editor, ida e volta em arquivo.
+
+Cada medida é repetida e o resultado (mínimo, mediana, média, máximo) vai
+para um JSON junto com o ambiente da execução. Com --baseline, as medianas
+são comparadas com as de uma execução anterior, e o código de saída é 1 se
+alguma ficou mais lenta que a tolerância.
+
+Uso:
+    python layout_bench.py --out bench.json
+    python layout_bench.py --quick --baseline bench.json
+    python layout_bench.py --results bench_novo.json --baseline bench.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SUITES = ("api", "scene", "io")
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+DEFAULT_STORES = (1, 100, 1000, 10000)
+QUICK_SIZES = (100, 1000)
+QUICK_STORES = (1, 100)
+MODULES_PER_COLUMN = 50
+CATEGORIES = 8  # Categorias distribuídas nos layouts gerados
+
+
+def make_layout(store_id, modules, rng):
+    """Layout com `modules` módulos em colunas de MODULES_PER_COLUMN e categorias aleatórias."""
+    columns = []
+    for module_id in range(modules):
+        column, row = divmod(module_id, MODULES_PER_COLUMN)
+        if row == 0:
+            columns.append([])
+        columns[-1].append({"module_id": module_id, "column": column, "row": row, "x": column * 70, "y": row * 40,
+                            "name": f"Module {module_id}", "category_id": rng.randint(1, CATEGORIES),
+                            "width": 60, "height": 30, "rotation": 0})
+    return {"store_id": store_id, "columns": columns}
+
+
+def measure(func, repeat, warmup=1, setup=None):
+    """
+    Executa func(i) `warmup` + `repeat` vezes e retorna os tempos (s) das repetições.
+
+    O coletor de lixo roda antes de cada execução, para que o lixo de uma
+    não seja cobrado da seguinte; `setup`, se houver, também roda antes de
+    cada execução e fica fora do tempo medido.
+    """
+    times = []
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        func(i)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            times.append(elapsed)
+    return times
+
+
+class BenchmarkRun:
+    def __init__(self, repeat, verbose=True):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = []
+
+    def add(self, name, size, unit, func, repeat=None, warmup=1, setup=None):
+        times = measure(func, repeat or self.repeat, warmup, setup)
+        median = statistics.median(times)
+        result = {"name": name, "size": size, "unit": unit, "repeat": len(times),
+                  "min": min(times), "median": median, "mean": statistics.fmean(times), "max": max(times),
+                  "per_item_us": median * 1e6 / size if size else None}
+        self.results.append(result)
+        if self.verbose:
+            print(f"  {name:<34} {size:>7} {unit:<8} mediana {median * 1000:9.2f} ms  "
+                  f"(mín {result['min'] * 1000:.2f}, máx {result['max'] * 1000:.2f})", flush=True)
+        return result
+
+
+def bench_api(run, sizes, store_counts, rng):
+    from fastapi.testclient import TestClient
+    import layout_server
+
+    client = TestClient(layout_server.app)
+    next_store_id = iter(range(10_000_000, sys.maxsize))
+
+    def check(response):
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.method} {response.request.url}: "
+                               f"{response.status_code} {response.text[:200]}")
+        return response
+
+    for size in sizes:
+        columns = -(-size // MODULES_PER_COLUMN)
+        per_column = min(size, MODULES_PER_COLUMN)
+        run.add("api.create_store", columns * per_column, "modules", lambda i: check(client.post("/store/", json={
+            "id": next(next_store_id), "name": "bench", "num_columns": columns, "modules_per_column": per_column})))
+
+        store_id = next(next_store_id)
+        check(client.post("/store/", json={"id": store_id, "name": "bench", "num_columns": columns,
+                                           "modules_per_column": per_column}))
+        layout = make_layout(store_id, size, rng)
+        run.add("api.update_store_layout", size, "modules",
+                lambda i: check(client.put(f"/store-layout/{store_id}", json=layout)))
+        run.add("api.get_store_layout", size, "modules",
+                lambda i: check(client.get(f"/store-layout/{store_id}")))
+
+        def get_uncached(i):
+            layout_server.forget_layout_responses(store_id)
+            check(client.get(f"/store-layout/{store_id}"))
+
+        run.add("api.get_store_layout_uncached", size, "modules", get_uncached)
+        run.add("api.get_store_layout_share", size, "modules",
+                lambda i: check(client.get(f"/store-layout/{store_id}/share")))
+
+    for count in store_counts:
+        batches = []
+
+        def create_bulk(i):
+            store_ids = [next(next_store_id) for _ in range(count)]
+            body = "\n".join(json.dumps({"id": store_id, "name": "bench", "num_columns": 2, "modules_per_column": 10})
+                             for store_id in store_ids)
+            check(client.post("/stores/bulk", content=body.encode(), headers={"content-type": "application/x-ndjson"}))
+            batches.append(store_ids)
+
+        run.add("api.create_stores_bulk", count, "stores", create_bulk)
+        store_ids = batches[-1]
+        run.add("api.share_bulk", count, "stores",
+                lambda i: check(client.post("/share/bulk", json={"store_ids": store_ids, "weight": "area"})))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def qt_window():
+    # Editor offscreen falando com um servidor local (load_from_json cria a loja pela API)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    port = free_port()
+    os.environ["LAYOUT_API_URL"] = f"http://127.0.0.1:{port}"
+    import app_layout
+    from PyQt5.QtWidgets import QApplication
+
+    qt_app = QApplication.instance() or QApplication(sys.argv[:1])
+    app_layout.start_local_server(port=port)
+    window = app_layout.StoreLayoutApp()
+    window.set_live_sync(False)  # Os layouts gerados não existem no servidor
+    window.setGeometry(0, 0, 1000, 700)
+    window.show()
+    qt_app.processEvents()
+    return qt_app, window
+
+
+def wait_until(qt_app, condition, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("tempo esgotado esperando o editor")
+        qt_app.processEvents()
+
+
+def settle_api(qt_app, window):
+    # Espera as requisições disparadas pelo editor (ex.: criar a loja e salvar o layout depois de carregar um JSON)
+    while True:
+        window.api.pool.waitForDone()
+        qt_app.processEvents()
+        if not window.api.pool.activeThreadCount():
+            return
+
+
+def load_scene(qt_app, window, layout):
+    window.store_id = layout["store_id"]
+    window.num_columns = len(layout["columns"])
+    window.update_layout_from_api(layout)
+    wait_until(qt_app, lambda: window.scene_build is None)
+
+
+def bench_scene(run, sizes, rng, qt_app, window):
+    for size in sizes:
+        layout = make_layout(1, size, rng)  # Sem versão: a cena é sempre recriada
+        run.add("scene.update_layout_from_api", size, "modules", lambda i: load_scene(qt_app, window, layout))
+
+        def draw_grid(i):
+            window.scene.draw_grid()
+            window.view.viewport().repaint()
+
+        run.add("scene.draw_grid", size, "modules", draw_grid)
+    window.clear_scene()
+
+
+def bench_io(run, sizes, rng, qt_app, window):
+    from unittest import mock
+    from PyQt5.QtWidgets import QFileDialog
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "layout.json")
+        for size in sizes:
+            load_scene(qt_app, window, make_layout(rng.randint(20_000_000, 30_000_000), size, rng))
+            for label, file_filter in (("", "JSON Files (*.json)"), ("_compact", "JSON compacto (*.json)")):
+                with mock.patch.object(QFileDialog, "getSaveFileName", return_value=(path, file_filter)):
+                    run.add(f"io.save_as_json{label}", size, "modules", lambda i: window.save_as_json())
+
+            def load(i):
+                # stream_layout_file direto: load_from_json só imprime os erros, e uma falha seria medida como sucesso
+                window.stream_layout_file(path)
+                if len(window.module_models) != size:
+                    raise RuntimeError(f"{len(window.module_models)} de {size} módulos carregados de {path}")
+
+            run.add("io.load_from_json", size, "modules", load, setup=lambda: settle_api(qt_app, window))
+            settle_api(qt_app, window)
+            window.api.cancel("layout", "share")
+    window.clear_scene()
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    info = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "commit": commit, "storage": os.environ.get("LAYOUT_STORAGE", "memory"),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "seed": args.seed, "repeat": args.repeat}
+    if "scene" in args.suites or "io" in args.suites:
+        from PyQt5.QtCore import QT_VERSION_STR
+        info["qt"] = QT_VERSION_STR
+    return info
+
+
+def run_benchmarks(args):
+    rng = random.Random(args.seed)
+    run = BenchmarkRun(args.repeat)
+    if args.storage:
+        os.environ["LAYOUT_STORAGE"] = args.storage  # Lido por layout_server na importação
+    info = environment(args)
+    if "api" in args.suites:
+        print("api:")
+        bench_api(run, args.sizes, args.stores, rng)
+    if "scene" in args.suites or "io" in args.suites:
+        qt_app, window = qt_window()
+        if "scene" in args.suites:
+            print("scene:")
+            bench_scene(run, args.sizes, rng, qt_app, window)
+        if "io" in args.suites:
+            print("io:")
+            bench_io(run, args.sizes, rng, qt_app, window)
+        settle_api(qt_app, window)
+        window.close()
+        qt_app.processEvents()
+    return {"environment": info, "results": run.results}
+
+
+def compare(current, baseline, tolerance, min_delta):
+    """
+    Compara as medianas de duas execuções.
+
+    Uma medida regrediu se ficou mais de `tolerance` (fração) mais lenta e
+    a diferença passou de `min_delta` segundos (evita alarmes por ruído em
+    medidas muito curtas).
+
+    Returns:
+        list: Medidas que regrediram.
+    """
+    base = {(result["name"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    print(f"{'medida':<34} {'tamanho':>7} {'base (ms)':>10} {'atual (ms)':>10} {'razão':>7}")
+    for result in current["results"]:
+        key = (result["name"], result["size"])
+        reference = base.pop(key, None)
+        if reference is None:
+            print(f"{result['name']:<34} {result['size']:>7} {'-':>10} {result['median'] * 1000:10.2f}    nova")
+            continue
+        ratio = result["median"] / reference["median"] if reference["median"] else float("inf")
+        status = ""
+        if ratio > 1 + tolerance and result["median"] - reference["median"] > min_delta:
+            status = "REGRESSÃO"
+            regressions.append({**result, "baseline": reference["median"], "ratio": ratio})
+        elif ratio < 1 - tolerance:
+            status = "melhorou"
+        print(f"{result['name']:<34} {result['size']:>7} {reference['median'] * 1000:10.2f} "
+              f"{result['median'] * 1000:10.2f} {ratio:7.2f}  {status}")
+    for name, size in base:
+        print(f"{name:<34} {size:>7}  ausente nesta execução")
+    return regressions
+
+
+def parse_list(text):
+    return tuple(int(value) for value in text.split(",") if value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do backend, da cena e do JSON de layout.")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Conjuntos a rodar ({', '.join(SUITES)})")
+    parser.add_argument("--sizes", type=parse_list, help="Módulos por loja (ex.: 100,1000,10000,50000)")
+    parser.add_argument("--stores", type=parse_list, help="Lojas nos testes em lote (ex.: 1,100,1000,10000)")
+    parser.add_argument("--quick", action="store_true", help="Tamanhos pequenos, para uma checagem rápida")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições de cada medida (default: 5)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--storage", help="LAYOUT_STORAGE do servidor (ex.: sqlite:///bench.db)")
+    parser.add_argument("--out", help="Grava os resultados neste JSON")
+    parser.add_argument("--results", help="Não roda os benchmarks; compara este JSON com --baseline")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Fração de aumento da mediana considerada regressão (default: 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Diferença mínima, em ms, para considerar regressão (default: 1)")
+    args = parser.parse_args(argv)
+    args.suites = tuple(suite for suite in args.suites.split(",") if suite)
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"conjuntos desconhecidos: {', '.join(sorted(unknown))}")
+    args.sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    args.stores = args.stores or (QUICK_STORES if args.quick else DEFAULT_STORES)
+    if args.results and not args.baseline:
+        parser.error("--results exige --baseline")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.results:
+        with open(args.results) as results_file:
+            current = json.load(results_file)
+    else:
+        current = run_benchmarks(args)
+        if args.out:
+            with open(args.out, "w") as out_file:
+                json.dump(current, out_file, indent=1)
+            print(f"Resultados gravados em {args.out}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(current, baseline, args.tolerance, args.min_delta_ms / 1000)
+    if regressions:
+        print(f"{len(regressions)} medida(s) mais lenta(s) que a base além da tolerância de {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
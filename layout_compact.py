@@ -0,0 +1,183 @@
+"""
+Representação compacta dos layouts no servidor.
+
+Cada layout guarda um array tipado por campo (struct-of-arrays) em vez de
+um dict por módulo, e os nomes ficam em uma tabela de strings compartilhada
+entre as lojas. A conversão para o formato de StoreLayoutData acontece só
+na entrada e na saída da API; o restante do backend (contadores,
+operações, busca) trabalha direto sobre os arrays.
+"""
+from array import array
+
+# (atributo do layout, campo do módulo); todos os arrays usam inteiros de 32 bits
+COMPACT_FIELDS = (("module_ids", "module_id"), ("columns", "column"), ("rows", "row"),
+                  ("x", "x"), ("y", "y"), ("width", "width"), ("height", "height"),
+                  ("rotation", "rotation"), ("category_ids", "category_id"))
+MODULE_DEFAULTS = {"width": 60, "height": 30, "rotation": 0}
+INT32_MIN = -(2 ** 31)
+INT32_MAX = 2 ** 31 - 1
+NO_CATEGORY = INT32_MIN  # Valor guardado em category_ids para módulos sem categoria (não é um ID válido)
+DEFAULT_NAME = -1  # Valor guardado em name_refs para o nome padrão "Module {id}"
+FIELD_MIN = {"column": 0, "row": 0, "category_id": INT32_MIN + 1}  # Campos cujo mínimo não é INT32_MIN
+
+
+def check_module_values(values):
+    """
+    Verifica se os campos inteiros cabem nos arrays de 32 bits.
+
+    Args:
+        values (dict): Módulo completo ou só os campos alterados por uma operação.
+
+    Raises:
+        ValueError: Se algum campo estiver fora do intervalo (ou se category_id for NO_CATEGORY,
+            ou column/row forem negativos).
+    """
+    for _, field in COMPACT_FIELDS:
+        value = values.get(field)
+        if value is None:
+            continue
+        low = FIELD_MIN.get(field, INT32_MIN)
+        if not low <= value <= INT32_MAX:
+            raise ValueError(f"Campo {field} fora do intervalo permitido: {value}")
+
+
+class StringTable:
+    """Tabela de strings internadas; cada string é guardada uma única vez."""
+
+    def __init__(self):
+        self.strings = []
+        self.positions = {}
+
+    def intern(self, value):
+        position = self.positions.get(value)
+        if position is None:
+            position = self.positions[value] = len(self.strings)
+            self.strings.append(value)
+        return position
+
+    def __getitem__(self, position):
+        return self.strings[position]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class CompactLayout:
+    """
+    Layout de uma loja em arrays paralelos, um elemento por módulo.
+
+    A posição de um módulo nos arrays (slot) não tem significado; to_layout()
+    agrupa os módulos por coluna e os ordena por linha e ID, como o SQLiteStorage.
+    `index` ({module_id: slot}) é mantido a cada append() e remove().
+    """
+
+    __slots__ = ("store_id", "version", "num_columns", "strings", "name_refs", "index") + tuple(
+        attribute for attribute, _ in COMPACT_FIELDS)
+
+    def __init__(self, store_id, strings, version=0, num_columns=0):
+        self.store_id = store_id
+        self.version = version
+        self.num_columns = num_columns
+        self.strings = strings
+        self.name_refs = array("i")
+        self.index = {}
+        for attribute, _ in COMPACT_FIELDS:
+            setattr(self, attribute, array("i"))
+
+    @classmethod
+    def from_layout(cls, layout, strings):
+        """
+        Cria o layout compacto a partir do formato de StoreLayoutData.dict().
+
+        Args:
+            layout (dict): Layout com "store_id", "columns" e "version".
+            strings (StringTable): Tabela onde os nomes dos módulos são internados.
+        """
+        columns = layout.get("columns", [])
+        compact = cls(layout["store_id"], strings, layout.get("version") or 0, len(columns))
+        for column in columns:
+            for module in column:
+                compact.append(module)
+        return compact
+
+    def __len__(self):
+        return len(self.module_ids)
+
+    def append(self, module):
+        # Verifica antes de alterar qualquer array, para não deixá-los com tamanhos diferentes
+        check_module_values(module)
+        self.index[module["module_id"]] = len(self)
+        for attribute, field in COMPACT_FIELDS:
+            value = module.get(field)
+            if value is None:
+                value = NO_CATEGORY if field == "category_id" else MODULE_DEFAULTS[field]
+            getattr(self, attribute).append(value)
+        self.name_refs.append(self._name_ref(module["module_id"], module["name"]))
+        self.num_columns = max(self.num_columns, module["column"] + 1)
+
+    def remove(self, slot):
+        """
+        Remove o módulo do slot movendo o último módulo para o lugar dele.
+
+        Returns:
+            int | None: ID do módulo que passou a ocupar `slot`, se houver.
+        """
+        last = len(self) - 1
+        del self.index[self.module_ids[slot]]
+        for values in self._arrays():
+            values[slot] = values[last]
+            del values[last]
+        if slot == last:
+            return None
+        moved_id = self.module_ids[slot]
+        self.index[moved_id] = slot
+        return moved_id
+
+    def module(self, slot):
+        """Retorna o módulo do slot como dict, no formato de Module.dict()."""
+        module = {field: getattr(self, attribute)[slot] for attribute, field in COMPACT_FIELDS}
+        if module["category_id"] == NO_CATEGORY:
+            module["category_id"] = None
+        name_ref = self.name_refs[slot]
+        module["name"] = f"Module {module['module_id']}" if name_ref == DEFAULT_NAME else self.strings[name_ref]
+        return module
+
+    def update(self, slot, changes):
+        # Altera campos de um módulo existente (mesmo formato de op_changes)
+        for attribute, field in COMPACT_FIELDS:
+            if field in changes:
+                value = changes[field]
+                if value is None:
+                    value = NO_CATEGORY if field == "category_id" else MODULE_DEFAULTS[field]
+                getattr(self, attribute)[slot] = value
+        if "name" in changes:
+            self.name_refs[slot] = self._name_ref(self.module_ids[slot], changes["name"])
+        self.num_columns = max(self.num_columns, self.columns[slot] + 1)
+
+    def to_layout(self):
+        """Converte para o formato de StoreLayoutData.dict()."""
+        columns = [[] for _ in range(self.num_columns)]
+        order = sorted(range(len(self)), key=lambda slot: (self.columns[slot], self.rows[slot], self.module_ids[slot]))
+        for slot in order:
+            columns[self.columns[slot]].append(self.module(slot))
+        return {"store_id": self.store_id, "columns": columns, "version": self.version}
+
+    def as_numpy(self):
+        """
+        Retorna views NumPy (sem cópia) dos arrays, para código vetorizado.
+
+        As views ficam inválidas depois de qualquer alteração no layout.
+        """
+        import numpy as np
+        return {attribute: np.frombuffer(values, dtype=np.int32)
+                for attribute, values in zip(("name_refs",) + tuple(a for a, _ in COMPACT_FIELDS), self._arrays())}
+
+    def nbytes(self):
+        """Memória ocupada pelos arrays (sem a tabela de strings compartilhada)."""
+        return sum(values.itemsize * len(values) for values in self._arrays())
+
+    def _arrays(self):
+        return [self.name_refs] + [getattr(self, attribute) for attribute, _ in COMPACT_FIELDS]
+
+    def _name_ref(self, module_id, name):
+        return DEFAULT_NAME if name == f"Module {module_id}" else self.strings.intern(name)
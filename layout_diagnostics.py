@@ -0,0 +1,235 @@
+"""
+Diagnóstico de travamentos do editor.
+
+Com o diagnóstico ligado (Visualizar > Diagnóstico, ou LAYOUT_DIAGNOSTICS=1):
+
+- StoreLayoutView mede o tempo de cada pintura e conta os itens visíveis, e
+  mostra um resumo sobreposto à cena;
+- um timer na thread da interface bate a cada HEARTBEAT_MS e uma thread de
+  vigia percebe quando as batidas param por mais de LAYOUT_STALL_MS (padrão
+  200). Enquanto o loop de eventos estiver parado, a vigia guarda a pilha
+  da thread da interface, mostrando onde ela está presa;
+- os métodos marcados com @diagnostics.timed (ações do StoreLayoutApp,
+  center_text, snap, montagem da cena, requisições da API...) têm a duração
+  registrada.
+
+"Exportar Diagnóstico" grava tudo em JSON no formato Trace Event (abre no
+chrome://tracing ou no Perfetto), com o resumo por ação em "otherData".
+"""
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+from PyQt5.QtCore import QTimer
+
+HEARTBEAT_MS = 20
+DEFAULT_STALL_MS = 200
+MAX_FRAMES = 10000
+MAX_EVENTS = 20000
+MAX_STALLS = 500
+MAX_STACK_SAMPLES = 20  # Pilhas guardadas por travamento
+
+
+class Diagnostics:
+    def __init__(self, stall_ms=DEFAULT_STALL_MS):
+        self.enabled = False
+        self.stall_ms = stall_ms
+        self.origin = time.perf_counter()
+        self.frames = deque(maxlen=MAX_FRAMES)  # (início, duração, itens visíveis), em segundos
+        self.events = deque(maxlen=MAX_EVENTS)  # (nome, início, duração, thread)
+        self.stalls = deque(maxlen=MAX_STALLS)  # (início, duração, [(pilha, amostras)])
+        self.action_stats = {}  # nome -> [chamadas, total, máximo]
+        self.lock = threading.Lock()
+        self.heartbeat = None
+        self.last_beat = None
+        self.stall_stacks = None  # Pilhas do travamento em andamento (preenchidas pela vigia)
+        self.gui_thread = None
+        self.watchdog_stop = None
+
+    def start(self, parent):
+        """Liga a medição; chamado na thread da interface."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self.gui_thread = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.heartbeat = QTimer(parent)
+        self.heartbeat.setInterval(HEARTBEAT_MS)
+        self.heartbeat.timeout.connect(self._beat)
+        self.heartbeat.start()
+        self.watchdog_stop = threading.Event()
+        threading.Thread(target=self._watch, args=(self.watchdog_stop,), name="stall-watchdog", daemon=True).start()
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.heartbeat.stop()
+        self.heartbeat.deleteLater()
+        self.heartbeat = None
+        self.watchdog_stop.set()
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.events.clear()
+            self.stalls.clear()
+            self.action_stats.clear()
+
+    @contextmanager
+    def measure(self, name):
+        """Registra a duração do bloco (sem custo com o diagnóstico desligado)."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_event(name, started, time.perf_counter() - started)
+
+    def timed(self, func):
+        """
+        Decorador: registra a duração de cada chamada com o nome qualificado da função.
+
+        Como o wrapper aceita qualquer argumento, o PyQt passaria a ele tudo o
+        que o sinal emite (ex.: o `checked` de QAction.triggered); os
+        argumentos posicionais além dos que a função aceita são descartados,
+        como o PyQt faz com os slots comuns.
+        """
+        name = func.__qualname__
+        code = func.__code__
+        max_args = None if code.co_flags & inspect.CO_VARARGS else code.co_argcount
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if max_args is not None and len(args) > max_args:
+                args = args[:max_args]
+            if not self.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record_event(name, started, time.perf_counter() - started)
+        return wrapper
+
+    def record_event(self, name, started, duration):
+        # Pode ser chamado de qualquer thread (ex.: requisições da API)
+        with self.lock:
+            self.events.append((name, started, duration, threading.get_ident()))
+            stats = self.action_stats.get(name)
+            if stats is None:
+                self.action_stats[name] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+
+    def record_frame(self, started, duration, visible_items):
+        self.frames.append((started, duration, visible_items))
+
+    def frame_summary(self, last=120):
+        frames = list(self.frames)[-last:]
+        if not frames:
+            return None
+        durations = [frame[1] for frame in frames]
+        span = frames[-1][0] + frames[-1][1] - frames[0][0]
+        return {"last_ms": durations[-1] * 1000, "mean_ms": sum(durations) / len(durations) * 1000,
+                "max_ms": max(durations) * 1000, "frames": len(frames),
+                "fps": (len(frames) - 1) / span if len(frames) > 1 and span > 0 else None,
+                "visible_items": frames[-1][2]}
+
+    def overlay_lines(self):
+        """Texto do resumo exibido sobre a cena."""
+        lines = []
+        frames = self.frame_summary()
+        if frames is None:
+            lines.append("Quadro: -")
+        else:
+            fps = f", {frames['fps']:.0f} quadros/s" if frames["fps"] else ""
+            lines.append(f"Quadro: {frames['last_ms']:.1f} ms (média {frames['mean_ms']:.1f}, "
+                         f"máx {frames['max_ms']:.1f} nos últimos {frames['frames']}{fps})")
+            lines.append(f"Itens visíveis: {frames['visible_items']}")
+        with self.lock:
+            stalls = list(self.stalls)
+            recent = list(self.events)[-3:]
+        last_stall = f", último {stalls[-1][1] * 1000:.0f} ms" if stalls else ""
+        lines.append(f"Travamentos (> {self.stall_ms} ms): {len(stalls)}{last_stall}")
+        for name, _, duration, _ in reversed(recent):
+            lines.append(f"{name}: {duration * 1000:.1f} ms")
+        return lines
+
+    def _beat(self):
+        now = time.perf_counter()
+        gap = now - self.last_beat
+        self.last_beat = now
+        with self.lock:
+            stacks, self.stall_stacks = self.stall_stacks, None
+            if gap * 1000 >= self.stall_ms:
+                # O travamento começou logo depois da batida anterior
+                self.stalls.append((now - gap, gap, sorted((stacks or {}).items(), key=lambda item: -item[1])))
+
+    def _watch(self, stop):
+        # Vigia: enquanto a interface não bate, amostra a pilha da thread dela
+        interval = HEARTBEAT_MS / 1000
+        while not stop.wait(interval):
+            if time.perf_counter() - self.last_beat < self.stall_ms / 1000:
+                continue
+            frame = sys._current_frames().get(self.gui_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            with self.lock:
+                if self.stall_stacks is None:
+                    self.stall_stacks = {}
+                if stack in self.stall_stacks or len(self.stall_stacks) < MAX_STACK_SAMPLES:
+                    self.stall_stacks[stack] = self.stall_stacks.get(stack, 0) + 1
+
+    def export(self, path):
+        """Grava os quadros, ações e travamentos em JSON (formato Trace Event)."""
+        pid = os.getpid()
+
+        def us(seconds):
+            return round((seconds - self.origin) * 1e6, 1)
+
+        with self.lock:
+            events = list(self.events)
+            stalls = list(self.stalls)
+            stats = {name: list(values) for name, values in self.action_stats.items()}
+        frames = list(self.frames)
+
+        trace = []
+        for started, duration, visible_items in frames:
+            trace.append({"name": "paint", "cat": "frame", "ph": "X", "ts": us(started),
+                          "dur": round(duration * 1e6, 1), "pid": pid, "tid": self.gui_thread,
+                          "args": {"visible_items": visible_items}})
+        for name, started, duration, thread in events:
+            trace.append({"name": name, "cat": "action", "ph": "X", "ts": us(started),
+                          "dur": round(duration * 1e6, 1), "pid": pid, "tid": thread})
+        for started, duration, stacks in stalls:
+            trace.append({"name": "stall", "cat": "stall", "ph": "X", "ts": us(started),
+                          "dur": round(duration * 1e6, 1), "pid": pid, "tid": self.gui_thread,
+                          "args": {"stacks": [{"samples": count, "stack": stack} for stack, count in stacks]}})
+        trace.sort(key=lambda event: event["ts"])
+
+        summary = {
+            "stall_ms": self.stall_ms,
+            "stalls": len(stalls),
+            "frames": self.frame_summary(len(frames)),
+            "actions": {name: {"calls": calls, "total_ms": total * 1000, "mean_ms": total / calls * 1000,
+                               "max_ms": longest * 1000}
+                        for name, (calls, total, longest) in sorted(stats.items(), key=lambda item: -item[1][1])},
+        }
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms", "otherData": summary}, trace_file, indent=1)
+
+
+diagnostics = Diagnostics(stall_ms=int(os.environ.get("LAYOUT_STALL_MS", DEFAULT_STALL_MS)))
@@ -0,0 +1,162 @@
+"""
+Sincronização ao vivo dos editores por Server-Sent Events.
+
+Cada PATCH/PUT aceito vira um evento com a nova versão do layout, que
+serve de número de sequência. Os eventos são gravados no armazenamento
+(compartilhado entre os workers) e cada processo tem um único leitor que
+os repassa aos editores conectados. O JSON de cada evento é montado uma
+vez, e os mesmos bytes vão para todos os inscritos da loja. Não há
+serialização do layout completo por mensagem.
+
+Um editor que reconecta informa a última versão recebida (parâmetro
+`after` ou cabeçalho Last-Event-ID) e recebe os eventos seguintes. Se eles
+já tiverem sido descartados, recebe "reset" e recarrega o layout.
+"""
+import asyncio
+import json
+
+from fastapi.concurrency import run_in_threadpool
+
+from layout_response_cache import encode_json
+
+POLL_INTERVAL = 0.1  # Segundos entre leituras de eventos gravados por outros processos
+HEARTBEAT_INTERVAL = 15  # Segundos sem eventos até mandar um comentário (mantém a conexão viva)
+QUEUE_SIZE = 1000  # Eventos pendentes por editor; um editor mais lento que isso é desconectado
+
+
+def event_frame(version, data):
+    return f"id: {version}\nevent: delta\ndata: {data}\n\n".encode()
+
+
+def reset_frame(version):
+    return f"event: reset\ndata: {json.dumps({'version': version})}\n\n".encode()
+
+
+class _Subscriber:
+    __slots__ = ("queue", "overflowed")
+
+    def __init__(self):
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+
+class LayoutEventHub:
+    """
+    Distribui os eventos de alteração dos layouts aos editores conectados.
+
+    publish() pode ser chamado de qualquer thread; stream() roda no loop do
+    servidor.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.subscribers = {}  # store_id -> set de _Subscriber
+        self.cursor = None  # Último evento já repassado por este processo
+        self.loop = None
+        self.wakeup = None
+        self.reader = None
+
+    def publish(self, store_id, version, event):
+        """
+        Registra o evento da `version` da loja.
+
+        Args:
+            event (dict): Conteúdo do evento (kind, ops, origin...).
+        """
+        data = encode_json({"store_id": store_id, "version": version, **event}).decode()
+        self.storage.append_event(store_id, version, data)
+        if self.loop is not None:
+            # Eventos deste processo são repassados na hora, sem esperar a próxima leitura
+            try:
+                self.loop.call_soon_threadsafe(self.wakeup.set)
+            except RuntimeError:
+                pass  # Loop já encerrado; o próximo stream() inicia outro leitor
+
+    async def stream(self, store_id, after_version):
+        """
+        Gera os frames SSE da loja a partir de `after_version`.
+
+        Primeiro envia os eventos guardados que o editor ainda não recebeu e
+        depois os novos, à medida que chegam.
+        """
+        self._start()
+        subscriber = _Subscriber()
+        # Inscreve antes de ler os eventos guardados para não perder os que chegarem no meio
+        self.subscribers.setdefault(store_id, set()).add(subscriber)
+        try:
+            last_sent = after_version
+            current_version = await run_in_threadpool(self.storage.layout_version, store_id)
+            backlog = await run_in_threadpool(self.storage.store_events, store_id, after_version)
+            if current_version is not None and current_version > after_version and (
+                    not backlog or backlog[0][2] != after_version + 1):
+                # Os eventos intermediários já foram descartados: o editor precisa recarregar
+                yield reset_frame(current_version)
+                return
+            for _, _, version, data in backlog:
+                yield event_frame(version, data)
+                last_sent = version
+
+            while True:
+                try:
+                    version, frame = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if subscriber.overflowed:
+                        yield reset_frame(last_sent)
+                        return
+                    yield b": ping\n\n"
+                    continue
+                if version is None:  # Marcador de fila cheia
+                    yield reset_frame(last_sent)
+                    return
+                if version > last_sent:
+                    yield frame
+                    last_sent = version
+        finally:
+            subscribers = self.subscribers.get(store_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[store_id]
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self.reader is not None and not self.reader.done() and self.loop is loop:
+            return
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+        self.cursor = self.storage.last_event_id()
+        self.reader = self.loop.create_task(self._read_events())
+
+    async def _read_events(self):
+        # Um leitor por processo: lê os eventos novos de todas as lojas e repassa aos inscritos
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if not self.subscribers:
+                self.cursor = await run_in_threadpool(self.storage.last_event_id)
+                continue
+            events = await run_in_threadpool(self.storage.events_since, self.cursor)
+            for event_id, store_id, version, data in events:
+                self.cursor = event_id
+                subscribers = self.subscribers.get(store_id)
+                if not subscribers:
+                    continue
+                frame = event_frame(version, data)
+                for subscriber in subscribers:
+                    self._deliver(subscriber, version, frame)
+            if len(events) == 1000:
+                self.wakeup.set()  # Ainda há eventos; lê de novo sem esperar
+
+    def _deliver(self, subscriber, version, frame):
+        if subscriber.overflowed:
+            return
+        try:
+            subscriber.queue.put_nowait((version, frame))
+        except asyncio.QueueFull:
+            subscriber.overflowed = True
+            # Libera um lugar para o marcador; o editor vai reconectar e retomar de onde parou
+            subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait((None, None))
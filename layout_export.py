@@ -0,0 +1,222 @@
+"""
+Exportação do layout completo para PDF, PNG ou SVG.
+
+A exportação não usa a cena da janela: ela monta uma cena separada a
+partir de uma cópia dos módulos (dicts no formato de Module.dict()), então
+pode rodar em uma thread de trabalho enquanto o editor continua em uso.
+Só a área ocupada pelos módulos é exportada, dividida em páginas (PDF e
+impressão) ou em tiles (PNG) quando não cabe em uma só.
+"""
+import math
+import os
+
+from PyQt5.QtCore import Qt, QRectF, QSize, QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor, QFont, QImage, QPainter, QPageSize, QPdfWriter, QPen
+from PyQt5.QtWidgets import QGraphicsRectItem, QGraphicsScene, QGraphicsSimpleTextItem
+
+EXPORT_FORMATS = ("pdf", "png", "svg")
+SCENE_DPI = 96  # Uma unidade da cena corresponde a um pixel de tela
+MAX_TILE_SIZE = 8192  # Lado máximo, em pixels, de cada imagem PNG
+MARGIN = 20  # Margem em volta dos módulos, em unidades da cena
+BAND_HEIGHT = 400  # Altura, em unidades da cena, de cada chamada a QGraphicsScene.render
+
+
+def build_export_scene(modules, category_colors=None, font=None):
+    """
+    Monta uma cena só com os módulos, independente da cena do editor.
+
+    Args:
+        modules (iterable): Módulos no formato de Module.dict().
+        category_colors (dict | None): category_id -> cor.
+        font (QFont | None): Fonte dos rótulos.
+    """
+    category_colors = category_colors or {}
+    font = font or QFont("Arial", 8)
+    scene = QGraphicsScene()
+    # Sem índice BSP: a cena é desenhada inteira uma única vez e não recebe consultas
+    scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+    for module in modules:
+        rect = QGraphicsRectItem(0, 0, module["width"], module["height"])
+        rect.setPos(module["x"], module["y"])
+        rect.setRotation(module.get("rotation") or 0)
+        color = category_colors.get(module.get("category_id"), "gray") if module.get("category_id") else "white"
+        rect.setBrush(QBrush(QColor(color)))
+        rect.setPen(QPen(Qt.black, 0))
+        label = QGraphicsSimpleTextItem(module["name"], rect)
+        label.setFont(font)
+        label_rect = label.boundingRect()
+        label.setPos((module["width"] - label_rect.width()) / 2, (module["height"] - label_rect.height()) / 2)
+        scene.addItem(rect)
+    return scene
+
+
+def render_banded(scene, painter, target, source):
+    """
+    Desenha `source` em `target` em faixas horizontais.
+
+    QGraphicsScene.render segura o GIL enquanto desenha; em faixas, a
+    thread da interface volta a rodar entre uma chamada e outra.
+    """
+    factor = target.height() / source.height()
+    top = source.top()
+    while top < source.bottom():
+        height = min(BAND_HEIGHT, source.bottom() - top)
+        band_target = QRectF(target.left(), target.top() + (top - source.top()) * factor, target.width(), height * factor)
+        painter.save()
+        painter.setClipRect(band_target)
+        scene.render(painter, band_target, QRectF(source.left(), top, source.width(), height), Qt.IgnoreAspectRatio)
+        painter.restore()
+        top += height
+
+
+def export_bounds(scene):
+    # Área ocupada pelos itens (não o canvas inteiro), com margem
+    return scene.itemsBoundingRect().adjusted(-MARGIN, -MARGIN, MARGIN, MARGIN)
+
+
+def render_pages(scene, device, source, dpi=None, progress=None):
+    """
+    Desenha `source` em escala real (SCENE_DPI unidades por polegada), uma
+    página por vez, em um QPagedPaintDevice (QPdfWriter ou QPrinter).
+
+    Returns:
+        int: Número de páginas.
+    """
+    dpi = dpi or device.logicalDpiX()
+    factor = dpi / SCENE_DPI
+    page_width, page_height = device.width() / factor, device.height() / factor
+    columns = max(1, math.ceil(source.width() / page_width))
+    rows = max(1, math.ceil(source.height() / page_height))
+
+    painter = QPainter(device)
+    painter.setRenderHint(QPainter.Antialiasing)
+    try:
+        for index, (row, column) in enumerate((row, column) for row in range(rows) for column in range(columns)):
+            if index:
+                device.newPage()
+            tile = QRectF(source.left() + column * page_width, source.top() + row * page_height,
+                          min(page_width, source.right() - (source.left() + column * page_width)),
+                          min(page_height, source.bottom() - (source.top() + row * page_height)))
+            render_banded(scene, painter, QRectF(0, 0, tile.width() * factor, tile.height() * factor), tile)
+            if progress is not None:
+                progress(index + 1, rows * columns)
+    finally:
+        painter.end()
+    return rows * columns
+
+
+def export_pdf(scene, path, dpi=300, page_size=QPageSize.A4, progress=None):
+    writer = QPdfWriter(path)
+    writer.setResolution(dpi)
+    writer.setPageSize(QPageSize(page_size))
+    render_pages(scene, writer, export_bounds(scene), dpi, progress)
+    return [path]
+
+
+def export_png(scene, path, dpi=150, tile_size=MAX_TILE_SIZE, progress=None):
+    """
+    Grava a área dos módulos em PNG; se a imagem passar de `tile_size`
+    pixels em algum lado, grava vários arquivos "<nome>_r<linha>_c<coluna>.png".
+    """
+    source = export_bounds(scene)
+    factor = dpi / SCENE_DPI
+    width, height = math.ceil(source.width() * factor), math.ceil(source.height() * factor)
+    columns, rows = math.ceil(width / tile_size), math.ceil(height / tile_size)
+    base, extension = os.path.splitext(path)
+    dots_per_meter = round(dpi / 0.0254)
+
+    paths = []
+    for row in range(rows):
+        for column in range(columns):
+            tile_width = min(tile_size, width - column * tile_size)
+            tile_height = min(tile_size, height - row * tile_size)
+            image = QImage(tile_width, tile_height, QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.white)
+            image.setDotsPerMeterX(dots_per_meter)
+            image.setDotsPerMeterY(dots_per_meter)
+            tile = QRectF(source.left() + column * tile_size / factor, source.top() + row * tile_size / factor,
+                          tile_width / factor, tile_height / factor)
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.Antialiasing)
+            render_banded(scene, painter, QRectF(0, 0, tile_width, tile_height), tile)
+            painter.end()
+
+            tile_path = path if rows * columns == 1 else f"{base}_r{row}_c{column}{extension or '.png'}"
+            if not image.save(tile_path, "PNG"):
+                raise OSError(f"Não foi possível gravar {tile_path}")
+            paths.append(tile_path)
+            if progress is not None:
+                progress(len(paths), rows * columns)
+    return paths
+
+
+def export_svg(scene, path, dpi=SCENE_DPI, progress=None):
+    from PyQt5.QtSvg import QSvgGenerator
+
+    source = export_bounds(scene)
+    generator = QSvgGenerator()
+    generator.setFileName(path)
+    generator.setResolution(dpi)
+    generator.setSize(QSize(math.ceil(source.width()), math.ceil(source.height())))
+    generator.setViewBox(QRectF(0, 0, source.width(), source.height()))
+    generator.setTitle("Layout da loja")
+    painter = QPainter(generator)
+    render_banded(scene, painter, QRectF(0, 0, source.width(), source.height()), source)
+    painter.end()
+    if progress is not None:
+        progress(1, 1)
+    return [path]
+
+
+def export_layout(modules, path, fmt, dpi=150, category_colors=None, progress=None):
+    """
+    Exporta o layout completo.
+
+    Args:
+        modules (iterable): Cópia dos módulos no formato de Module.dict().
+        path (str): Arquivo de saída.
+        fmt (str): "pdf", "png" ou "svg".
+        dpi (int): Resolução da saída.
+        progress (callable | None): Recebe (páginas/tiles prontos, total).
+
+    Returns:
+        list: Arquivos gravados.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    scene = build_export_scene(modules, category_colors)
+    if not scene.items():
+        raise ValueError("O layout não tem módulos para exportar")
+    if fmt == "pdf":
+        return export_pdf(scene, path, dpi, progress=progress)
+    if fmt == "png":
+        return export_png(scene, path, dpi, progress=progress)
+    return export_svg(scene, path, dpi, progress=progress)
+
+
+class ExportSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+
+class ExportTask(QRunnable):
+    """Executa export_layout em uma thread do QThreadPool e avisa o resultado por sinais."""
+
+    def __init__(self, modules, path, fmt, dpi=150, category_colors=None):
+        super().__init__()
+        self.modules = modules
+        self.path = path
+        self.fmt = fmt
+        self.dpi = dpi
+        self.category_colors = dict(category_colors or {})
+        self.signals = ExportSignals()
+
+    def run(self):
+        try:
+            paths = export_layout(self.modules, self.path, self.fmt, self.dpi, self.category_colors,
+                                  progress=self.signals.progress.emit)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(paths)
@@ -0,0 +1,184 @@
+"""
+Leitura e escrita de layouts em JSON sem carregar o arquivo inteiro na memória.
+
+O formato é o mesmo de StoreLayoutData.dict() serializado com json.dump:
+um objeto com "store_id", "columns" (lista de colunas, cada uma uma lista
+de módulos) e, opcionalmente, "version".
+"""
+import codecs
+import json
+
+CHUNK_SIZE = 1 << 16
+MAX_VALUE_CHARS = 1 << 24  # Maior valor (ex.: um módulo) aceito; limita a memória com arquivos corrompidos
+TOKEN_TAIL = 32  # Um erro a menos disso do fim do buffer pode ser só um número ou literal cortado
+
+
+def write_layout_json(fp, header, columns, indent=None):
+    """
+    Grava o layout coluna por coluna.
+
+    Args:
+        fp: Arquivo de texto aberto para escrita.
+        header (dict): Campos de topo além de "columns" (store_id, version...).
+        columns (iterable): Colunas; cada uma é um iterável de módulos (dicts).
+        indent (int | None): Indentação como em json.dump; None grava no modo compacto.
+    """
+    if indent:
+        newline, item_separator, key_separator = "\n", ",", ": "
+    else:
+        newline, item_separator, key_separator = "", ",", ":"
+
+    def pad(level):
+        return newline + " " * ((indent or 0) * level)
+
+    fp.write("{")
+    for key, value in header.items():
+        fp.write(f"{pad(1)}{json.dumps(key)}{key_separator}{json.dumps(value)}{item_separator}")
+    fp.write(f"{pad(1)}\"columns\"{key_separator}[")
+
+    first_column = True
+    for column in columns:
+        fp.write(("" if first_column else item_separator) + pad(2) + "[")
+        first_column = False
+        first_module = True
+        for module in column:
+            text = json.dumps(module, indent=indent, separators=(item_separator, key_separator))
+            if indent:
+                text = text.replace("\n", pad(3))
+            fp.write(("" if first_module else item_separator) + pad(3) + text)
+            first_module = False
+        fp.write(("" if first_module else pad(2)) + "]")
+
+    fp.write(("" if first_column else pad(1)) + "]" + pad(0) + "}")
+
+
+def iter_layout_json(fp, progress=None):
+    """
+    Lê um layout em streaming, gerando eventos à medida que o arquivo é lido.
+
+    Args:
+        fp: Arquivo binário aberto para leitura.
+        progress (callable | None): Recebe o total de bytes lidos a cada bloco.
+
+    Yields:
+        tuple: ("key", nome, valor) para campos de topo como store_id,
+        ("column", índice) no início de cada coluna e
+        ("module", índice da coluna, módulo) para cada módulo.
+
+    Raises:
+        ValueError: Se o JSON for inválido ou não tiver o formato de layout.
+    """
+    reader = _StreamReader(fp, progress)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "columns":
+            yield from _iter_columns(reader)
+        else:
+            yield ("key", key, reader.value())
+        if reader.expect(",}") == "}":
+            return
+
+
+def _iter_columns(reader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.expect("]")
+        return
+    column_index = 0
+    while True:
+        reader.expect("[")
+        yield ("column", column_index)
+        if reader.peek() == "]":
+            reader.expect("]")
+        else:
+            while True:
+                yield ("module", column_index, reader.value())
+                if reader.expect(",]") == "]":
+                    break
+        column_index += 1
+        if reader.expect(",]") == "]":
+            return
+
+
+class _StreamReader:
+    # Buffer de texto sobre um arquivo binário; os valores são lidos com JSONDecoder.raw_decode
+    def __init__(self, fp, progress):
+        self.fp = fp
+        self.progress = progress
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.bytes_read = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.fp.read(CHUNK_SIZE)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        # Descarta o que já foi consumido para manter o buffer pequeno
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        if self.progress is not None:
+            self.progress(self.bytes_read)
+        return True
+
+    def grow(self):
+        """
+        Lê até o trecho ainda não consumido dobrar de tamanho (ou o arquivo acabar).
+
+        Dobrar, em vez de ler um bloco por tentativa, mantém linear o custo de
+        decodificar de novo um valor longo a cada tentativa.
+
+        Returns:
+            bool: False se o arquivo já tinha acabado.
+        """
+        pending = len(self.buffer) - self.pos
+        if pending > MAX_VALUE_CHARS:
+            raise ValueError(f"JSON inválido: valor com mais de {MAX_VALUE_CHARS} caracteres")
+        target = pending + max(pending, CHUNK_SIZE)
+        filled = False
+        while len(self.buffer) - self.pos < target and self.fill():
+            filled = True
+        return filled
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Fim inesperado do arquivo JSON")
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"JSON inválido: esperado um de {chars!r}, encontrado {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Só um valor cortado no fim do buffer justifica ler mais; um erro antes disso é definitivo.
+                # Strings abertas são reportadas no início delas, então também podem estar só cortadas
+                truncated = e.msg.startswith("Unterminated string") or len(self.buffer) - e.pos <= TOKEN_TAIL
+                if not truncated or not self.grow():
+                    raise ValueError(f"JSON inválido: {e}") from e
+                continue
+            # Números no fim do buffer podem continuar no próximo bloco
+            if end == len(self.buffer) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
@@ -0,0 +1,324 @@
+"""
+Métricas do backend no formato texto do Prometheus e log de requisições lentas.
+
+MetricsMiddleware mede cada requisição HTTP: latência, bytes recebidos e
+enviados e módulos processados, com histogramas por rota. A rota é o
+caminho declarado (ex.: /store-layout/{store_id}), e não a URL, para não
+criar uma série por loja. Os handlers informam quantos módulos processaram
+com record_modules(). As métricas são do processo: com vários workers, cada
+um expõe as suas em /metrics.
+
+Com LAYOUT_SLOW_REQUEST_MS definido, as requisições que passam desse tempo
+têm a pilha das threads amostrada enquanto ainda estão em andamento. Entram
+só as pilhas que passam pelo código do aplicativo. Quando a requisição
+termina, as pilhas mais frequentes vão para o log (uma linha JSON por
+requisição, em LAYOUT_SLOW_REQUEST_LOG ou em stderr).
+"""
+import bisect
+import collections
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+MODULES_BUCKETS = (10, 100, 1000, 10_000, 100_000)
+UNMATCHED_ROUTE = "unmatched"  # Caminhos sem rota (404) ficam numa série só
+
+_request_info = contextvars.ContextVar("layout_request_info", default=None)
+
+
+def record_modules(count):
+    """Registra quantos módulos a requisição atual processou (chamado pelos handlers)."""
+    info = _request_info.get()
+    if info is not None:
+        info["modules"] = info.get("modules", 0) + count
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # valores dos rótulos -> [contagem por faixa..., soma, total]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.description}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for labels, series in sorted(self.series.items()):
+            # As faixas do Prometheus são cumulativas
+            for bound, count in zip(self.buckets, itertools.accumulate(series[:len(self.buckets)])):
+                bucket_labels = _labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            bucket_labels = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+
+
+class Counter:
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.series = collections.Counter()
+
+    def inc(self, labels, amount=1):
+        self.series[labels] += amount
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.description}")
+        lines.append(f"# TYPE {self.name} counter")
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+
+
+class MetricsRegistry:
+    """
+    Métricas das requisições HTTP do processo.
+
+    Args:
+        gauges (callable | None): Retorna [(nome, descrição, valor)] lidos na hora
+            de gerar o texto (ex.: ocupação do cache de respostas).
+    """
+
+    def __init__(self, gauges=None):
+        self.lock = threading.Lock()
+        self.gauges = gauges
+        self.started = time.time()
+        route = ("method", "route")
+        self.duration = Histogram("layout_http_request_duration_seconds", "Latência das requisições HTTP.",
+                                  route + ("status",), LATENCY_BUCKETS)
+        self.request_bytes = Histogram("layout_http_request_size_bytes", "Tamanho do corpo das requisições.",
+                                       route, BYTES_BUCKETS)
+        self.response_bytes = Histogram("layout_http_response_size_bytes", "Tamanho do corpo das respostas.",
+                                        route, BYTES_BUCKETS)
+        self.modules = Histogram("layout_modules_per_request", "Módulos processados por requisição.",
+                                 route, MODULES_BUCKETS)
+        self.modules_total = Counter("layout_modules_processed_total", "Módulos processados.", route)
+        self.requests_total = Counter("layout_http_requests_total", "Requisições HTTP atendidas.",
+                                      route + ("status",))
+        self.slow_total = Counter("layout_http_slow_requests_total",
+                                  "Requisições acima de LAYOUT_SLOW_REQUEST_MS.", route)
+        self.counter_mismatches = Counter("layout_share_counter_mismatches_total",
+                                          "Contadores de categoria que divergiram da recontagem "
+                                          "(LAYOUT_SHARE_COUNTERS=check) e foram refeitos.", ())
+        self.in_flight = 0
+
+    def observe(self, method, route, status, seconds, request_bytes, response_bytes, modules=None, slow=False):
+        labels = (method, route)
+        with self.lock:
+            self.duration.observe(labels + (str(status),), seconds)
+            self.requests_total.inc(labels + (str(status),))
+            self.request_bytes.observe(labels, request_bytes)
+            self.response_bytes.observe(labels, response_bytes)
+            if modules is not None:
+                self.modules.observe(labels, modules)
+                self.modules_total.inc(labels, modules)
+            if slow:
+                self.slow_total.inc(labels)
+
+    def count_counter_mismatch(self):
+        with self.lock:
+            self.counter_mismatches.inc(())
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        lines = []
+        with self.lock:
+            for metric in (self.requests_total, self.duration, self.request_bytes, self.response_bytes,
+                           self.modules, self.modules_total, self.slow_total, self.counter_mismatches):
+                metric.render(lines)
+            gauges = [("layout_http_requests_in_flight", "Requisições em andamento.", self.in_flight),
+                      ("layout_process_start_time_seconds", "Início do processo (epoch).", self.started)]
+        gauges += self.gauges() if self.gauges is not None else []
+        for name, description, value in gauges:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class SlowRequestSampler:
+    """
+    Amostra as pilhas das threads enquanto houver requisições acima do limite.
+
+    A thread de amostragem dorme até a requisição mais antiga passar do
+    limite, então não custa nada enquanto as requisições são rápidas.
+    Como as pilhas são de todas as threads, uma amostra tirada com outras
+    requisições em andamento pode ser delas; o log informa quantas havia.
+
+    Args:
+        threshold (float): Segundos a partir dos quais a requisição é lenta.
+        interval (float): Segundos entre amostras.
+        log_path (str | None): Arquivo do log (JSON por linha); None usa stderr.
+        top (int): Pilhas distintas mais frequentes registradas por requisição.
+    """
+
+    def __init__(self, threshold, interval=0.005, log_path=None, top=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_path = log_path
+        self.top = top
+        self.app_dir = os.path.dirname(os.path.abspath(__file__))
+        self.active = {}  # id -> [início, collections.Counter de pilhas, amostras]
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start_request(self):
+        with self.lock:
+            request_id = next(self.ids)
+            self.active[request_id] = [time.perf_counter(), collections.Counter(), 0]
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return request_id
+
+    def finish_request(self, request_id):
+        """Retorna (pilhas amostradas, amostras, requisições em andamento) da requisição."""
+        with self.lock:
+            _, stacks, samples = self.active.pop(request_id)
+            return stacks, samples, len(self.active)
+
+    def log(self, record, stacks, samples):
+        record["samples"] = samples
+        record["stacks"] = [{"stack": stack, "count": count} for stack, count in stacks.most_common(self.top)]
+        line = json.dumps(record, ensure_ascii=False)
+        if self.log_path:
+            with open(self.log_path, "a", encoding="utf-8") as log_file:
+                log_file.write(line + "\n")
+        else:
+            print(f"Requisição lenta: {line}", file=sys.stderr)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self.wakeup.clear()  # Antes de olhar as requisições, para não perder um start_request()
+            with self.lock:
+                now = time.perf_counter()
+                slow = [entry for entry in self.active.values() if now - entry[0] >= self.threshold]
+                pending = [entry[0] + self.threshold - now for entry in self.active.values()
+                           if now - entry[0] < self.threshold]
+            if not slow:
+                self.wakeup.wait(min(pending) if pending else None)
+                continue
+            stacks = [self._format(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            stacks = [stack for stack in stacks if stack is not None]
+            with self.lock:
+                for entry in slow:
+                    entry[1].update(stacks)
+                    entry[2] += 1
+            time.sleep(self.interval)
+
+    def _format(self, frame):
+        # Pilha da raiz para a folha ("arquivo:função:linha;..."), só se passar pelo código do aplicativo
+        frames = []
+        in_app = False
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self.app_dir) and not filename.endswith("layout_metrics.py"):
+                in_app = True
+            frames.append(f"{os.path.basename(filename)}:{frame.f_code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(frames)) if in_app else None
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que alimenta o MetricsRegistry (e o SlowRequestSampler, se houver).
+
+    Conta os bytes dos corpos à medida que passam, então também funciona
+    com respostas em streaming.
+    """
+
+    def __init__(self, app, registry, sampler=None):
+        self.app = app
+        self.registry = registry
+        self.sampler = sampler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        info = {}
+        token = _request_info.set(info)
+        sizes = {"request": 0, "response": 0}
+        status = 500
+        sample_id = self.sampler.start_request() if self.sampler is not None else None
+        with self.registry.lock:
+            self.registry.in_flight += 1
+
+        async def receive_counting():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def send_counting(message):
+            nonlocal status, sample_id
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if sample_id is not None and any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                                 for name, value in message.get("headers", ())):
+                    # Fluxos de eventos ficam abertos de propósito: não são requisições lentas
+                    self.sampler.finish_request(sample_id)
+                    sample_id = None
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counting, send_counting)
+        finally:
+            _request_info.reset(token)
+            elapsed = time.perf_counter() - started
+            with self.registry.lock:
+                self.registry.in_flight -= 1
+            route = scope.get("route")
+            route = getattr(route, "path", UNMATCHED_ROUTE)
+            slow = False
+            if sample_id is not None:
+                stacks, samples, concurrent = self.sampler.finish_request(sample_id)
+                slow = elapsed >= self.sampler.threshold
+                if slow:
+                    self.sampler.log({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "method": scope["method"],
+                                      "path": scope["path"], "route": route, "status": status,
+                                      "seconds": round(elapsed, 6), "concurrent": concurrent,
+                                      "modules": info.get("modules")}, stacks, samples)
+            self.registry.observe(scope["method"], route, status, elapsed, sizes["request"], sizes["response"],
+                                  info.get("modules"), slow)
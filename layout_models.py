@@ -0,0 +1,201 @@
+"""
+Modelos de dados compartilhados entre o servidor e o cliente.
+
+Só depende do pydantic, então o editor pode usar Module e Store sem
+importar FastAPI, e o servidor não precisa do Qt.
+"""
+from typing import Annotated, Dict, Optional, List
+
+from pydantic import BaseModel, Field
+
+from layout_compact import INT32_MAX, INT32_MIN
+
+# Campos dos módulos são guardados em arrays de 32 bits; INT32_MIN é reservado para "sem categoria"
+Int32 = Annotated[int, Field(ge=INT32_MIN, le=INT32_MAX)]
+CategoryId = Annotated[int, Field(gt=INT32_MIN, le=INT32_MAX)]
+GridIndex = Annotated[int, Field(ge=0, le=INT32_MAX)]  # Coluna e linha do módulo
+
+class Store(BaseModel):
+    id: int
+    name: str
+    num_columns: int
+    modules_per_column: int
+    region: Optional[str] = None  # Usados para agrupar o share agregado
+    store_format: Optional[str] = None
+
+class Category(BaseModel):
+    id: CategoryId
+    name: str
+
+class Module(BaseModel):
+    module_id: Int32
+    column: GridIndex
+    row: GridIndex
+    x: Int32
+    y: Int32
+    name: str
+    category_id: Optional[CategoryId] = None
+    width: Int32 = 60
+    height: Int32 = 30
+    rotation: Int32 = 0  # Adicione este atributo
+
+class StoreLayoutData(BaseModel):
+    store_id: int
+    columns: List[List[Module]]
+    version: Optional[int] = None  # Versão do layout, usada para detectar edições concorrentes
+
+class ColumnarLayoutData(BaseModel):
+    # Layout em arrays paralelos (um item por módulo); nomes ficam em uma tabela à parte
+    store_id: int
+    version: Optional[int] = None
+    num_columns: int = 0
+    module_ids: List[Int32]
+    columns: List[Int32]
+    rows: List[Int32]
+    x: List[Int32]
+    y: List[Int32]
+    width: List[Int32]
+    height: List[Int32]
+    rotation: List[Int32]
+    category_ids: List[Optional[CategoryId]]
+    names: List[str] = []
+    name_refs: List[int]  # Índice em `names`; -1 indica o nome padrão "Module {module_id}"
+
+class BulkShareRequest(BaseModel):
+    store_ids: Optional[List[int]] = None  # None = todas as lojas
+    weight: str = "count"  # "count" (quantidade de módulos) ou "area" (largura x altura)
+    group_by: Optional[str] = None  # "region" ou "store_format"
+    include_stores: bool = True  # Inclui o share de cada loja na resposta
+
+class PlacementCheck(BaseModel):
+    # Limites da loja; o padrão é a área da cena do cliente
+    width: Optional[float] = Field(6000, ge=0, le=1_000_000)
+    height: Optional[float] = Field(5500, ge=0, le=1_000_000)
+    # Corredor mínimo entre módulos de colunas diferentes (0 = não verifica); o custo da
+    # verificação cresce com o quadrado da largura, por isso ela é limitada
+    aisle_width: float = Field(0, ge=0, le=500)
+
+class ModuleOp(BaseModel):
+    op: str  # move, resize, rotate, rename, set_category, add, delete
+    module_id: Int32
+    x: Optional[Int32] = None
+    y: Optional[Int32] = None
+    column: Optional[GridIndex] = None
+    row: Optional[GridIndex] = None
+    width: Optional[Int32] = None
+    height: Optional[Int32] = None
+    rotation: Optional[Int32] = None
+    name: Optional[str] = None
+    category_id: Optional[CategoryId] = None
+    module: Optional[Module] = None  # Módulo completo, usado pela operação "add"
+
+class LayoutPatch(BaseModel):
+    base_version: int
+    ops: List[ModuleOp]
+
+# Campos alterados por cada operação (os obrigatórios vêm primeiro); usados pelo backend e pelo editor
+MODULE_OP_FIELDS = {
+    "move": ("x", "y", "column", "row"),
+    "resize": ("width", "height"),
+    "rotate": ("rotation",),
+    "rename": ("name",),
+    "set_category": ("category_id",),
+}
+
+def op_changes(op):
+    # Campos que a operação altera; set_category aceita None para remover a categoria
+    return {field: op.get(field) for field in MODULE_OP_FIELDS[op["op"]]
+            if op.get(field) is not None or op["op"] == "set_category"}
+
+class OptimizeRequest(BaseModel):
+    targets: Dict[int, float]  # category_id -> share alvo em %; o que faltar para 100% fica sem categoria
+    weight: str = "count"  # "count" ou "area"
+    group: str = "run"  # "run" (trecho contínuo ao longo das colunas), "column" (colunas inteiras) ou "module"
+    adjacent: List[List[int]] = []  # Pares de categorias que devem ficar vizinhas
+    change_penalty: float = Field(1.0, ge=0)  # Desvio (pontos percentuais) aceito para não trocar todos os módulos
+    time_limit: float = Field(1.0, gt=0, le=10)  # Segundos de busca local por loja (limitado: ocupa um processo)
+    apply: bool = False  # Grava as categorias no layout (senão só calcula)
+
+class BulkOptimizeRequest(OptimizeRequest):
+    store_ids: Optional[List[int]] = None  # None = todas as lojas
+    include_changes: bool = False  # Inclui as mudanças de cada módulo na resposta
+
+COLUMNAR_FIELDS = (("module_ids", "module_id"), ("columns", "column"), ("rows", "row"),
+                   ("x", "x"), ("y", "y"), ("width", "width"), ("height", "height"),
+                   ("rotation", "rotation"), ("category_ids", "category_id"))
+
+def layout_to_columnar(layout):
+    """
+    Converte um layout (lista de colunas de módulos) para o formato colunar.
+
+    Args:
+        layout (dict): Layout no formato de StoreLayoutData.dict().
+
+    Returns:
+        dict: Layout no formato de ColumnarLayoutData.
+    """
+    columnar = {array_name: [] for array_name, _ in COLUMNAR_FIELDS}
+    names = []
+    name_positions = {}
+    name_refs = []
+    columns = layout.get("columns", [])
+    for column in columns:
+        for module in column:
+            for array_name, field in COLUMNAR_FIELDS:
+                columnar[array_name].append(module.get(field))
+            name = module["name"]
+            if name == f"Module {module['module_id']}":
+                name_refs.append(-1)
+            else:
+                if name not in name_positions:
+                    name_positions[name] = len(names)
+                    names.append(name)
+                name_refs.append(name_positions[name])
+
+    columnar.update(store_id=layout["store_id"], version=layout.get("version"),
+                    num_columns=len(columns), names=names, name_refs=name_refs)
+    return columnar
+
+def columnar_to_layout(columnar):
+    """
+    Converte o formato colunar de volta para o layout com listas de colunas.
+
+    Os módulos são criados diretamente como dicts, sem instanciar Module.
+
+    Args:
+        columnar (dict): Layout no formato de ColumnarLayoutData.
+
+    Raises:
+        ValueError: Se os arrays tiverem tamanhos diferentes, ou se uma coluna
+            for negativa ou um name_ref não apontar para `names`.
+
+    Returns:
+        dict: Layout no formato de StoreLayoutData.dict().
+    """
+    arrays = [columnar[array_name] for array_name, _ in COLUMNAR_FIELDS]
+    arrays.append(columnar["name_refs"])
+    if len({len(array) for array in arrays}) > 1:
+        raise ValueError("Os arrays do layout colunar devem ter o mesmo tamanho")
+
+    names = columnar.get("names", [])
+    module_columns = columnar["columns"]
+    if module_columns and min(module_columns) < 0:
+        raise ValueError("As colunas dos módulos não podem ser negativas")
+    name_refs = columnar["name_refs"]
+    if name_refs and not -1 <= min(name_refs) <= max(name_refs) < len(names):
+        raise ValueError(f"name_refs deve estar entre -1 e {len(names) - 1} (tamanho de names)")
+    columns = [[] for _ in range(max(columnar.get("num_columns", 0), max(module_columns, default=-1) + 1))]
+    for module_id, column, row, x, y, width, height, rotation, category_id, name_ref in zip(*arrays):
+        columns[column].append({
+            "module_id": module_id,
+            "column": column,
+            "row": row,
+            "x": x,
+            "y": y,
+            "name": names[name_ref] if name_ref >= 0 else f"Module {module_id}",
+            "category_id": category_id,
+            "width": width,
+            "height": height,
+            "rotation": rotation,
+        })
+    return {"store_id": columnar["store_id"], "columns": columns, "version": columnar.get("version")}
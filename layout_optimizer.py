@@ -0,0 +1,354 @@
+"""
+Distribuição das categorias nos módulos de uma loja para atingir um share alvo.
+
+Dado o share desejado de cada categoria (em % da quantidade ou da área dos
+módulos), escolhe o category_id de cada módulo minimizando o desvio em
+relação aos alvos, com uma de três formas de agrupamento:
+
+- "run" (padrão): cada categoria ocupa um trecho contínuo do percurso que
+  desce uma coluna e sobe a seguinte, então fica junta dentro de cada coluna
+  e passa para a coluna vizinha pela ponta;
+- "column": colunas inteiras por categoria;
+- "module": sem restrição de posição (só o share importa).
+
+Nos modos "run" e "column" a ordem das categorias ao longo do percurso parte
+da posição atual de cada uma e é melhorada por busca local (trocas e
+reinserções), o que também atende aos pares de categorias que devem ficar
+vizinhas. Os cortes entre as categorias seguem a soma acumulada dos alvos e
+depois são ajustados para mudar menos módulos. No modo "module" os módulos
+que já estão em uma categoria com espaço são mantidos e os demais vão,
+do maior para o menor, para a categoria mais abaixo do alvo.
+
+A parte do share que os alvos não cobrem (soma < 100%) fica sem categoria.
+"""
+import bisect
+import heapq
+import time
+from itertools import accumulate
+
+GROUPINGS = ("run", "column", "module")
+ADJACENCY_PENALTY = 100  # Pontos percentuais de desvio equivalentes a um par vizinho não atendido
+UNCATEGORIZED = None
+
+
+def module_weight(module, weight):
+    return module["width"] * module["height"] if weight == "area" else 1
+
+
+def target_amounts(targets, total):
+    """
+    Converte os alvos em % para quantidade (ou área) por categoria.
+
+    Raises:
+        ValueError: Se algum alvo for negativo ou a soma passar de 100%.
+
+    Returns:
+        dict: category_id -> quantidade alvo; None recebe o que sobra até 100%.
+    """
+    if any(share < 0 for share in targets.values()):
+        raise ValueError("Os shares alvo não podem ser negativos")
+    covered = sum(targets.values())
+    if covered > 100 + 1e-6:
+        raise ValueError(f"A soma dos shares alvo passa de 100% ({covered:.2f}%)")
+    amounts = {category_id: share * total / 100 for category_id, share in targets.items()}
+    if covered < 100 - 1e-6:
+        amounts[UNCATEGORIZED] = (100 - covered) * total / 100
+    return amounts
+
+
+def walk_order(modules):
+    """Índices dos módulos no percurso: desce a primeira coluna, sobe a segunda e assim por diante."""
+    column_rank = {column: rank for rank, column in enumerate(sorted({module["column"] for module in modules}))}
+    return sorted(range(len(modules)), key=lambda i: (column_rank[modules[i]["column"]],
+                                                       modules[i]["row"] if column_rank[modules[i]["column"]] % 2 == 0
+                                                       else -modules[i]["row"]))
+
+
+class _SegmentPlan:
+    """
+    Categorias em trechos contínuos de uma sequência de unidades (módulos ou colunas).
+
+    Guarda as somas acumuladas dos pesos e, por categoria, quantos módulos
+    dela já estão em cada prefixo da sequência, para avaliar uma ordem de
+    categorias sem percorrer os módulos.
+    """
+
+    def __init__(self, unit_weights, unit_current, amounts, change_penalty, adjacent):
+        self.cumulative = [0, *accumulate(unit_weights)]
+        self.total = self.cumulative[-1]
+        self.units = len(unit_weights)
+        self.amounts = amounts
+        self.module_count = sum(sum(counts.values()) for counts in unit_current)
+        # Peso de uma troca de categoria no objetivo, em pontos percentuais por módulo
+        self.change_cost = change_penalty / max(self.module_count, 1)
+        self.current_prefix = {}
+        for category_id in amounts:
+            self.current_prefix[category_id] = [0, *accumulate(counts.get(category_id, 0) for counts in unit_current)]
+        self.adjacent = [(a, b) for a, b in adjacent if a in amounts and b in amounts]
+
+    def cuts(self, order):
+        # Cada corte fica na unidade cuja soma acumulada mais se aproxima da soma dos alvos até ali
+        cuts = [0]
+        target = 0
+        for category_id in order[:-1]:
+            target += self.amounts[category_id]
+            i = bisect.bisect_left(self.cumulative, target, cuts[-1])
+            if i > self.units or (i > cuts[-1] and target - self.cumulative[i - 1] <= self.cumulative[i] - target):
+                i -= 1
+            cuts.append(min(i, self.units))
+        cuts.append(self.units)
+        return cuts
+
+    def segment_cost(self, category_id, start, end):
+        amount = self.cumulative[end] - self.cumulative[start]
+        deviation = abs(amount - self.amounts[category_id]) * 100 / self.total if self.total else 0
+        prefix = self.current_prefix[category_id]
+        kept = prefix[end] - prefix[start]
+        return deviation - kept * self.change_cost
+
+    def adjacency_violations(self, order):
+        position = {category_id: i for i, category_id in enumerate(order)}
+        return sum(abs(position[a] - position[b]) != 1 for a, b in self.adjacent)
+
+    def cost(self, order, cuts):
+        segments = sum(self.segment_cost(category_id, cuts[i], cuts[i + 1]) for i, category_id in enumerate(order))
+        return segments + self.adjacency_violations(order) * ADJACENCY_PENALTY
+
+    def improve_order(self, order, deadline):
+        """Busca local na ordem das categorias: trocas de pares e reinserções, até não melhorar."""
+        best = self.cost(order, self.cuts(order))
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(len(order)):
+                for j in range(len(order)):
+                    if i == j:
+                        continue
+                    candidates = [_moved(order, i, j)]
+                    if i < j:
+                        candidates.append(_swapped(order, i, j))
+                    for candidate in candidates:
+                        cost = self.cost(candidate, self.cuts(candidate))
+                        if cost < best - 1e-9:
+                            order, best, improved = candidate, cost, True
+                if time.perf_counter() >= deadline:
+                    break
+        return order
+
+    def improve_cuts(self, order, cuts):
+        """Desloca cada corte uma unidade por vez enquanto isso reduzir o custo (menos módulos trocados)."""
+        cuts = list(cuts)
+        improved = True
+        while improved:
+            improved = False
+            for j in range(1, len(cuts) - 1):
+                left, right = order[j - 1], order[j]
+                current = (self.segment_cost(left, cuts[j - 1], cuts[j]) +
+                           self.segment_cost(right, cuts[j], cuts[j + 1]))
+                for step in (-1, 1):
+                    cut = cuts[j] + step
+                    if not cuts[j - 1] <= cut <= cuts[j + 1]:
+                        continue
+                    cost = self.segment_cost(left, cuts[j - 1], cut) + self.segment_cost(right, cut, cuts[j + 1])
+                    if cost < current - 1e-9:
+                        cuts[j], current, improved = cut, cost, True
+        return cuts
+
+
+def _swapped(order, i, j):
+    order = list(order)
+    order[i], order[j] = order[j], order[i]
+    return order
+
+
+def _moved(order, i, j):
+    order = list(order)
+    order.insert(j, order.pop(i))
+    return order
+
+
+def _initial_order(amounts, unit_current):
+    # Categorias na ordem da posição média atual; as que ainda não existem vão para o fim
+    position_sum = {}
+    count = {}
+    for index, counts in enumerate(unit_current):
+        for category_id, n in counts.items():
+            position_sum[category_id] = position_sum.get(category_id, 0) + index * n
+            count[category_id] = count.get(category_id, 0) + n
+    return sorted(amounts, key=lambda category_id: (category_id not in count,
+                                                    position_sum.get(category_id, 0) / max(count.get(category_id, 1), 1)))
+
+
+def assign_segments(modules, weights, amounts, group, change_penalty, adjacent, deadline):
+    """Atribuição dos modos "run" e "column"; retorna (categoria por módulo, pares vizinhos não atendidos)."""
+    if group == "column":
+        columns = sorted({module["column"] for module in modules})
+        unit_of = {column: i for i, column in enumerate(columns)}
+        units = [[] for _ in columns]
+        for i, module in enumerate(modules):
+            units[unit_of[module["column"]]].append(i)
+    else:
+        units = [[i] for i in walk_order(modules)]
+
+    unit_weights = [sum(weights[i] for i in unit) for unit in units]
+    unit_current = []
+    for unit in units:
+        counts = {}
+        for i in unit:
+            counts[modules[i]["category_id"]] = counts.get(modules[i]["category_id"], 0) + 1
+        unit_current.append(counts)
+
+    plan = _SegmentPlan(unit_weights, unit_current, amounts, change_penalty, adjacent)
+    order = plan.improve_order(_initial_order(amounts, unit_current), deadline)
+    cuts = plan.improve_cuts(order, plan.cuts(order))
+
+    assigned = [None] * len(modules)
+    for j, category_id in enumerate(order):
+        for unit in units[cuts[j]:cuts[j + 1]]:
+            for i in unit:
+                assigned[i] = category_id
+    return assigned, plan.adjacency_violations(order)
+
+
+def assign_modules(modules, weights, amounts, deadline):
+    """Atribuição do modo "module": mantém o que já está certo e completa as categorias abaixo do alvo."""
+    assigned = [module["category_id"] if module["category_id"] in amounts else False for module in modules]
+    totals = dict.fromkeys(amounts, 0)
+    members = {category_id: [] for category_id in amounts}
+    for i, category_id in enumerate(assigned):
+        if category_id is not False:
+            totals[category_id] += weights[i]
+            members[category_id].append(i)
+
+    # Libera os módulos das categorias acima do alvo enquanto isso aproximar do alvo
+    pending = [i for i, category_id in enumerate(assigned) if category_id is False]
+    for category_id, indexes in members.items():
+        for i in sorted(indexes, key=lambda i: weights[i]):
+            excess = totals[category_id] - amounts[category_id]
+            if abs(excess - weights[i]) >= abs(excess):
+                continue
+            totals[category_id] -= weights[i]
+            pending.append(i)
+
+    # Os maiores primeiro, cada um para a categoria com o maior déficit
+    deficits = [(totals[category_id] - amounts[category_id], n, category_id)
+                for n, category_id in enumerate(amounts)]
+    heapq.heapify(deficits)
+    for i in sorted(pending, key=lambda i: -weights[i]):
+        _, n, category_id = heapq.heappop(deficits)
+        assigned[i] = category_id
+        totals[category_id] += weights[i]
+        heapq.heappush(deficits, (totals[category_id] - amounts[category_id], n, category_id))
+
+    # Busca local: move um módulo de uma categoria acima do alvo para uma abaixo quando reduz o desvio
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        over = [category_id for category_id in amounts if totals[category_id] > amounts[category_id]]
+        under = [category_id for category_id in amounts if totals[category_id] < amounts[category_id]]
+        if not over or not under:
+            break
+        for i, source in enumerate(assigned):
+            if source not in over:
+                continue
+            w = weights[i]
+            best, best_gain = None, 1e-9
+            for target in under:
+                gain = (abs(totals[source] - amounts[source]) + abs(totals[target] - amounts[target])
+                        - abs(totals[source] - w - amounts[source]) - abs(totals[target] + w - amounts[target]))
+                if gain > best_gain:
+                    best, best_gain = target, gain
+            if best is not None:
+                assigned[i] = best
+                totals[source] -= w
+                totals[best] += w
+                improved = True
+                break
+    return assigned
+
+
+def optimize_layout(modules, targets, weight="count", group="run", adjacent=(), change_penalty=1.0,
+                    time_limit=1.0):
+    """
+    Escolhe a categoria de cada módulo para aproximar o share dos alvos.
+
+    Args:
+        modules (list): Módulos no formato de Module.dict().
+        targets (dict): category_id -> share alvo em %.
+        weight (str): "count" ou "area".
+        group (str): "run", "column" ou "module" (ver o início do módulo).
+        adjacent (list): Pares de categorias que devem ficar vizinhas ("run"/"column").
+        change_penalty (float): Desvio (em pontos percentuais) que vale a pena
+            aceitar para não trocar a categoria de todos os módulos; 0 ignora
+            quantos módulos mudam.
+        time_limit (float): Segundos máximos de busca local.
+
+    Raises:
+        ValueError: Se os parâmetros forem inválidos.
+
+    Returns:
+        dict: "changes" (module_id -> nova categoria, só dos módulos que
+        mudam), "shares" (share obtido por categoria), "deviation" (soma dos
+        desvios absolutos, em pontos percentuais), "max_deviation",
+        "changed", "modules", "adjacency_violations" e "seconds".
+    """
+    started = time.perf_counter()
+    if weight not in ("count", "area"):
+        raise ValueError("weight deve ser 'count' ou 'area'")
+    if group not in GROUPINGS:
+        raise ValueError(f"group deve ser um de {', '.join(GROUPINGS)}")
+    if any(len(pair) != 2 for pair in adjacent):
+        raise ValueError("Cada item de adjacent deve ser um par de categorias")
+
+    weights = [module_weight(module, weight) for module in modules]
+    total = sum(weights)
+    amounts = target_amounts(targets, total)
+    deadline = started + time_limit
+    violations = 0
+    if not modules:
+        assigned = []
+    elif group == "module":
+        assigned = assign_modules(modules, weights, amounts, deadline)
+    else:
+        assigned, violations = assign_segments(modules, weights, amounts, group, change_penalty, adjacent, deadline)
+
+    achieved = dict.fromkeys(targets, 0)
+    for i, category_id in enumerate(assigned):
+        if category_id is not UNCATEGORIZED:
+            achieved[category_id] += weights[i]
+    shares = {category_id: amount * 100 / total if total else 0 for category_id, amount in achieved.items()}
+    deviations = [abs(shares[category_id] - share) for category_id, share in targets.items()]
+    changes = {module["module_id"]: category_id for module, category_id in zip(modules, assigned)
+               if module["category_id"] != category_id}
+    return {
+        "changes": changes,
+        "shares": shares,
+        "deviation": sum(deviations),
+        "max_deviation": max(deviations, default=0),
+        "changed": len(changes),
+        "modules": len(modules),
+        "adjacency_violations": violations,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def optimize_stores(layouts, options):
+    """
+    Otimiza várias lojas (executado nos processos do modo em lote).
+
+    Args:
+        layouts (list): [(store_id, versão, módulos)].
+        options (dict): Argumentos de optimize_layout (exceto modules).
+
+    Returns:
+        list: Resultado de cada loja com store_id e version, ou "error".
+    """
+    results = []
+    for store_id, version, modules in layouts:
+        try:
+            result = optimize_layout(modules, **options)
+        except ValueError as e:
+            result = {"error": str(e)}
+        result.update(store_id=store_id, version=version)
+        results.append(result)
+    return results
@@ -0,0 +1,94 @@
+"""
+Cache das respostas de leitura de layout já serializadas em JSON.
+
+Os layouts são lidos muito mais vezes do que alterados; em vez de converter
+o dict do layout em JSON a cada GET, o servidor guarda os bytes de cada
+(loja, representação) junto com a versão do layout. Uma leitura com a
+versão atual devolve os bytes direto, com custo independente do número de
+módulos. O total guardado fica limitado por um orçamento de memória, com
+descarte dos menos usados (LRU).
+"""
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usa o json da biblioteca padrão
+    orjson = None
+
+
+def encode_json(data):
+    """Serializa `data` em bytes JSON compactos (orjson quando disponível)."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class ResponseCache:
+    """
+    Bytes das respostas por chave, válidos para uma versão.
+
+    Args:
+        max_bytes (int): Orçamento de memória para os corpos guardados.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # chave -> (versão, bytes, itens), do menos para o mais recente
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, version):
+        """Retorna os bytes guardados para a `version` informada, ou None."""
+        entry = self.lookup(key, version)
+        return None if entry is None else entry[0]
+
+    def lookup(self, key, version):
+        """Retorna (bytes, items) guardados para a `version` informada, ou None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, body, items=None):
+        """
+        Guarda os bytes da resposta de `version`.
+
+        Args:
+            items (int | None): Quantidade de itens (ex.: módulos) da resposta, devolvida por lookup().
+        """
+        if len(body) > self.max_bytes:
+            return  # Maior que o orçamento inteiro: não vale a pena guardar
+        with self.lock:
+            current = self.entries.get(key)
+            if current is not None:
+                if current[0] > version:
+                    return  # Outra requisição já guardou uma versão mais nova
+                self.nbytes -= len(current[1])
+            self.entries[key] = (version, body, items)
+            self.entries.move_to_end(key)
+            self.nbytes += len(body)
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def invalidate(self, match):
+        """Descarta as entradas cujas chaves satisfazem `match(chave)`."""
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                self.nbytes -= len(self.entries.pop(key)[1])
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,791 @@
+"""
+Backend FastAPI do layout de lojas.
+
+Rode com `python layout_server.py` (ou `uvicorn layout_server:app`); o
+editor (app_layout.py) só conversa com ele por HTTP.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from layout_events import LayoutEventHub
+from layout_metrics import MetricsMiddleware, MetricsRegistry, SlowRequestSampler, record_modules
+
+from layout_models import (BulkOptimizeRequest, BulkShareRequest, Category, ColumnarLayoutData, LayoutPatch,
+                           OptimizeRequest, PlacementCheck, Store, StoreLayoutData, columnar_to_layout,
+                           layout_to_columnar)
+from layout_optimizer import optimize_layout, optimize_stores
+from layout_response_cache import ResponseCache, encode_json
+from layout_spatial import validate_layout
+from layout_storage import VersionConflict, open_storage
+
+app = FastAPI()
+logger = logging.getLogger(__name__)
+# Banco de dados: "memory" (padrão, dicts em memória) ou "sqlite:///caminho/layout.db"
+storage = open_storage(os.environ.get("LAYOUT_STORAGE", "memory"))
+# Contadores de share: "on" (padrão), "off" (recalcula sempre) ou "check" (compara com a recontagem)
+share_counters_mode = os.environ.get("LAYOUT_SHARE_COUNTERS", "on")
+# Os layouts podem ser guardados pelo cliente, mas precisam ser revalidados (If-None-Match) a cada uso
+LAYOUT_CACHE_CONTROL = "no-cache"
+storage_epoch = storage.epoch()
+# Respostas de GET de layout já serializadas, por versão; LAYOUT_RESPONSE_CACHE_MB=0 desativa
+response_cache_mb = int(os.environ.get("LAYOUT_RESPONSE_CACHE_MB", "64"))
+response_cache = ResponseCache(response_cache_mb * 1024 * 1024) if response_cache_mb > 0 else None
+# Eventos de alteração dos layouts, repassados aos editores conectados em /store-layout/{id}/events
+event_hub = LayoutEventHub(storage)
+# Processos do modo em lote do otimizador de share (criados no primeiro uso)
+optimizer_workers = int(os.environ.get("LAYOUT_OPTIMIZER_WORKERS", os.cpu_count() or 1))
+optimizer_pool = None
+optimizer_pool_lock = threading.Lock()
+OPTIMIZE_CHUNK_MODULES = 20000  # Módulos por tarefa enviada aos processos (várias lojas pequenas por tarefa)
+
+def metric_gauges():
+    # Valores lidos na hora de gerar /metrics
+    gauges = [("layout_event_subscribers", "Editores conectados à sincronização ao vivo.",
+               sum(len(subscribers) for subscribers in list(event_hub.subscribers.values())))]
+    if response_cache is not None:
+        stats = response_cache.stats()
+        gauges += [("layout_response_cache_entries", "Respostas no cache de leituras.", stats["entries"]),
+                   ("layout_response_cache_bytes", "Bytes no cache de leituras.", stats["bytes"]),
+                   ("layout_response_cache_hits", "Leituras servidas pelo cache.", stats["hits"]),
+                   ("layout_response_cache_misses", "Leituras que precisaram serializar o layout.", stats["misses"])]
+    return gauges
+
+# Latência, bytes e módulos por rota em /metrics. Com LAYOUT_SLOW_REQUEST_MS, as requisições mais lentas
+# que isso têm a pilha amostrada e registrada em LAYOUT_SLOW_REQUEST_LOG (ou em stderr)
+metrics = MetricsRegistry(metric_gauges)
+slow_request_ms = float(os.environ.get("LAYOUT_SLOW_REQUEST_MS", "0"))
+slow_request_sampler = (SlowRequestSampler(slow_request_ms / 1000, log_path=os.environ.get("LAYOUT_SLOW_REQUEST_LOG"))
+                        if slow_request_ms > 0 else None)
+app.add_middleware(MetricsMiddleware, registry=metrics, sampler=slow_request_sampler)
+
+def layout_etag(store_id, version, variant=""):
+    """ETag forte de uma versão do layout; `variant` distingue as representações (ex.: colunar)."""
+    return f'"{storage_epoch}-{store_id}-{version}{variant}"'
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match pode trazer vários ETags separados por vírgula, fracos (W/) ou "*"
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate[2:] if candidate.startswith("W/") else candidate
+                                         for candidate in candidates)
+
+def layout_response(request, store_id, variant="", convert=None):
+    """
+    Resposta de leitura de um layout, com ETag e cache dos bytes serializados.
+
+    Responde 304 se o If-None-Match trouxer o ETag da versão atual; essa
+    checagem e a busca no cache só leem a versão, sem carregar os módulos.
+
+    Args:
+        request (Request): Requisição (para o If-None-Match).
+        store_id (int): ID da loja.
+        variant (str): Sufixo da representação no ETag e no cache ("" ou "-columnar").
+        convert (callable | None): Converte o layout para a representação pedida.
+
+    Raises:
+        HTTPException: 404 se a loja não tiver layout.
+    """
+    version = storage.layout_version(store_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Layout não encontrado")
+    headers = {"ETag": layout_etag(store_id, version, variant), "Cache-Control": LAYOUT_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.lookup((store_id, variant), version) if response_cache is not None else None
+    if cached is not None:
+        body, modules = cached
+    else:
+        layout = storage.get_layout(store_id)
+        if layout is None:
+            raise HTTPException(status_code=404, detail="Layout não encontrado")
+        # O layout pode ter mudado entre a leitura da versão e a dos módulos
+        version = layout["version"]
+        headers["ETag"] = layout_etag(store_id, version, variant)
+        body = encode_json(convert(layout) if convert is not None else layout)
+        modules = sum(len(column) for column in layout["columns"])
+        if response_cache is not None:
+            response_cache.put((store_id, variant), version, body, modules)
+    record_modules(modules)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def forget_layout_responses(store_id):
+    # As entradas antigas já não seriam servidas (a versão mudou); descartá-las libera o orçamento
+    if response_cache is not None:
+        response_cache.invalidate(lambda key: key[0] == store_id)
+
+@app.post("/store/")
+def create_store(store: Store):
+    """
+    Cria uma nova loja com o layout inicial.
+
+    Args:
+        store (Store): Objeto Store contendo os detalhes da loja.
+
+    Returns:
+        dict: Mensagem de confirmação e detalhes da loja criada.
+    """
+    # A checagem do ID é feita pelo armazenamento na mesma transação da escrita
+    if not storage.create_store(store.dict(), initial_layout(store)):
+        raise HTTPException(status_code=400, detail="Store ID já existe")
+    record_modules(store.num_columns * store.modules_per_column)
+    return {"message": "Loja criada", "store": store}
+
+@app.get("/store/")
+def list_stores():
+    """
+    Lista as lojas cadastradas.
+
+    Returns:
+        dict: "stores" com id, nome e versão do layout de cada loja, em ordem de ID.
+    """
+    names = storage.store_attribute("name")
+    versions = storage.layout_versions()
+    return {"stores": [{"id": store_id, "name": names[store_id], "version": versions.get(store_id)}
+                       for store_id in sorted(names)]}
+
+def initial_layout(store):
+    """
+    Gera o layout inicial (grade de colunas x módulos) da loja.
+
+    Os módulos são criados diretamente como dicts com os mesmos valores
+    padrão de Module, sem instanciar um modelo por módulo.
+
+    Args:
+        store (Store): Loja com num_columns e modules_per_column.
+
+    Returns:
+        dict: Layout no formato de StoreLayoutData.dict().
+    """
+    columns = []
+    module_id_counter = 0
+    for column_index in range(store.num_columns):
+        column = []
+        for row_index in range(store.modules_per_column):
+            column.append({
+                "module_id": module_id_counter,
+                "column": column_index,
+                "row": row_index,
+                "x": column_index * 70,
+                "y": row_index * 40,
+                "name": f"Module {module_id_counter}",
+                "category_id": None,
+                "width": 60,
+                "height": 30,
+                "rotation": 0,
+            })
+            module_id_counter += 1
+        columns.append(column)
+    return {"store_id": store.id, "columns": columns}
+
+@app.post("/stores/bulk")
+async def create_stores_bulk(request: Request, batch_size: int = 500):
+    """
+    Cria lojas em lote a partir de um corpo NDJSON (um Store por linha).
+
+    O corpo é lido em streaming e as lojas são gravadas a cada `batch_size`
+    linhas válidas. Linhas inválidas ou com ID repetido são reportadas em
+    "errors" sem interromper o lote.
+
+    Args:
+        request (Request): Corpo application/x-ndjson com registros de Store.
+        batch_size (int): Quantidade de lojas por transação.
+
+    Returns:
+        dict: Total criado, erros por linha e lojas por segundo.
+    """
+    started = time.perf_counter()
+    created = 0
+    errors = []
+    batch = []
+    seen_ids = set()
+
+    async def flush():
+        nonlocal created, batch
+        pending, batch = batch, []
+        items = [(store.dict(), initial_layout(store)) for _, store in pending]
+        # create_stores ignora (e retorna) os IDs que já existem, na mesma transação da escrita
+        existing = await run_in_threadpool(storage.create_stores, items)
+        for line_number, store in pending:
+            if store.id in existing:
+                errors.append({"line": line_number, "id": store.id, "error": "Store ID já existe"})
+        created += len(items) - len(existing)
+        record_modules(sum(store["num_columns"] * store["modules_per_column"]
+                           for store, _ in items if store["id"] not in existing))
+
+    def parse_line(line_number, line):
+        if not line.strip():
+            return
+        try:
+            store = Store(**json.loads(line))
+        except (ValueError, TypeError) as e:
+            errors.append({"line": line_number, "error": str(e)})
+            return
+        if store.id in seen_ids:
+            errors.append({"line": line_number, "id": store.id, "error": "Store ID repetido no lote"})
+            return
+        seen_ids.add(store.id)
+        batch.append((line_number, store))
+
+    line_number = 0
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            parse_line(line_number, line)
+            if len(batch) >= batch_size:
+                await flush()
+    if buffer:
+        parse_line(line_number + 1, buffer)
+    if batch:
+        await flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "message": "Lojas criadas",
+        "created": created,
+        "errors": errors,
+        "seconds": elapsed,
+        "stores_per_second": created / elapsed if elapsed > 0 else None,
+    }
+
+@app.post("/category/")
+def create_category(category: Category):
+    if storage.has_category(category.id):
+        raise HTTPException(status_code=400, detail="ID de categoria já existe")
+    storage.put_category(category.dict())
+    return {"message": "Categoria criada", "category": category}
+
+@app.get("/store-layout/{store_id}")
+def get_store_layout(store_id: int, request: Request):
+    """
+    Obtém o layout da loja especificada pelo ID.
+
+    Responde 304 (sem corpo) se o If-None-Match trouxer o ETag da versão atual.
+
+    Args:
+        store_id (int): ID da loja.
+
+    Returns:
+        Response: Layout da loja em JSON.
+    """
+    return layout_response(request, store_id)
+
+@app.put("/store-layout/{store_id}")
+def update_store_layout(store_id: int, layout_data: StoreLayoutData, response: Response,
+                        x_layout_client: Optional[str] = Header(None)):
+    """
+    Atualiza o layout da loja.
+
+    Args:
+        store_id (int): ID da loja a ser atualizada.
+        layout_data (StoreLayoutData): Dados do layout da loja. Se `version`
+            for informado, ele precisa ser igual à versão atual do layout.
+        x_layout_client (str): Editor que fez a alteração, repassado nos eventos.
+
+    Returns:
+        dict: Mensagem de confirmação e detalhes do layout atualizado.
+    """
+    if not storage.has_store(store_id):
+        raise HTTPException(status_code=404, detail="Loja não encontrada")
+
+    version = replace_store_layout(store_id, layout_data.dict(), layout_data.version, x_layout_client)
+    record_modules(sum(len(column) for column in layout_data.columns))
+    response.headers["ETag"] = layout_etag(store_id, version)
+    return {"message": "Layout atualizado", "store_layout": layout_data, "version": version}
+
+@app.get("/store-layout/{store_id}/columnar")
+def get_store_layout_columnar(store_id: int, request: Request):
+    """
+    Obtém o layout da loja no formato colunar (arrays paralelos por campo).
+
+    Args:
+        store_id (int): ID da loja.
+
+    Returns:
+        Response: Layout no formato de ColumnarLayoutData, em JSON.
+    """
+    return layout_response(request, store_id, "-columnar", layout_to_columnar)
+
+@app.put("/store-layout/{store_id}/columnar")
+def update_store_layout_columnar(store_id: int, layout_data: ColumnarLayoutData, response: Response,
+                                 x_layout_client: Optional[str] = Header(None)):
+    """
+    Atualiza o layout da loja a partir do formato colunar.
+
+    Args:
+        store_id (int): ID da loja a ser atualizada.
+        layout_data (ColumnarLayoutData): Layout em arrays paralelos.
+
+    Returns:
+        dict: Mensagem de confirmação e a nova versão do layout.
+    """
+    if not storage.has_store(store_id):
+        raise HTTPException(status_code=404, detail="Loja não encontrada")
+    try:
+        layout = columnar_to_layout(layout_data.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    version = replace_store_layout(store_id, layout, layout_data.version, x_layout_client)
+    record_modules(len(layout_data.module_ids))
+    response.headers["ETag"] = layout_etag(store_id, version, "-columnar")
+    return {"message": "Layout atualizado", "version": version}
+
+def replace_store_layout(store_id, layout, expected_version=None, origin=None):
+    # Substitui o layout inteiro, conferindo a versão quando informada
+    duplicate = duplicate_module_id(layout)
+    if duplicate is not None:
+        # Checado aqui para que os dois backends respondam igual (o SQLite recusaria pela chave primária)
+        raise HTTPException(status_code=400, detail=f"Módulo {duplicate} repetido no layout")
+    try:
+        version = storage.replace_layout(store_id, layout, expected_version)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    forget_layout_responses(store_id)
+    # Os editores recarregam o layout; o evento não leva os módulos
+    event_hub.publish(store_id, version, {"kind": "replace", "origin": origin})
+    return version
+
+def duplicate_module_id(layout):
+    """Retorna o primeiro module_id que aparece mais de uma vez no layout, ou None."""
+    seen = set()
+    for column in layout["columns"]:
+        for module in column:
+            if module["module_id"] in seen:
+                return module["module_id"]
+            seen.add(module["module_id"])
+    return None
+
+@app.patch("/store-layout/{store_id}")
+def patch_store_layout(store_id: int, patch: LayoutPatch, response: Response,
+                       x_layout_client: Optional[str] = Header(None)):
+    """
+    Aplica um lote de operações por módulo ao layout da loja.
+
+    As operações aplicadas são repassadas aos editores conectados à loja.
+
+    Args:
+        store_id (int): ID da loja a ser atualizada.
+        patch (LayoutPatch): Versão base do layout e operações a aplicar.
+        x_layout_client (str): Editor que fez a alteração, repassado nos eventos.
+
+    Returns:
+        dict: Mensagem de confirmação e a nova versão do layout.
+    """
+    if storage.layout_version(store_id) is None:
+        raise HTTPException(status_code=404, detail="Layout não encontrado")
+
+    ops = [op.dict() for op in patch.ops]
+    try:
+        version = storage.apply_ops(store_id, ops, patch.base_version)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    forget_layout_responses(store_id)
+    publish_ops(store_id, version, ops, x_layout_client)
+    record_modules(len(ops))
+    response.headers["ETag"] = layout_etag(store_id, version)
+    return {"message": "Layout atualizado", "version": version, "applied": len(patch.ops)}
+
+def publish_ops(store_id, version, ops, origin=None):
+    # Só os campos informados de cada operação vão no evento
+    event_hub.publish(store_id, version, {"kind": "ops", "origin": origin,
+                                          "ops": [{field: value for field, value in op.items() if value is not None}
+                                                  for op in ops]})
+
+@app.get("/store-layout/{store_id}/events")
+async def stream_layout_events(store_id: int, request: Request, after: Optional[int] = None):
+    """
+    Acompanha as alterações do layout (Server-Sent Events).
+
+    Cada evento "delta" tem como id a versão do layout e traz as operações
+    aplicadas (kind "ops") ou só avisa que o layout foi substituído (kind
+    "replace"). Um evento "reset" indica que as alterações desde `after` não
+    estão mais disponíveis e o layout precisa ser obtido de novo.
+
+    Args:
+        store_id (int): ID da loja.
+        after (int): Versão já conhecida pelo editor; o cabeçalho Last-Event-ID
+            tem precedência. O padrão é a versão atual.
+
+    Returns:
+        StreamingResponse: Fluxo text/event-stream.
+    """
+    version = await run_in_threadpool(storage.layout_version, store_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Layout não encontrado")
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID inválido")
+    if after is None:
+        after = version
+    return StreamingResponse(event_hub.stream(store_id, after), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/store-layout/{store_id}/validate")
+def validate_store_layout(store_id: int, check: Optional[PlacementCheck] = None):
+    """
+    Valida o posicionamento dos módulos do layout salvo.
+
+    Args:
+        store_id (int): ID da loja.
+        check (PlacementCheck): Limites da loja e largura mínima do corredor.
+
+    Returns:
+        dict: Pares de módulos sobrepostos, módulos fora dos limites e pares
+        de colunas diferentes separados por um corredor menor que o mínimo.
+    """
+    layout = storage.get_layout(store_id)
+    if layout is None:
+        raise HTTPException(status_code=404, detail="Layout não encontrado")
+
+    check = check or PlacementCheck()
+    record_modules(sum(len(column) for column in layout["columns"]))
+    report = validate_layout(layout, check.width, check.height, check.aisle_width)
+    report.update(store_id=store_id, version=layout.get("version"),
+                  valid=not (report["overlaps"] or report["out_of_bounds"] or report["aisle_violations"]))
+    return report
+
+@app.post("/store-layout/{store_id}/optimize")
+def optimize_store_layout(store_id: int, request: OptimizeRequest, x_layout_client: Optional[str] = Header(None)):
+    """
+    Escolhe a categoria de cada módulo para aproximar o share dos alvos.
+
+    Args:
+        store_id (int): ID da loja.
+        request (OptimizeRequest): Shares alvo, agrupamento e restrições. Com
+            `apply`, as mudanças são gravadas como um PATCH de set_category.
+
+    Returns:
+        dict: Mudanças por módulo, share obtido, desvio em relação aos alvos,
+        módulos alterados, tempo de cálculo e a versão do layout.
+    """
+    layout = storage.get_layout(store_id)
+    if layout is None:
+        raise HTTPException(status_code=404, detail="Layout não encontrado")
+
+    modules = [module for column in layout["columns"] for module in column]
+    record_modules(len(modules))
+    try:
+        result = optimize_layout(modules, **optimize_options(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result.update(store_id=store_id, version=layout["version"], applied=False)
+    if request.apply:
+        try:
+            result["version"] = apply_category_changes(store_id, result["changes"], layout["version"], x_layout_client)
+        except VersionConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        result["applied"] = True
+    return result
+
+@app.post("/optimize/bulk")
+def optimize_stores_bulk(request: BulkOptimizeRequest, x_layout_client: Optional[str] = Header(None)):
+    """
+    Otimiza o share das categorias de várias lojas, distribuindo-as entre processos.
+
+    As lojas são lidas aos poucos e enviadas em tarefas de até
+    OPTIMIZE_CHUNK_MODULES módulos, com no máximo duas tarefas por processo
+    em andamento. Assim a memória não cresce com o número de lojas.
+
+    Args:
+        request (BulkOptimizeRequest): Lojas (None = todas) e os mesmos
+            parâmetros de /store-layout/{id}/optimize.
+
+    Returns:
+        dict: Resultado de cada loja ("stores": desvio, share obtido, módulos
+        alterados, tempo) e o resumo do lote ("summary").
+    """
+    started = time.perf_counter()
+    options = optimize_options(request)
+    try:
+        # Valida os parâmetros uma vez, antes de distribuir as lojas
+        optimize_layout([], **options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    versions = storage.layout_versions()
+    store_ids = sorted(versions) if request.store_ids is None else request.store_ids
+    results = []
+
+    def collect(future):
+        for result in future.result():
+            if request.apply and "error" not in result:
+                try:
+                    result["version"] = apply_category_changes(result["store_id"], result["changes"], result["version"],
+                                                               x_layout_client)
+                    result["applied"] = True
+                except VersionConflict as e:
+                    result["error"] = str(e)
+            if not request.include_changes:
+                result.pop("changes", None)
+            results.append(result)
+
+    pool = get_optimizer_pool()
+    pending = set()
+    chunk, chunk_modules = [], 0
+    for position, store_id in enumerate(store_ids):
+        layout = storage.get_layout(store_id) if store_id in versions else None
+        if layout is not None:
+            modules = [module for column in layout["columns"] for module in column]
+            chunk.append((store_id, layout["version"], modules))
+            chunk_modules += len(modules)
+        if chunk and (chunk_modules >= OPTIMIZE_CHUNK_MODULES or position == len(store_ids) - 1):
+            pending.add(pool.submit(optimize_stores, chunk, options))
+            chunk, chunk_modules = [], 0
+            while len(pending) >= 2 * optimizer_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+    for future in pending:
+        collect(future)
+
+    record_modules(sum(result["modules"] for result in results if "modules" in result))
+    elapsed = time.perf_counter() - started
+    solved = [result for result in results if "error" not in result]
+    results.sort(key=lambda result: result["store_id"])
+    return {
+        "stores": results,
+        "missing": [store_id for store_id in store_ids if store_id not in versions],
+        "summary": {
+            "stores": len(results),
+            "failed": len(results) - len(solved),
+            "applied": sum(bool(result.get("applied")) for result in results),
+            "modules_changed": sum(result["changed"] for result in solved),
+            "mean_deviation": sum(result["deviation"] for result in solved) / len(solved) if solved else None,
+            "max_deviation": max((result["max_deviation"] for result in solved), default=None),
+            "solve_seconds": sum(result["seconds"] for result in solved),
+            "seconds": elapsed,
+            "stores_per_second": len(results) / elapsed if elapsed > 0 else None,
+            "workers": optimizer_workers,
+        },
+    }
+
+def optimize_options(request):
+    # Os alvos e os pares de adjacência só podem usar categorias cadastradas (com apply, elas vão para o layout)
+    category_ids = set(request.targets) | {category_id for pair in request.adjacent for category_id in pair}
+    unknown = sorted(category_id for category_id in category_ids if not storage.has_category(category_id))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Categorias não encontradas: {unknown}")
+    return {"targets": request.targets, "weight": request.weight, "group": request.group,
+            "adjacent": request.adjacent, "change_penalty": request.change_penalty, "time_limit": request.time_limit}
+
+def apply_category_changes(store_id, changes, base_version, origin=None):
+    """
+    Grava as categorias escolhidas pelo otimizador como operações set_category.
+
+    Raises:
+        VersionConflict: Se o layout mudou desde a leitura usada no cálculo.
+
+    Returns:
+        int: Nova versão do layout (a mesma, se não houver mudanças).
+    """
+    if not changes:
+        return base_version
+    ops = [{"op": "set_category", "module_id": module_id, "category_id": category_id}
+           for module_id, category_id in changes.items()]
+    version = storage.apply_ops(store_id, ops, base_version)
+    forget_layout_responses(store_id)
+    publish_ops(store_id, version, ops, origin)
+    return version
+
+def get_optimizer_pool():
+    global optimizer_pool
+    with optimizer_pool_lock:
+        if optimizer_pool is None:
+            # "spawn": o servidor tem threads, e um fork copiaria locks que estão em uso
+            optimizer_pool = ProcessPoolExecutor(optimizer_workers, mp_context=multiprocessing.get_context("spawn"))
+        return optimizer_pool
+
+@app.on_event("shutdown")
+def shutdown_optimizer_pool():
+    if optimizer_pool is not None:
+        optimizer_pool.shutdown(cancel_futures=True)
+
+#Calcula o share do layout
+@app.get("/store-layout/{store_id}/share")
+def get_store_layout_share(store_id: int):
+    """
+    Calcula a participação (%) de cada categoria no total de módulos do layout.
+
+    Usa os contadores mantidos pelo armazenamento a cada escrita, então o
+    custo não depende do número de módulos. Com LAYOUT_SHARE_COUNTERS=check
+    os contadores são comparados com uma recontagem completa; com "off" a
+    recontagem é sempre usada.
+
+    Args:
+        store_id (int): ID da loja.
+
+    Returns:
+        dict: category_id -> share em porcentagem.
+    """
+    if share_counters_mode == "off":
+        counts = storage.recount_categories(store_id) if storage.layout_version(store_id) is not None else None
+    else:
+        counts = storage.category_counts(store_id)
+    if counts is None:
+        raise HTTPException(status_code=404, detail="Layout não encontrado")
+
+    if share_counters_mode == "check":
+        recounted = storage.recount_categories(store_id)
+        if recounted != counts:
+            logger.warning("Contadores de categoria inconsistentes na loja %s: %s != %s; refazendo",
+                           store_id, counts, recounted)
+            metrics.count_counter_mismatch()
+            storage.rebuild_counters(store_id)
+            counts = recounted
+
+    total_modules, category_counts = counts
+    record_modules(total_modules)
+    if not total_modules:
+        return {}
+    participation = {cat_id: (count / total_modules) * 100 for cat_id, count in category_counts.items()} #calcula o share
+    return participation
+
+@app.post("/share/bulk")
+def get_bulk_share(request: BulkShareRequest):
+    """
+    Calcula o share das categorias de várias lojas em uma única chamada.
+
+    Args:
+        request (BulkShareRequest): Lojas, tipo de peso e agrupamento desejados.
+
+    Returns:
+        dict: Share por loja ("stores"), da rede inteira ("total") e por grupo ("groups").
+    """
+    if request.weight not in ("count", "area"):
+        raise HTTPException(status_code=400, detail="weight deve ser 'count' ou 'area'")
+    if request.group_by not in (None, "region", "store_format"):
+        raise HTTPException(status_code=400, detail="group_by deve ser 'region' ou 'store_format'")
+
+    # IDs repetidos contariam a loja duas vezes nos totais
+    store_ids = None if request.store_ids is None else list(dict.fromkeys(request.store_ids))
+    store_rows, cells = storage.share_rows(store_ids)
+    record_modules(sum(row[1] for row in store_rows))
+    store_groups = storage.store_attribute(request.group_by, store_ids) if request.group_by else None
+    result = aggregate_shares(store_rows, cells, request.weight, store_groups, request.include_stores)
+    if store_ids is not None:
+        found = {row[0] for row in store_rows}
+        result["missing"] = [store_id for store_id in store_ids if store_id not in found]
+    return result
+
+def aggregate_shares(store_rows, cells, weight="count", store_groups=None, include_stores=True):
+    """
+    Calcula o share por loja, total e por grupo com operações vetorizadas do NumPy.
+
+    Os contadores de cada loja viram uma matriz lojas x categorias, então o
+    custo depende do número de lojas e categorias, não do número de módulos.
+
+    Args:
+        store_rows (list): [(store_id, total de módulos, área total)].
+        cells (list): [(store_id, category_id, quantidade, área)].
+        weight (str): "count" ou "area".
+        store_groups (dict | None): store_id -> rótulo do grupo.
+        include_stores (bool): Inclui o share de cada loja.
+
+    Returns:
+        dict: Share em porcentagem por loja, total e por grupo.
+    """
+    import numpy as np
+
+    result = {"weight": weight, "total": {}}
+    if include_stores:
+        result["stores"] = {}
+    if store_groups is not None:
+        result["groups"] = {}
+    if not store_rows:
+        return result
+
+    value_column = 1 if weight == "count" else 2
+    store_array = np.array(store_rows, dtype=np.int64).reshape(-1, 3)
+    store_ids = store_array[:, 0]
+    totals = store_array[:, value_column].astype(np.float64)
+
+    cell_array = np.array(cells, dtype=np.int64).reshape(-1, 4)
+    order = np.argsort(store_ids)
+    rows = order[np.searchsorted(store_ids[order], cell_array[:, 0])]
+    category_ids, cols = np.unique(cell_array[:, 1], return_inverse=True)
+    matrix = np.zeros((len(store_ids), len(category_ids)))
+    matrix[rows, cols] = cell_array[:, value_column + 1]
+
+    def share(values, denominators):
+        denominators = denominators[:, None]
+        return np.divide(values * 100, denominators, out=np.zeros_like(values), where=denominators > 0)
+
+    def as_dict(row):
+        return {int(category_ids[i]): float(row[i]) for i in np.flatnonzero(row)}
+
+    result["total"] = as_dict(share(matrix.sum(axis=0, keepdims=True), totals.sum(keepdims=True))[0])
+
+    if include_stores:
+        store_shares = share(matrix, totals)
+        result["stores"] = {int(store_id): as_dict(row) for store_id, row in zip(store_ids, store_shares)}
+
+    if store_groups is not None:
+        labels = {}
+        codes = np.array([labels.setdefault(store_groups.get(int(store_id)), len(labels)) for store_id in store_ids])
+        group_matrix = np.zeros((len(labels), len(category_ids)))
+        np.add.at(group_matrix, codes, matrix)
+        group_totals = np.bincount(codes, weights=totals, minlength=len(labels))
+        group_shares = share(group_matrix, group_totals)
+        result["groups"] = {str(label): as_dict(group_shares[code]) for label, code in labels.items()}
+
+    return result
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Métricas do processo no formato texto do Prometheus.
+
+    Com vários workers, cada requisição é atendida por um deles e traz só as
+    métricas daquele processo (ver layout_process_start_time_seconds).
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def run_server(host="127.0.0.1", port=8000, workers=1):
+    """
+    Sobe o servidor.
+
+    Com mais de um worker, cada processo abre o próprio backend; por isso o
+    armazenamento precisa ser compartilhado (SQLite). Se LAYOUT_STORAGE não
+    estiver definido, os workers usam sqlite:///layout.db.
+    """
+    import uvicorn
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port)
+        return
+
+    storage_url = os.environ.setdefault("LAYOUT_STORAGE", "sqlite:///layout.db")
+    if not storage_url.startswith("sqlite:///"):
+        raise SystemExit(f"--workers {workers} exige um armazenamento compartilhado (sqlite:///...), não {storage_url!r}")
+    # Os workers importam este módulo de novo e herdam LAYOUT_STORAGE do ambiente
+    uvicorn.run("layout_server:app", host=host, port=port, workers=workers,
+                app_dir=os.path.dirname(os.path.abspath(__file__)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend do layout de lojas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Processos do servidor (exige SQLite se > 1)")
+    args = parser.parse_args()
+    run_server(args.host, args.port, args.workers)
@@ -0,0 +1,267 @@
+"""
+Índice espacial dos módulos e validação de posicionamento.
+
+Os módulos são retângulos girados em torno do canto superior esquerdo
+(x, y), como o QGraphicsRectItem do cliente. O índice é um hash de grade
+uniforme: cada módulo é registrado nas células que a sua caixa envolvente
+toca, então mover um módulo só atualiza as células dele e as consultas só
+testam os vizinhos, sem comparar todos os pares.
+"""
+import math
+
+DEFAULT_CELL_SIZE = 80  # Um pouco maior que um módulo padrão (60 x 30)
+MAX_ENTRY_CELLS = 4096  # Módulos que tocam mais células que isso ficam fora da grade (testados em toda consulta)
+EPSILON = 1e-6  # Bordas encostadas não contam como sobreposição
+
+
+def module_corners(x, y, width, height, rotation=0):
+    """Retorna os quatro cantos do módulo na cena, girado `rotation` graus (sentido do Qt)."""
+    if not rotation:
+        return ((x, y), (x + width, y), (x + width, y + height), (x, y + height))
+    if rotation % 90 == 0:
+        # Valores exatos para múltiplos de 90°, sem erro de ponto flutuante
+        cos, sin = ((1, 0), (0, 1), (-1, 0), (0, -1))[int(rotation // 90) % 4]
+    else:
+        angle = math.radians(rotation)
+        cos, sin = math.cos(angle), math.sin(angle)
+    return tuple((x + px * cos - py * sin, y + px * sin + py * cos)
+                 for px, py in ((0, 0), (width, 0), (width, height), (0, height)))
+
+
+def polygons_overlap(a, b):
+    """Teste de eixos separadores (SAT) entre dois retângulos convexos."""
+    for polygon in (a, b):
+        for i in range(2):  # Em um retângulo, duas arestas já dão todos os eixos
+            (x1, y1), (x2, y2) = polygon[i], polygon[i + 1]
+            axis_x, axis_y = y1 - y2, x2 - x1
+            a_values = [px * axis_x + py * axis_y for px, py in a]
+            b_values = [px * axis_x + py * axis_y for px, py in b]
+            length = math.hypot(axis_x, axis_y) or 1.0
+            if (min(a_values) >= max(b_values) - EPSILON * length
+                    or min(b_values) >= max(a_values) - EPSILON * length):
+                return False
+    return True
+
+
+def polygons_distance(a, b):
+    """Menor distância entre dois retângulos que não se sobrepõem."""
+    return min(min(_segment_distance(point, polygon[i], polygon[(i + 1) % 4])
+                   for point in other for i in range(4))
+               for polygon, other in ((a, b), (b, a)))
+
+
+def _segment_distance(point, start, end):
+    (px, py), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0 if not length else max(0.0, min(1.0, ((px - x1) * dx + (py - y1) * dy) / length))
+    return math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+
+class _Entry:
+    __slots__ = ("corners", "bbox", "cells", "column", "axis_aligned")
+
+    def __init__(self, corners, column, cell_size, axis_aligned):
+        xs = [px for px, _ in corners]
+        ys = [py for _, py in corners]
+        self.corners = corners
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.cells = _cells(self.bbox, cell_size)
+        self.column = column
+        self.axis_aligned = axis_aligned
+
+
+def _pair_conflict(a, b, aisle_width):
+    """
+    Compara dois módulos.
+
+    Returns:
+        float | None: -1 se eles se sobrepõem, a distância entre eles se
+        estiverem em colunas diferentes e mais próximos que `aisle_width`,
+        ou None se não houver conflito.
+    """
+    (a_left, a_top, a_right, a_bottom), (b_left, b_top, b_right, b_bottom) = a.bbox, b.bbox
+    gap_x = max(b_left - a_right, a_left - b_right)
+    gap_y = max(b_top - a_bottom, a_top - b_bottom)
+    if gap_x > aisle_width or gap_y > aisle_width:
+        return None
+    if a.axis_aligned and b.axis_aligned:
+        # Caso comum (rotações múltiplas de 90°): as caixas envolventes são os próprios módulos
+        if gap_x < -EPSILON and gap_y < -EPSILON:
+            return -1
+        if not aisle_width or a.column == b.column:
+            return None
+        gap = math.hypot(max(gap_x, 0), max(gap_y, 0))
+    else:
+        if polygons_overlap(a.corners, b.corners):
+            return -1
+        if not aisle_width or a.column == b.column:
+            return None
+        gap = polygons_distance(a.corners, b.corners)
+    return gap if gap < aisle_width else None
+
+
+def _cell_range(bbox, cell_size, margin=0):
+    # (primeira coluna, primeira linha, última coluna, última linha) de células que a caixa toca
+    left, top, right, bottom = bbox
+    return (math.floor((left - margin) / cell_size), math.floor((top - margin) / cell_size),
+            math.floor((right + margin) / cell_size), math.floor((bottom + margin) / cell_size))
+
+
+def _cells(bbox, cell_size, limit=MAX_ENTRY_CELLS):
+    """Células que a caixa toca, ou None se forem mais que `limit`."""
+    first_x, first_y, last_x, last_y = _cell_range(bbox, cell_size)
+    if (last_x - first_x + 1) * (last_y - first_y + 1) > limit:
+        return None
+    return [(cx, cy) for cx in range(first_x, last_x + 1) for cy in range(first_y, last_y + 1)]
+
+
+class SpatialIndex:
+    """
+    Hash de grade uniforme com os retângulos (girados) dos módulos.
+
+    Args:
+        cell_size (int): Lado das células da grade, em pixels da cena.
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> set de module_id
+        self.entries = {}  # module_id -> _Entry
+        self.oversized = set()  # Módulos grandes demais para a grade (entry.cells é None)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, module_id):
+        return module_id in self.entries
+
+    def insert(self, module_id, x, y, width, height, rotation=0, column=None):
+        """Insere ou atualiza o módulo; só as células que mudaram são tocadas."""
+        entry = _Entry(module_corners(x, y, width, height, rotation), column, self.cell_size, rotation % 90 == 0)
+        old = self.entries.get(module_id)
+        old_cells = set(old.cells or ()) if old is not None else set()
+        new_cells = set(entry.cells or ())
+        if entry.cells is None:
+            self.oversized.add(module_id)
+        else:
+            self.oversized.discard(module_id)
+        for cell in old_cells - new_cells:
+            members = self.cells[cell]
+            members.discard(module_id)
+            if not members:
+                del self.cells[cell]
+        for cell in new_cells - old_cells:
+            self.cells.setdefault(cell, set()).add(module_id)
+        self.entries[module_id] = entry
+
+    update = insert
+
+    def insert_module(self, module):
+        """Insere um módulo no formato de Module.dict()."""
+        self.insert(module["module_id"], module["x"], module["y"], module.get("width", 60),
+                    module.get("height", 30), module.get("rotation", 0), module.get("column"))
+
+    def remove(self, module_id):
+        entry = self.entries.pop(module_id, None)
+        if entry is None:
+            return
+        self.oversized.discard(module_id)
+        for cell in entry.cells or ():
+            members = self.cells[cell]
+            members.discard(module_id)
+            if not members:
+                del self.cells[cell]
+
+    def candidates(self, bbox, margin=0):
+        """IDs registrados nas células que cobrem `bbox` expandida de `margin`."""
+        found = set(self.oversized)
+        first_x, first_y, last_x, last_y = _cell_range(bbox, self.cell_size, margin)
+        if (last_x - first_x + 1) * (last_y - first_y + 1) > len(self.cells):
+            # A caixa cobre mais células do que as ocupadas: percorre só as ocupadas
+            for (cx, cy), members in self.cells.items():
+                if first_x <= cx <= last_x and first_y <= cy <= last_y:
+                    found |= members
+            return found
+        for cx in range(first_x, last_x + 1):
+            for cy in range(first_y, last_y + 1):
+                members = self.cells.get((cx, cy))
+                if members:
+                    found |= members
+        return found
+
+    def conflicts(self, module_id, aisle_width=0):
+        """
+        Verifica um módulo contra os vizinhos.
+
+        Returns:
+            tuple: (set de IDs sobrepostos, {module_id: distância} dos módulos
+            de outras colunas mais próximos que `aisle_width`).
+        """
+        entry = self.entries[module_id]
+        overlaps, aisles = set(), {}
+        for other_id in self.candidates(entry.bbox, aisle_width):
+            if other_id == module_id:
+                continue
+            gap = _pair_conflict(entry, self.entries[other_id], aisle_width)
+            if gap is None:
+                continue
+            if gap < 0:
+                overlaps.add(other_id)
+            else:
+                aisles[other_id] = gap
+        return overlaps, aisles
+
+    def out_of_bounds(self, width, height):
+        """IDs dos módulos que saem do retângulo (0, 0, width, height)."""
+        return sorted(module_id for module_id, entry in self.entries.items()
+                      if entry.bbox[0] < -EPSILON or entry.bbox[1] < -EPSILON
+                      or entry.bbox[2] > width + EPSILON or entry.bbox[3] > height + EPSILON)
+
+    def validate(self, width=None, height=None, aisle_width=0):
+        """
+        Verifica todos os módulos do índice.
+
+        Returns:
+            dict: "overlaps" (pares de IDs), "out_of_bounds" (IDs) e
+            "aisle_violations" (pares com a distância entre eles).
+        """
+        overlaps, aisle_violations = [], []
+        for module_id in sorted(self.entries):
+            entry = self.entries[module_id]
+            # Cada par é testado e reportado uma vez, a partir do menor ID
+            for other_id in sorted(other_id for other_id in self.candidates(entry.bbox, aisle_width) if other_id > module_id):
+                gap = _pair_conflict(entry, self.entries[other_id], aisle_width)
+                if gap is None:
+                    continue
+                if gap < 0:
+                    overlaps.append([module_id, other_id])
+                else:
+                    aisle_violations.append({"modules": [module_id, other_id], "gap": round(gap, 2)})
+        out_of_bounds = self.out_of_bounds(width, height) if width is not None and height is not None else []
+        return {"overlaps": overlaps, "out_of_bounds": out_of_bounds, "aisle_violations": aisle_violations}
+
+
+def build_index(layout, cell_size=DEFAULT_CELL_SIZE):
+    """Cria o índice a partir de um layout no formato de StoreLayoutData.dict()."""
+    index = SpatialIndex(cell_size)
+    for column in layout.get("columns", []):
+        for module in column:
+            index.insert_module(module)
+    return index
+
+
+def validate_layout(layout, width=None, height=None, aisle_width=0, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Valida o posicionamento dos módulos de um layout.
+
+    Args:
+        layout (dict): Layout no formato de StoreLayoutData.dict().
+        width, height (float | None): Limites da loja; None não verifica os limites.
+        aisle_width (float): Largura mínima do corredor entre módulos de colunas
+            diferentes; 0 desativa a verificação.
+
+    Returns:
+        dict: Resultado de SpatialIndex.validate().
+    """
+    return build_index(layout, cell_size).validate(width, height, aisle_width)
@@ -0,0 +1,63 @@
+"""
+Medição do tempo de abertura do editor.
+
+Com LAYOUT_STARTUP_PROFILE=1, app_layout.py registra quanto tempo levou
+cada grupo de imports e cada etapa da abertura (QApplication, janela,
+janela exibida) e imprime o resumo em stderr, comparando o total com o
+orçamento de LAYOUT_STARTUP_BUDGET_MS.
+
+`python app_layout.py --startup-check` abre a janela, imprime o resumo e
+sai com código 1 se o orçamento foi ultrapassado. Para o detalhe de cada
+módulo importado, use `python -X importtime app_layout.py`.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUDGET_MS = 400  # Orçamento do tempo até a janela ser exibida
+
+
+class StartupProfile:
+    def __init__(self, enabled=False, budget_ms=DEFAULT_BUDGET_MS):
+        self.enabled = enabled
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.steps = []  # (descrição, ms)
+
+    @contextmanager
+    def section(self, label):
+        """Mede um trecho (ex.: um grupo de imports) e registra como uma etapa."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((label, (time.perf_counter() - started) * 1000))
+            self.last = time.perf_counter()
+
+    def mark(self, label):
+        """Registra o tempo desde a etapa anterior."""
+        now = time.perf_counter()
+        self.steps.append((label, (now - self.last) * 1000))
+        self.last = now
+
+    def elapsed_ms(self):
+        return (self.last - self.started) * 1000
+
+    def within_budget(self):
+        return self.elapsed_ms() <= self.budget_ms
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        total = self.elapsed_ms()
+        width = max((len(label) for label, _ in self.steps), default=0)
+        print("Tempo de abertura:", file=stream)
+        for label, ms in self.steps:
+            print(f"  {label:<{width}}  {ms:7.1f} ms", file=stream)
+        status = "dentro do" if self.within_budget() else "ACIMA do"
+        print(f"  {'total':<{width}}  {total:7.1f} ms ({status} orçamento de {self.budget_ms} ms)", file=stream)
+
+
+profile = StartupProfile(enabled=os.environ.get("LAYOUT_STARTUP_PROFILE", "0") not in ("", "0"),
+                         budget_ms=int(os.environ.get("LAYOUT_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)))
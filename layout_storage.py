@@ -0,0 +1,940 @@
+"""
+Armazenamento das lojas, categorias e layouts do backend.
+
+MemoryStorage mantém tudo no processo, com os layouts no formato compacto
+de layout_compact (arrays tipados por campo), e SQLiteStorage grava em um arquivo SQLite em modo WAL, com um
+módulo por linha. Use open_storage() para escolher o backend a partir de
+uma URL ("memory" ou "sqlite:///caminho/para/layout.db").
+"""
+import json
+import sqlite3
+import itertools
+import threading
+import uuid
+from collections import OrderedDict, deque
+
+from layout_compact import NO_CATEGORY, CompactLayout, StringTable, check_module_values
+from layout_models import MODULE_OP_FIELDS, op_changes
+
+# Campos de MODULE_OP_FIELDS que cada operação precisa informar
+MODULE_OP_REQUIRED = {
+    "move": ("x", "y"),
+    "resize": ("width", "height"),
+    "rotate": ("rotation",),
+    "rename": ("name",),
+    "set_category": (),
+}
+MODULE_FIELDS = ("module_id", "column", "row", "x", "y", "name", "category_id", "width", "height", "rotation")
+EVENT_RETENTION = 10000  # Eventos de alteração mantidos (de todas as lojas) para a retomada dos editores
+
+
+class VersionConflict(Exception):
+    """A versão informada não é a versão atual do layout."""
+
+    def __init__(self, current_version):
+        super().__init__(f"Versão do layout desatualizada (atual: {current_version})")
+        self.current_version = current_version
+
+
+def validate_ops(existing, ops):
+    """
+    Valida um lote de operações antes de aplicá-lo.
+
+    Args:
+        existing (set): IDs (entre os referenciados pelas operações) que já existem no layout.
+        ops (list): Operações no formato de ModuleOp.dict().
+
+    Raises:
+        ValueError: Se alguma operação for inválida.
+    """
+    existing = set(existing)
+    for op in ops:
+        module_id = op["module_id"]
+        if op["op"] == "add":
+            module = op.get("module")
+            if module is None or module["module_id"] != module_id:
+                raise ValueError(f"Operação add do módulo {module_id} sem dados do módulo")
+            if module_id in existing:
+                raise ValueError(f"Módulo {module_id} já existe")
+            check_module_values(module)
+            existing.add(module_id)
+        elif op["op"] == "delete":
+            if module_id not in existing:
+                raise ValueError(f"Módulo {module_id} não encontrado")
+            existing.discard(module_id)
+        elif op["op"] in MODULE_OP_FIELDS:
+            if module_id not in existing:
+                raise ValueError(f"Módulo {module_id} não encontrado")
+            for field in MODULE_OP_REQUIRED[op["op"]]:
+                if op.get(field) is None:
+                    raise ValueError(f"Operação {op['op']} do módulo {module_id} sem o campo {field}")
+            check_module_values(op_changes(op))
+        else:
+            raise ValueError(f"Operação desconhecida: {op['op']}")
+
+
+def count_layout(layout):
+    """
+    Conta os módulos e a área do layout por categoria, percorrendo todos os módulos.
+
+    Returns:
+        CategoryCounter: Contadores do layout.
+    """
+    counter = CategoryCounter()
+    cells = counter.cells
+    for column in layout.get("columns", []):
+        counter.total += len(column)
+        for module in column:
+            area = module.get("width", 60) * module.get("height", 30)
+            counter.total_area += area
+            category_id = module.get("category_id")
+            if category_id is not None:
+                cell = cells.setdefault(category_id, [0, 0])
+                cell[0] += 1
+                cell[1] += area
+    return counter
+
+
+def count_compact(layout):
+    """
+    Conta os módulos e a área de um CompactLayout por categoria.
+
+    Returns:
+        CategoryCounter: Contadores do layout.
+    """
+    counter = CategoryCounter()
+    cells = counter.cells
+    counter.total = len(layout)
+    for category_id, width, height in zip(layout.category_ids, layout.width, layout.height):
+        area = width * height
+        counter.total_area += area
+        if category_id != NO_CATEGORY:
+            cell = cells.setdefault(category_id, [0, 0])
+            cell[0] += 1
+            cell[1] += area
+    return counter
+
+
+def count_categories(layout):
+    """
+    Returns:
+        tuple: (total de módulos, {category_id: quantidade}).
+    """
+    counter = count_layout(layout)
+    return counter.total, counter.categories
+
+
+def module_area(module):
+    return module.get("width", 60) * module.get("height", 30)
+
+
+class CategoryCounter:
+    """
+    Total de módulos, área total e (quantidade, área) por categoria.
+
+    Também é usado para acumular as variações de um lote de operações, por
+    isso as categorias zeradas continuam em `cells` até serem filtradas.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.total_area = 0
+        self.cells = {}  # category_id -> [quantidade, área]
+
+    def add(self, category_id, area, sign=1):
+        self.total += sign
+        self.total_area += sign * area
+        self._add_cell(category_id, sign, sign * area)
+
+    def change(self, old_category_id, old_area, new_category_id, new_area):
+        # Um módulo existente mudou de categoria e/ou de tamanho
+        self.total_area += new_area - old_area
+        self._add_cell(old_category_id, -1, -old_area)
+        self._add_cell(new_category_id, 1, new_area)
+
+    def _add_cell(self, category_id, count, area):
+        if category_id is None:
+            return
+        cell = self.cells.setdefault(category_id, [0, 0])
+        cell[0] += count
+        cell[1] += area
+
+    @property
+    def categories(self):
+        return {category_id: cell[0] for category_id, cell in self.cells.items() if cell[0]}
+
+
+class LayoutStorage:
+    """
+    Interface comum dos backends.
+
+    Lojas e categorias são dicts com os campos de Store e Category; layouts
+    são dicts no formato de StoreLayoutData.dict() (com "version").
+    """
+
+    def has_store(self, store_id):
+        raise NotImplementedError
+
+    def get_store(self, store_id):
+        raise NotImplementedError
+
+    def put_store(self, store):
+        """Atualiza os dados de uma loja existente (sem alterar o layout)."""
+        raise NotImplementedError
+
+    def has_category(self, category_id):
+        raise NotImplementedError
+
+    def put_category(self, category):
+        raise NotImplementedError
+
+    def create_store(self, store, layout):
+        """
+        Grava a loja e o layout inicial (versão 1).
+
+        Returns:
+            bool: False se já existir uma loja com o mesmo ID (nada é gravado).
+        """
+        return not self.create_stores([(store, layout)])
+
+    def create_stores(self, items):
+        """
+        Grava vários pares (loja, layout inicial) em uma única transação.
+
+        A verificação de que cada ID ainda não existe é feita dentro da mesma
+        transação da escrita, então uma criação concorrente (outra requisição
+        ou outro worker) nunca sobrescreve uma loja existente.
+
+        Returns:
+            set: IDs que já existiam; essas lojas são ignoradas.
+        """
+        raise NotImplementedError
+
+    def existing_store_ids(self, store_ids):
+        """Retorna o subconjunto de `store_ids` que já existe."""
+        raise NotImplementedError
+
+    def get_layout(self, store_id):
+        """Retorna o layout completo ou None."""
+        raise NotImplementedError
+
+    def layout_version(self, store_id):
+        raise NotImplementedError
+
+    def layout_versions(self):
+        """Retorna {store_id: versão do layout} de todas as lojas."""
+        raise NotImplementedError
+
+    def replace_layout(self, store_id, layout, expected_version=None):
+        """
+        Substitui o layout inteiro.
+
+        Raises:
+            VersionConflict: Se `expected_version` não for a versão atual.
+
+        Returns:
+            int: Nova versão do layout.
+        """
+        raise NotImplementedError
+
+    def apply_ops(self, store_id, ops, base_version):
+        """
+        Aplica um lote de operações por módulo de forma atômica.
+
+        Raises:
+            VersionConflict: Se `base_version` não for a versão atual.
+            ValueError: Se alguma operação for inválida.
+
+        Returns:
+            int: Nova versão do layout.
+        """
+        raise NotImplementedError
+
+    def category_counts(self, store_id):
+        """
+        Contadores mantidos a cada escrita, sem percorrer os módulos.
+
+        Returns:
+            tuple | None: (total de módulos, {category_id: quantidade}).
+        """
+        raise NotImplementedError
+
+    def recount_categories(self, store_id):
+        """Recalcula os contadores do zero (usado na verificação de consistência)."""
+        raise NotImplementedError
+
+    def rebuild_counters(self, store_id):
+        """Regrava os contadores a partir de uma recontagem completa."""
+        raise NotImplementedError
+
+    def share_rows(self, store_ids=None):
+        """
+        Contadores de várias lojas de uma vez, para o share agregado.
+
+        Args:
+            store_ids (list | None): Lojas desejadas (None = todas).
+
+        Returns:
+            tuple: (stores, cells), onde stores = [(store_id, total, área total)]
+            e cells = [(store_id, category_id, quantidade, área)].
+        """
+        raise NotImplementedError
+
+    def store_attribute(self, field, store_ids=None):
+        """Retorna {store_id: valor do campo} dos dados das lojas."""
+        raise NotImplementedError
+
+    def append_event(self, store_id, version, data):
+        """
+        Registra a alteração que levou o layout à `version`.
+
+        Os eventos são compartilhados entre os processos do servidor; os
+        mais antigos são descartados além de EVENT_RETENTION.
+
+        Args:
+            data (str): Evento já serializado em JSON.
+        """
+        raise NotImplementedError
+
+    def events_since(self, cursor, limit=1000):
+        """
+        Eventos de todas as lojas registrados depois de `cursor`.
+
+        Returns:
+            list: [(id do evento, store_id, versão, data)], em ordem de id.
+        """
+        raise NotImplementedError
+
+    def store_events(self, store_id, after_version):
+        """Eventos ainda guardados da loja com versão maior que `after_version`, em ordem."""
+        raise NotImplementedError
+
+    def last_event_id(self):
+        raise NotImplementedError
+
+    def epoch(self):
+        """
+        Identificador desta base de dados.
+
+        As versões dos layouts só são únicas dentro de uma mesma base; o
+        epoch entra nos ETags para que uma base nova (ex.: servidor em memória
+        reiniciado) não gere os mesmos ETags com outro conteúdo.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(LayoutStorage):
+    def __init__(self):
+        self.stores = {}
+        self.categories = {}
+        self.layouts = {}  # store_id -> CompactLayout
+        self.strings = StringTable()  # Nomes dos módulos, compartilhados entre as lojas
+        self.counters = {}  # store_id -> CategoryCounter
+        self.lock = threading.RLock()
+        self.memory_epoch = uuid.uuid4().hex[:8]
+        self.events = deque(maxlen=EVENT_RETENTION)  # (id, store_id, versão, data)
+        self.event_counter = 0
+
+    def has_store(self, store_id):
+        return store_id in self.stores
+
+    def get_store(self, store_id):
+        return self.stores.get(store_id)
+
+    def put_store(self, store):
+        with self.lock:
+            if store["id"] in self.stores:
+                self.stores[store["id"]] = store
+
+    def has_category(self, category_id):
+        return category_id in self.categories
+
+    def put_category(self, category):
+        self.categories[category["id"]] = category
+
+    def create_stores(self, items):
+        existing = set()
+        with self.lock:
+            for store, layout in items:
+                if store["id"] in self.stores:
+                    existing.add(store["id"])
+                    continue
+                self.stores[store["id"]] = store
+                self.layouts.pop(store["id"], None)
+                self.replace_layout(store["id"], layout)
+        return existing
+
+    def existing_store_ids(self, store_ids):
+        return {store_id for store_id in store_ids if store_id in self.stores}
+
+    # Os arrays do CompactLayout são alterados no lugar por apply_ops; toda leitura deles
+    # acontece sob self.lock para nunca ver um lote aplicado pela metade
+    def get_layout(self, store_id):
+        with self.lock:
+            layout = self.layouts.get(store_id)
+            return None if layout is None else layout.to_layout()
+
+    def layout_version(self, store_id):
+        with self.lock:
+            layout = self.layouts.get(store_id)
+            return None if layout is None else layout.version
+
+    def layout_versions(self):
+        with self.lock:
+            return {store_id: layout.version for store_id, layout in self.layouts.items()}
+
+    def append_event(self, store_id, version, data):
+        with self.lock:
+            self.event_counter += 1
+            self.events.append((self.event_counter, store_id, version, data))
+
+    def events_since(self, cursor, limit=1000):
+        with self.lock:
+            if not self.events:
+                return []
+            # Os ids são consecutivos, então a posição do cursor no deque é direta
+            start = max(0, cursor - self.events[0][0] + 1)
+            return list(itertools.islice(self.events, start, start + limit))
+
+    def store_events(self, store_id, after_version):
+        with self.lock:
+            return [event for event in self.events if event[1] == store_id and event[2] > after_version]
+
+    def last_event_id(self):
+        return self.event_counter
+
+    def epoch(self):
+        return self.memory_epoch
+
+    def replace_layout(self, store_id, layout, expected_version=None):
+        with self.lock:
+            current_version = self.layout_version(store_id) or 0
+            if expected_version is not None and expected_version != current_version:
+                raise VersionConflict(current_version)
+
+            layout = dict(layout, store_id=store_id, version=current_version + 1)
+            self.layouts[store_id] = CompactLayout.from_layout(layout, self.strings)
+            self.rebuild_counters(store_id)
+            return layout["version"]
+
+    def apply_ops(self, store_id, ops, base_version):
+        with self.lock:
+            layout = self.layouts[store_id]
+            if base_version != layout.version:
+                raise VersionConflict(layout.version)
+
+            index = layout.index
+            # Todo o lote é validado (IDs e valores) antes de alterar o layout: ou aplica tudo ou nada
+            validate_ops({op["module_id"] for op in ops if op["module_id"] in index}, ops)
+
+            counter = self.counters[store_id]
+            for op in ops:
+                if op["op"] == "add":
+                    module = op["module"]
+                    layout.append(module)
+                    counter.add(module.get("category_id"), module_area(module))
+                elif op["op"] == "delete":
+                    slot = index[op["module_id"]]
+                    category_id = layout.category_ids[slot]
+                    counter.add(None if category_id == NO_CATEGORY else category_id,
+                                layout.width[slot] * layout.height[slot], -1)
+                    layout.remove(slot)
+                else:
+                    slot = index[op["module_id"]]
+                    changes = op_changes(op)
+                    if op["op"] in ("resize", "set_category"):
+                        old = layout.module(slot)
+                        layout.update(slot, changes)
+                        new = layout.module(slot)
+                        counter.change(old["category_id"], module_area(old), new["category_id"], module_area(new))
+                    else:
+                        layout.update(slot, changes)
+
+            layout.version += 1
+            return layout.version
+
+    def category_counts(self, store_id):
+        with self.lock:
+            counter = self.counters.get(store_id)
+            return None if counter is None else (counter.total, dict(counter.categories))
+
+    def recount_categories(self, store_id):
+        with self.lock:
+            counter = count_compact(self.layouts[store_id])
+        return counter.total, counter.categories
+
+    def rebuild_counters(self, store_id):
+        with self.lock:
+            self.counters[store_id] = count_compact(self.layouts[store_id])
+
+    def share_rows(self, store_ids=None):
+        stores, cells = [], []
+        with self.lock:
+            for store_id in (self.counters if store_ids is None else store_ids):
+                counter = self.counters.get(store_id)
+                if counter is None:
+                    continue
+                stores.append((store_id, counter.total, counter.total_area))
+                cells.extend((store_id, category_id, count, area)
+                             for category_id, (count, area) in counter.cells.items() if count)
+        return stores, cells
+
+    def store_attribute(self, field, store_ids=None):
+        store_ids = self.stores if store_ids is None else store_ids
+        return {store_id: self.stores[store_id].get(field) for store_id in store_ids if store_id in self.stores}
+
+
+def _column_list(columns, column_index):
+    while len(columns) <= column_index:
+        columns.append([])
+    return columns[column_index]
+
+
+# Migrações do esquema, aplicadas em ordem conforme PRAGMA user_version
+SQLITE_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS stores (
+        id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS layouts (
+        store_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        num_columns INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS modules (
+        store_id INTEGER NOT NULL,
+        module_id INTEGER NOT NULL,
+        col INTEGER NOT NULL,
+        row INTEGER NOT NULL,
+        x INTEGER NOT NULL,
+        y INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        category_id INTEGER,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        rotation INTEGER NOT NULL,
+        PRIMARY KEY (store_id, module_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS modules_by_column ON modules (store_id, col, row);
+    CREATE INDEX IF NOT EXISTS modules_by_category ON modules (store_id, category_id);
+    """,
+    # Contadores de módulos por loja e por categoria (share sem varrer os módulos)
+    """
+    ALTER TABLE layouts ADD COLUMN module_count INTEGER NOT NULL DEFAULT 0;
+    CREATE TABLE category_counts (
+        store_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (store_id, category_id)
+    ) WITHOUT ROWID;
+    UPDATE layouts SET module_count = (SELECT COUNT(*) FROM modules WHERE modules.store_id = layouts.store_id);
+    INSERT INTO category_counts (store_id, category_id, count)
+        SELECT store_id, category_id, COUNT(*) FROM modules WHERE category_id IS NOT NULL GROUP BY store_id, category_id;
+    """,
+    # Área (largura x altura) nos contadores, para o share ponderado por área
+    """
+    ALTER TABLE layouts ADD COLUMN module_area INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE category_counts ADD COLUMN area INTEGER NOT NULL DEFAULT 0;
+    UPDATE layouts SET module_area = (SELECT COALESCE(SUM(width * height), 0) FROM modules WHERE modules.store_id = layouts.store_id);
+    UPDATE category_counts SET area = (SELECT COALESCE(SUM(width * height), 0) FROM modules
+        WHERE modules.store_id = category_counts.store_id AND modules.category_id = category_counts.category_id);
+    """,
+    # Identificador do banco, usado nos ETags: um arquivo recriado do zero não repete os ETags do anterior
+    """
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    INSERT INTO meta (key, value) VALUES ('epoch', lower(hex(randomblob(4))));
+    """,
+    # Eventos de alteração dos layouts, lidos por todos os processos para a sincronização ao vivo
+    """
+    CREATE TABLE layout_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        store_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX layout_events_by_store ON layout_events (store_id, version);
+    """,
+]
+
+SQL_INSERT_MODULE = ("INSERT INTO modules (store_id, module_id, col, row, x, y, name, category_id, width, height, rotation) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+SQL_SELECT_MODULES = ("SELECT module_id, col, row, x, y, name, category_id, width, height, rotation "
+                      "FROM modules WHERE store_id = ? ORDER BY col, row, module_id")
+# Um comando fixo por tipo de operação, para que o sqlite3 reaproveite o statement preparado
+SQL_UPDATE_MODULE = {
+    "move": "UPDATE modules SET x = ?, y = ?, col = COALESCE(?, col), row = COALESCE(?, row) WHERE store_id = ? AND module_id = ?",
+    "resize": "UPDATE modules SET width = ?, height = ? WHERE store_id = ? AND module_id = ?",
+    "rotate": "UPDATE modules SET rotation = ? WHERE store_id = ? AND module_id = ?",
+    "rename": "UPDATE modules SET name = ? WHERE store_id = ? AND module_id = ?",
+    "set_category": "UPDATE modules SET category_id = ? WHERE store_id = ? AND module_id = ?",
+}
+SQL_INSERT_CATEGORY_COUNT = "INSERT INTO category_counts (store_id, category_id, count, area) VALUES (?, ?, ?, ?)"
+SQL_ADD_CATEGORY_COUNT = (SQL_INSERT_CATEGORY_COUNT + " ON CONFLICT (store_id, category_id) "
+                          "DO UPDATE SET count = count + excluded.count, area = area + excluded.area")
+SQLITE_MAX_VARIABLES = 900
+
+
+class SQLiteStorage(LayoutStorage):
+    """
+    Backend durável em SQLite (WAL).
+
+    Cada thread usa a sua própria conexão; as escritas rodam em transações
+    BEGIN IMMEDIATE, então a checagem de versão e as alterações dos módulos
+    são atômicas inclusive entre processos que compartilham o arquivo.
+
+    Os layouts lidos ficam em um cache do processo, validado pela versão a
+    cada leitura: uma escrita feita por outro processo aumenta a versão e a
+    próxima leitura recarrega os módulos, sem precisar de aviso entre processos.
+
+    Args:
+        path (str): Arquivo do banco.
+        layout_cache_size (int): Layouts mantidos no cache (0 desativa).
+    """
+
+    def __init__(self, path, layout_cache_size=64):
+        self.path = path
+        self.local = threading.local()
+        self.layout_cache = OrderedDict()  # store_id -> (versão, layout), do menos para o mais recente
+        self.layout_cache_size = layout_cache_size
+        self.cache_lock = threading.Lock()
+        self.migrate()
+
+    def migrate(self):
+        conn = self.connection()
+        with self.transaction():
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, script in enumerate(SQLITE_MIGRATIONS[schema_version:], start=schema_version + 1):
+                for statement in script.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA cache_size=-65536")  # 64 MB, ajuda na manutenção dos índices em lotes grandes
+            self.local.conn = conn
+        return conn
+
+    def transaction(self):
+        return _Transaction(self.connection())
+
+    def has_store(self, store_id):
+        return self.connection().execute("SELECT 1 FROM stores WHERE id = ?", (store_id,)).fetchone() is not None
+
+    def get_store(self, store_id):
+        row = self.connection().execute("SELECT data FROM stores WHERE id = ?", (store_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put_store(self, store):
+        with self.transaction() as conn:
+            conn.execute("UPDATE stores SET data = ? WHERE id = ?", (json.dumps(store), store["id"]))
+
+    def has_category(self, category_id):
+        return self.connection().execute("SELECT 1 FROM categories WHERE id = ?", (category_id,)).fetchone() is not None
+
+    def put_category(self, category):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO categories (id, data) VALUES (?, ?)", (category["id"], json.dumps(category)))
+
+    def create_stores(self, items):
+        existing = set()
+        with self.transaction() as conn:
+            for store, layout in items:
+                # Sem REPLACE: uma loja criada por outra requisição entre a checagem e a escrita não é sobrescrita
+                cursor = conn.execute("INSERT OR IGNORE INTO stores (id, data) VALUES (?, ?)",
+                                      (store["id"], json.dumps(store)))
+                if not cursor.rowcount:
+                    existing.add(store["id"])
+                    continue
+                self._write_layout(conn, store["id"], layout, 1)
+        self._forget_layouts(store["id"] for store, _ in items if store["id"] not in existing)
+        return existing
+
+    def existing_store_ids(self, store_ids):
+        existing = set()
+        conn = self.connection()
+        for chunk in _chunks(list(store_ids)):
+            existing.update(row[0] for row in conn.execute(
+                f"SELECT id FROM stores WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+        return existing
+
+    def get_layout(self, store_id):
+        """
+        Retorna o layout completo ou None.
+
+        O dict pode vir do cache e ser compartilhado entre requisições; quem
+        chama não deve alterá-lo.
+        """
+        conn = self.connection()
+        # Leitura consistente do cabeçalho e dos módulos (snapshot do WAL)
+        with _Transaction(conn, "BEGIN"):
+            header = conn.execute("SELECT version, num_columns FROM layouts WHERE store_id = ?", (store_id,)).fetchone()
+            if header is None:
+                return None
+            version, num_columns = header
+            cached = self._cached_layout(store_id, version)
+            if cached is not None:
+                return cached
+            rows = conn.execute(SQL_SELECT_MODULES, (store_id,)).fetchall()
+
+        columns = [[] for _ in range(num_columns)]
+        for row in rows:
+            module = dict(zip(MODULE_FIELDS, row))
+            _column_list(columns, module["column"]).append(module)
+        layout = {"store_id": store_id, "columns": columns, "version": version}
+        self._cache_layout(store_id, version, layout)
+        return layout
+
+    def _cached_layout(self, store_id, version):
+        with self.cache_lock:
+            entry = self.layout_cache.get(store_id)
+            if entry is None or entry[0] != version:
+                return None
+            self.layout_cache.move_to_end(store_id)
+            return entry[1]
+
+    def _cache_layout(self, store_id, version, layout):
+        if not self.layout_cache_size:
+            return
+        with self.cache_lock:
+            current = self.layout_cache.get(store_id)
+            if current is not None and current[0] > version:
+                return  # Outra thread já guardou uma versão mais nova
+            self.layout_cache[store_id] = (version, layout)
+            self.layout_cache.move_to_end(store_id)
+            while len(self.layout_cache) > self.layout_cache_size:
+                self.layout_cache.popitem(last=False)
+
+    def _forget_layouts(self, store_ids):
+        # Lojas recriadas voltam para a versão 1; a versão sozinha não invalidaria o cache
+        with self.cache_lock:
+            for store_id in store_ids:
+                self.layout_cache.pop(store_id, None)
+
+    def layout_version(self, store_id):
+        row = self.connection().execute("SELECT version FROM layouts WHERE store_id = ?", (store_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def layout_versions(self):
+        return dict(self.connection().execute("SELECT store_id, version FROM layouts"))
+
+    def append_event(self, store_id, version, data):
+        with self.transaction() as conn:
+            event_id = conn.execute("INSERT INTO layout_events (store_id, version, data) VALUES (?, ?, ?)",
+                                    (store_id, version, data)).lastrowid
+            if event_id % 500 == 0:
+                conn.execute("DELETE FROM layout_events WHERE id <= ?", (event_id - EVENT_RETENTION,))
+
+    def events_since(self, cursor, limit=1000):
+        return self.connection().execute("SELECT id, store_id, version, data FROM layout_events WHERE id > ? "
+                                         "ORDER BY id LIMIT ?", (cursor, limit)).fetchall()
+
+    def store_events(self, store_id, after_version):
+        return self.connection().execute("SELECT id, store_id, version, data FROM layout_events "
+                                         "WHERE store_id = ? AND version > ? ORDER BY version",
+                                         (store_id, after_version)).fetchall()
+
+    def last_event_id(self):
+        return self.connection().execute("SELECT COALESCE(MAX(id), 0) FROM layout_events").fetchone()[0]
+
+    def epoch(self):
+        return self.connection().execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def replace_layout(self, store_id, layout, expected_version=None):
+        with self.transaction() as conn:
+            row = conn.execute("SELECT version FROM layouts WHERE store_id = ?", (store_id,)).fetchone()
+            current_version = row[0] if row else 0
+            if expected_version is not None and expected_version != current_version:
+                raise VersionConflict(current_version)
+            self._write_layout(conn, store_id, layout, current_version + 1)
+            return current_version + 1
+
+    def _write_layout(self, conn, store_id, layout, version):
+        columns = layout.get("columns", [])
+        conn.execute("DELETE FROM modules WHERE store_id = ?", (store_id,))
+        conn.executemany(SQL_INSERT_MODULE, (_module_row(store_id, module) for column in columns for module in column))
+        conn.execute("INSERT OR REPLACE INTO layouts (store_id, version, num_columns) VALUES (?, ?, ?)",
+                     (store_id, version, len(columns)))
+        self._write_counters(conn, store_id, count_layout(layout))
+
+    def _write_counters(self, conn, store_id, counter):
+        conn.execute("UPDATE layouts SET module_count = ?, module_area = ? WHERE store_id = ?",
+                     (counter.total, counter.total_area, store_id))
+        conn.execute("DELETE FROM category_counts WHERE store_id = ?", (store_id,))
+        conn.executemany(SQL_INSERT_CATEGORY_COUNT, ((store_id, category_id, count, area)
+                                                     for category_id, (count, area) in counter.cells.items() if count))
+
+    def apply_ops(self, store_id, ops, base_version):
+        with self.transaction() as conn:
+            row = conn.execute("SELECT version, num_columns FROM layouts WHERE store_id = ?", (store_id,)).fetchone()
+            if row is None:
+                raise KeyError(store_id)
+            current_version, num_columns = row
+            if base_version != current_version:
+                raise VersionConflict(current_version)
+
+            # module_id -> (category_id, área) dos módulos referenciados, atualizado à medida que as operações são aplicadas
+            module_cells = self._module_cells(conn, store_id, {op["module_id"] for op in ops})
+            validate_ops(module_cells, ops)
+
+            counter = CategoryCounter()  # Variação dos contadores causada pelo lote
+            for op in ops:
+                module_id = op["module_id"]
+                if op["op"] == "add":
+                    conn.execute(SQL_INSERT_MODULE, _module_row(store_id, op["module"]))
+                    num_columns = max(num_columns, op["module"]["column"] + 1)
+                    module_cells[module_id] = (op["module"].get("category_id"), module_area(op["module"]))
+                    counter.add(*module_cells[module_id])
+                elif op["op"] == "delete":
+                    conn.execute("DELETE FROM modules WHERE store_id = ? AND module_id = ?", (store_id, module_id))
+                    counter.add(*module_cells.pop(module_id), -1)
+                else:
+                    params = [op.get(field) for field in MODULE_OP_FIELDS[op["op"]]]
+                    conn.execute(SQL_UPDATE_MODULE[op["op"]], params + [store_id, module_id])
+                    if op["op"] == "move" and op.get("column") is not None:
+                        num_columns = max(num_columns, op["column"] + 1)
+                    if op["op"] in ("resize", "set_category"):
+                        category_id, area = module_cells[module_id]
+                        if op["op"] == "resize":
+                            new_cell = (category_id, op["width"] * op["height"])
+                        else:
+                            new_cell = (op.get("category_id"), area)
+                        counter.change(category_id, area, *new_cell)
+                        module_cells[module_id] = new_cell
+
+            conn.execute("UPDATE layouts SET version = ?, num_columns = ?, module_count = module_count + ?, "
+                         "module_area = module_area + ? WHERE store_id = ?",
+                         (current_version + 1, num_columns, counter.total, counter.total_area, store_id))
+            conn.executemany(SQL_ADD_CATEGORY_COUNT, ((store_id, category_id, count, area)
+                                                      for category_id, (count, area) in counter.cells.items()))
+            conn.execute("DELETE FROM category_counts WHERE store_id = ? AND count = 0", (store_id,))
+            return current_version + 1
+
+    def _module_cells(self, conn, store_id, module_ids):
+        cells = {}
+        for chunk in _chunks(list(module_ids)):
+            query = (f"SELECT module_id, category_id, width * height FROM modules "
+                     f"WHERE store_id = ? AND module_id IN ({','.join('?' * len(chunk))})")
+            cells.update((module_id, (category_id, area)) for module_id, category_id, area in conn.execute(query, [store_id] + chunk))
+        return cells
+
+    def category_counts(self, store_id):
+        conn = self.connection()
+        with _Transaction(conn, "BEGIN"):
+            row = conn.execute("SELECT module_count FROM layouts WHERE store_id = ?", (store_id,)).fetchone()
+            if row is None:
+                return None
+            counts = conn.execute("SELECT category_id, count FROM category_counts WHERE store_id = ?", (store_id,)).fetchall()
+        return row[0], dict(counts)
+
+    def recount_categories(self, store_id):
+        counter = self._recount(self.connection(), store_id)
+        return counter.total, counter.categories
+
+    def _recount(self, conn, store_id):
+        counter = CategoryCounter()
+        rows = conn.execute("SELECT category_id, COUNT(*), COALESCE(SUM(width * height), 0) FROM modules "
+                            "WHERE store_id = ? GROUP BY category_id", (store_id,))
+        for category_id, count, area in rows:
+            counter.total += count
+            counter.total_area += area
+            if category_id is not None:
+                counter.cells[category_id] = [count, area]
+        return counter
+
+    def rebuild_counters(self, store_id):
+        with self.transaction() as conn:
+            self._write_counters(conn, store_id, self._recount(conn, store_id))
+
+    def share_rows(self, store_ids=None):
+        conn = self.connection()
+        with _Transaction(conn, "BEGIN"):
+            if store_ids is None:
+                stores = conn.execute("SELECT store_id, module_count, module_area FROM layouts").fetchall()
+                cells = conn.execute("SELECT store_id, category_id, count, area FROM category_counts").fetchall()
+                return stores, cells
+
+            stores, cells = [], []
+            for chunk in _chunks(list(store_ids)):
+                placeholders = ",".join("?" * len(chunk))
+                stores.extend(conn.execute("SELECT store_id, module_count, module_area FROM layouts "
+                                           f"WHERE store_id IN ({placeholders})", chunk))
+                cells.extend(conn.execute("SELECT store_id, category_id, count, area FROM category_counts "
+                                          f"WHERE store_id IN ({placeholders})", chunk))
+        return stores, cells
+
+    def store_attribute(self, field, store_ids=None):
+        conn = self.connection()
+        if store_ids is None:
+            return dict(conn.execute("SELECT id, json_extract(data, ?) FROM stores", (f"$.{field}",)))
+        values = {}
+        for chunk in _chunks(list(store_ids)):
+            query = f"SELECT id, json_extract(data, ?) FROM stores WHERE id IN ({','.join('?' * len(chunk))})"
+            values.update(conn.execute(query, [f"$.{field}"] + chunk))
+        return values
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+class _Transaction:
+    # Context manager de transação explícita (a conexão está em modo autocommit)
+    def __init__(self, conn, begin="BEGIN IMMEDIATE"):
+        self.conn = conn
+        self.begin = begin
+
+    def __enter__(self):
+        self.conn.execute(self.begin)
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+def _chunks(values, size=SQLITE_MAX_VARIABLES - 1):
+    # Divide listas longas de parâmetros para respeitar o limite de variáveis do SQLite
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _module_row(store_id, module):
+    return (store_id, module["module_id"], module["column"], module["row"], module["x"], module["y"],
+            module["name"], module.get("category_id"), module.get("width", 60), module.get("height", 30),
+            module.get("rotation", 0))
+
+
+def open_storage(url):
+    """
+    Cria o backend de armazenamento a partir de uma URL.
+
+    Args:
+        url (str): "memory" ou "sqlite:///caminho/para/arquivo.db".
+
+    Returns:
+        LayoutStorage: Backend configurado.
+    """
+    if url in ("", "memory"):
+        return MemoryStorage()
+    if url.startswith("sqlite:///"):
+        # Mesma convenção do SQLAlchemy: sqlite:///relativo.db e sqlite:////caminho/absoluto.db
+        return SQLiteStorage(url[len("sqlite:///"):])
+    raise ValueError(f"Backend de armazenamento desconhecido: {url}")
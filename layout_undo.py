@@ -0,0 +1,246 @@
+"""
+Desfazer/refazer das edições do layout a partir de deltas por módulo.
+
+Cada edição guarda só os campos que mudaram em cada módulo (o módulo
+inteiro apenas quando ele é criado ou removido). Os mesmos deltas
+alimentam o ChangeSet, que acumula as mudanças desde a última
+sincronização e gera as operações do PATCH incremental.
+"""
+import sys
+
+from layout_models import MODULE_OP_FIELDS, op_changes
+
+DEFAULT_MEMORY_LIMIT = 16 * 1024 * 1024  # Bytes (estimados) mantidos no histórico
+
+
+class ModuleDelta:
+    """
+    Mudança de um módulo.
+
+    `before` e `after` têm só os campos alterados; None indica que o módulo
+    não existe naquele lado (criação ou remoção), e então o outro lado
+    traz o módulo completo no formato de Module.dict().
+    """
+
+    __slots__ = ("module_id", "before", "after")
+
+    def __init__(self, module_id, before, after):
+        self.module_id = module_id
+        self.before = before
+        self.after = after
+
+    def inverted(self):
+        return ModuleDelta(self.module_id, self.after, self.before)
+
+    def size(self):
+        # Estimativa da memória ocupada pelo delta
+        total = sys.getsizeof(self)
+        for state in (self.before, self.after):
+            if state is not None:
+                total += sys.getsizeof(state) + sum(sys.getsizeof(value) for value in state.values())
+        return total
+
+
+def update_module(module, changes):
+    """
+    Altera os campos de um Module e retorna o delta correspondente.
+
+    Returns:
+        ModuleDelta | None: None se nenhum campo mudou de valor.
+    """
+    before = {field: getattr(module, field) for field, value in changes.items() if getattr(module, field) != value}
+    if not before:
+        return None
+    after = {field: changes[field] for field in before}
+    for field, value in after.items():
+        setattr(module, field, value)
+    return ModuleDelta(module.module_id, before, after)
+
+
+def delta_from_op(module, op):
+    """
+    Delta que uma operação do PATCH (ex.: recebida de outro editor) causa em um módulo.
+
+    Args:
+        module (Module | None): Estado atual do módulo, ou None se ele não existe.
+        op (dict): Operação no formato de ModuleOp.dict().
+
+    Returns:
+        ModuleDelta | None: None se a operação não muda nada.
+    """
+    module_id = op["module_id"]
+    if op["op"] == "add":
+        return ModuleDelta(module_id, None if module is None else module.dict(), dict(op["module"]))
+    if module is None:
+        return None
+    if op["op"] == "delete":
+        return ModuleDelta(module_id, module.dict(), None)
+    changes = op_changes(op)
+    before = {field: getattr(module, field) for field, value in changes.items() if getattr(module, field) != value}
+    if not before:
+        return None
+    return ModuleDelta(module_id, before, {field: changes[field] for field in before})
+
+
+class EditCommand:
+    """Uma entrada do histórico: uma ação do usuário, com os deltas de todos os módulos afetados."""
+
+    __slots__ = ("label", "deltas", "nbytes")
+
+    def __init__(self, label, deltas):
+        self.label = label
+        self.deltas = list(deltas)
+        self.nbytes = sys.getsizeof(self) + sum(delta.size() for delta in self.deltas)
+
+
+class UndoStack:
+    """
+    Histórico de edições com limite de memória.
+
+    Quando o total estimado passa de `memory_limit`, as entradas mais
+    antigas são descartadas.
+    """
+
+    def __init__(self, memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.done = []  # Entradas que podem ser desfeitas (a última é a mais recente)
+        self.undone = []  # Entradas desfeitas que podem ser refeitas
+        self.nbytes = 0
+
+    def push(self, command):
+        self.done.append(command)
+        self.nbytes += command.nbytes
+        # Uma nova edição invalida o que foi desfeito
+        self.nbytes -= sum(undone.nbytes for undone in self.undone)
+        self.undone.clear()
+        self._trim()
+
+    def undo(self):
+        """Retorna a entrada a desfazer (o chamador aplica os deltas invertidos) ou None."""
+        if not self.done:
+            return None
+        command = self.done.pop()
+        self.undone.append(command)
+        return command
+
+    def redo(self):
+        """Retorna a entrada a refazer ou None."""
+        if not self.undone:
+            return None
+        command = self.undone.pop()
+        self.done.append(command)
+        return command
+
+    def can_undo(self):
+        return bool(self.done)
+
+    def can_redo(self):
+        return bool(self.undone)
+
+    def clear(self):
+        self.done.clear()
+        self.undone.clear()
+        self.nbytes = 0
+
+    def discard_modules(self, module_ids):
+        """Descarta as entradas que alteram algum dos módulos (ex.: módulos alterados por outro editor)."""
+        module_ids = set(module_ids)
+        for entries in (self.done, self.undone):
+            kept = [command for command in entries
+                    if not any(delta.module_id in module_ids for delta in command.deltas)]
+            self.nbytes -= sum(command.nbytes for command in entries) - sum(command.nbytes for command in kept)
+            entries[:] = kept
+
+    def _trim(self):
+        while self.nbytes > self.memory_limit and len(self.done) > 1:
+            self.nbytes -= self.done.pop(0).nbytes
+
+
+class ChangeSet:
+    """
+    Mudanças acumuladas desde a última sincronização com o servidor.
+
+    Para cada módulo guarda só o valor na sincronização dos campos que
+    foram tocados (ou None se o módulo não existia); os valores atuais
+    vêm dos próprios Modules na hora de gerar as operações.
+    """
+
+    def __init__(self):
+        self.before = {}  # module_id -> campos na sincronização, ou None se o módulo não existia
+
+    def __len__(self):
+        return len(self.before)
+
+    def module_ids(self):
+        return self.before.keys()
+
+    def record(self, delta):
+        if delta.module_id not in self.before:
+            self.before[delta.module_id] = None if delta.before is None else dict(delta.before)
+            return
+        before = self.before[delta.module_id]
+        if before is not None and delta.before is not None:
+            # Campos tocados pela primeira vez ainda têm o valor da sincronização
+            for field, value in delta.before.items():
+                before.setdefault(field, value)
+
+    def take(self):
+        """Retorna as mudanças pendentes e recomeça vazio (usado ao enviar um salvamento)."""
+        taken = ChangeSet()
+        taken.before, self.before = self.before, {}
+        return taken
+
+    def restore(self, taken):
+        # Devolve mudanças de um salvamento que falhou; os valores delas são mais antigos
+        for module_id, before in taken.before.items():
+            if before is None or self.before.get(module_id) is None:
+                self.before[module_id] = before
+            else:
+                self.before[module_id].update(before)
+
+    def clear(self):
+        self.before = {}
+
+    def discard(self, module_id, fields=None):
+        """
+        Deixa de enviar as mudanças locais de um módulo.
+
+        Usado quando outro editor alterou o módulo: a versão do servidor
+        prevalece nos campos que ele alterou.
+
+        Args:
+            fields (iterable | None): Campos a descartar; None descarta o módulo inteiro.
+        """
+        before = self.before.get(module_id)
+        if fields is None or before is None:
+            self.before.pop(module_id, None)
+            return
+        for field in fields:
+            before.pop(field, None)
+        if not before:
+            del self.before[module_id]
+
+    def ops(self, modules):
+        """
+        Gera as operações do PATCH que levam o servidor ao estado atual.
+
+        Args:
+            modules (dict): module_id -> estado atual no formato de Module.dict().
+        """
+        ops = []
+        for module_id in sorted(self.before):
+            before = self.before[module_id]
+            after = modules.get(module_id)
+            if before is None:
+                if after is not None:
+                    ops.append({"op": "add", "module_id": module_id, "module": after})
+                continue
+            if after is None:
+                ops.append({"op": "delete", "module_id": module_id})
+                continue
+            for op_name, fields in MODULE_OP_FIELDS.items():
+                if any(field in before and before[field] != after[field] for field in fields):
+                    op = {"op": op_name, "module_id": module_id}
+                    op.update((field, after[field]) for field in fields)
+                    ops.append(op)
+        return ops
@@ -0,0 +1,26 @@
+"""
+Testes da importação do editor (app_layout).
+
+Rode com `python -m pytest -q`.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_import_is_silent_and_skips_the_backend():
+    # Em um processo novo, para ver os módulos carregados só pela importação
+    code = ("import sys, app_layout; "
+            "print(sorted(m for m in ('layout_storage', 'layout_server', 'sqlite3', 'fastapi', 'uvicorn') "
+            "if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60,
+                            env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "[]\n"
@@ -0,0 +1,87 @@
+"""
+Testes da leitura em streaming de layouts JSON (layout_io).
+
+Rode com `python -m pytest -q`.
+"""
+import io
+import json
+
+import pytest
+
+import layout_io
+from layout_io import iter_layout_json, write_layout_json
+
+
+def make_layout(modules=500, columns=5):
+    return {"store_id": 7, "version": 3, "columns": [
+        [{"module_id": column * 1000 + row, "column": column, "row": row, "x": -column * 70, "y": row * 40.5,
+          "name": f"Módulo \"{row}\" é😀\\", "category_id": None if row % 3 else 12345678901234, "width": 60,
+          "height": 30, "rotation": 0} for row in range(modules // columns)]
+        for column in range(columns)]}
+
+
+def read_layout(data):
+    layout = {"columns": []}
+    for event in iter_layout_json(io.BytesIO(data)):
+        if event[0] == "key":
+            layout[event[1]] = event[2]
+        elif event[0] == "column":
+            layout["columns"].append([])
+        else:
+            layout["columns"][event[1]].append(event[2])
+    return layout
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_round_trip_across_chunk_boundaries(monkeypatch, chunk_size, indent):
+    monkeypatch.setattr(layout_io, "CHUNK_SIZE", chunk_size)
+    layout = make_layout(60, 3)
+    text = io.StringIO()
+    write_layout_json(text, {"store_id": layout["store_id"], "version": layout["version"]}, layout["columns"], indent)
+
+    assert json.loads(text.getvalue()) == layout
+    assert read_layout(text.getvalue().encode()) == layout
+
+
+def test_malformed_value_fails_without_reading_the_rest(monkeypatch):
+    monkeypatch.setattr(layout_io, "CHUNK_SIZE", 1024)
+    text = json.dumps(make_layout(20000, 10))
+    broken = text.replace('"x": -70', '"x": -70 oops', 1)
+    reader = CountingReader(broken.encode())
+
+    with pytest.raises(ValueError):
+        for _ in iter_layout_json(reader):
+            pass
+
+    assert reader.bytes_read < len(broken) // 10
+
+
+def test_unterminated_string_is_bounded(monkeypatch):
+    monkeypatch.setattr(layout_io, "MAX_VALUE_CHARS", 1 << 16)
+    data = b'{"store_id": 1, "columns": [[{"name": "' + b"a" * (1 << 20)
+    reader = CountingReader(data)
+
+    with pytest.raises(ValueError):
+        for _ in iter_layout_json(reader):
+            pass
+
+    assert reader.bytes_read < len(data) // 4
+
+
+def test_long_value_is_read_whole(monkeypatch):
+    monkeypatch.setattr(layout_io, "CHUNK_SIZE", 64)
+    layout = {"store_id": 1, "columns": [[dict(make_layout(1, 1)["columns"][0][0], name="x" * 200000)]]}
+
+    assert read_layout(json.dumps(layout).encode()) == layout
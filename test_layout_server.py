@@ -0,0 +1,265 @@
+"""
+Testes da API do layout, rodados contra os dois backends (memória e SQLite).
+
+Rode com `python -m pytest -q`.
+"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import layout_server
+from layout_events import LayoutEventHub
+from layout_response_cache import ResponseCache
+from layout_storage import open_storage
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def client(request, tmp_path, monkeypatch):
+    # Cada teste usa um armazenamento novo no lugar do criado na importação de layout_server
+    storage = open_storage("memory" if request.param == "memory" else f"sqlite:///{tmp_path / 'layout.db'}")
+    monkeypatch.setattr(layout_server, "storage", storage)
+    monkeypatch.setattr(layout_server, "storage_epoch", storage.epoch())
+    monkeypatch.setattr(layout_server, "event_hub", LayoutEventHub(storage))
+    monkeypatch.setattr(layout_server, "response_cache", ResponseCache(1024 * 1024))
+    yield TestClient(layout_server.app)
+    storage.close()
+
+
+def create_store(client, store_id=1, num_columns=2, modules_per_column=3):
+    response = client.post("/store/", json={"id": store_id, "name": f"Loja {store_id}", "num_columns": num_columns,
+                                            "modules_per_column": modules_per_column})
+    assert response.status_code == 200, response.text
+    return client.get(f"/store-layout/{store_id}").json()
+
+
+def modules_by_id(layout):
+    return {module["module_id"]: module for column in layout["columns"] for module in column}
+
+
+def patch(client, base_version, *ops, store_id=1):
+    return client.patch(f"/store-layout/{store_id}", json={"base_version": base_version, "ops": list(ops)})
+
+
+def test_create_store_rejects_existing_id(client):
+    create_store(client)
+    client.patch("/store-layout/1", json={"base_version": 1, "ops": [{"op": "rename", "module_id": 0, "name": "A"}]})
+
+    response = client.post("/store/", json={"id": 1, "name": "Outra", "num_columns": 5, "modules_per_column": 5})
+
+    assert response.status_code == 400
+    layout = client.get("/store-layout/1").json()
+    assert layout["version"] == 2
+    assert modules_by_id(layout)[0]["name"] == "A"
+
+
+def test_put_replaces_layout(client):
+    layout = create_store(client)
+    layout["columns"][0][0]["x"] = 555
+
+    response = client.put("/store-layout/1", json=layout)
+
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    current = client.get("/store-layout/1").json()
+    assert current["version"] == 2
+    assert modules_by_id(current)[0]["x"] == 555
+
+
+def test_put_with_stale_version_conflicts(client):
+    layout = create_store(client)
+    assert client.put("/store-layout/1", json=layout).status_code == 200
+
+    response = client.put("/store-layout/1", json=layout)
+
+    assert response.status_code == 409
+    assert client.get("/store-layout/1").json()["version"] == 2
+
+
+def test_put_rejects_duplicate_module_ids(client):
+    layout = create_store(client)
+    layout["columns"][1][0]["module_id"] = layout["columns"][0][0]["module_id"]
+
+    response = client.put("/store-layout/1", json=layout)
+
+    assert response.status_code == 400
+    assert client.get("/store-layout/1").json()["version"] == 1
+
+
+def test_put_rejects_values_outside_int32(client):
+    layout = create_store(client)
+    layout["columns"][0][0]["x"] = 2 ** 31
+
+    assert client.put("/store-layout/1", json=layout).status_code == 422
+    assert client.get("/store-layout/1").json()["version"] == 1
+
+
+def test_patch_applies_ops(client):
+    layout = create_store(client)
+    new_module = dict(layout["columns"][0][0], module_id=100, name="Novo", x=300, y=300, row=3)
+
+    response = patch(client, 1,
+                     {"op": "move", "module_id": 0, "x": 10, "y": 20},
+                     {"op": "resize", "module_id": 1, "width": 90, "height": 40},
+                     {"op": "set_category", "module_id": 2, "category_id": 7},
+                     {"op": "add", "module_id": 100, "module": new_module},
+                     {"op": "delete", "module_id": 3})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["version"] == 2
+    modules = modules_by_id(client.get("/store-layout/1").json())
+    assert (modules[0]["x"], modules[0]["y"]) == (10, 20)
+    assert (modules[1]["width"], modules[1]["height"]) == (90, 40)
+    assert modules[2]["category_id"] == 7
+    assert modules[100]["name"] == "Novo"
+    assert 3 not in modules
+    assert len(modules) == 6
+
+
+def test_patch_with_stale_base_version_conflicts(client):
+    create_store(client)
+    assert patch(client, 1, {"op": "move", "module_id": 0, "x": 10, "y": 20}).status_code == 200
+
+    response = patch(client, 1, {"op": "move", "module_id": 1, "x": 10, "y": 20})
+
+    assert response.status_code == 409
+    assert modules_by_id(client.get("/store-layout/1").json())[1]["x"] != 10
+
+
+@pytest.mark.parametrize("bad_op, status", [
+    ({"op": "move", "module_id": 999, "x": 1, "y": 1}, 400),  # Módulo inexistente
+    ({"op": "rotate", "module_id": 1}, 400),  # Campo obrigatório ausente
+    ({"op": "resize", "module_id": 1, "width": 2 ** 31, "height": 1}, 422),  # Não cabe em 32 bits
+])
+def test_patch_is_all_or_nothing(client, bad_op, status):
+    layout = create_store(client)
+
+    response = patch(client, 1, {"op": "move", "module_id": 0, "x": 555, "y": 0},
+                     {"op": "set_category", "module_id": 2, "category_id": 7}, bad_op)
+
+    assert response.status_code == status
+    assert client.get("/store-layout/1").json() == layout
+    assert client.get("/store-layout/1/share").json() == {}
+
+
+def test_share_follows_writes(client):
+    layout = create_store(client, num_columns=2, modules_per_column=2)
+    patch(client, 1, {"op": "set_category", "module_id": 0, "category_id": 10},
+          {"op": "set_category", "module_id": 1, "category_id": 10},
+          {"op": "set_category", "module_id": 2, "category_id": 20})
+    assert client.get("/store-layout/1/share").json() == {"10": 50.0, "20": 25.0}
+
+    for module in layout["columns"][1]:
+        module["category_id"] = 20
+    layout["version"] = 2
+    assert client.put("/store-layout/1", json=layout).status_code == 200
+    assert client.get("/store-layout/1/share").json() == {"20": 50.0}  # A coluna 0 volta a ficar sem categoria
+
+
+def test_bulk_share_ignores_repeated_ids(client):
+    create_store(client, 1, num_columns=1, modules_per_column=2)
+    create_store(client, 2, num_columns=1, modules_per_column=2)
+    patch(client, 1, {"op": "set_category", "module_id": 0, "category_id": 10},
+          {"op": "set_category", "module_id": 1, "category_id": 20})
+
+    result = client.post("/share/bulk", json={"store_ids": [1, 1, 3, 3]}).json()
+
+    assert result["total"] == {"10": 50.0, "20": 50.0}
+    assert result["stores"] == {"1": {"10": 50.0, "20": 50.0}}
+    assert result["missing"] == [3]
+
+
+def test_bulk_create(client):
+    create_store(client, 1)
+    lines = [json.dumps({"id": store_id, "name": f"Loja {store_id}", "num_columns": 2, "modules_per_column": 2})
+             for store_id in (1, 2, 3, 2)]
+    lines.insert(1, "{inválido")
+
+    response = client.post("/stores/bulk", content="\n".join(lines).encode(),
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 2
+    # Linha inválida, ID repetido no lote e ID que já existia
+    assert sorted((error["line"], error.get("id")) for error in result["errors"]) == [(1, 1), (2, None), (5, 2)]
+    assert [len(column) for column in client.get("/store-layout/1").json()["columns"]] == [3, 3]
+    assert [len(column) for column in client.get("/store-layout/2").json()["columns"]] == [2, 2]
+
+
+def test_columnar_round_trip(client):
+    create_store(client)
+    columnar = client.get("/store-layout/1/columnar").json()
+    columnar["names"] = ["Frios"]
+    columnar["name_refs"][0] = 0
+
+    response = client.put("/store-layout/1/columnar", json=columnar)
+
+    assert response.status_code == 200, response.text
+    assert modules_by_id(client.get("/store-layout/1").json())[columnar["module_ids"][0]]["name"] == "Frios"
+
+
+@pytest.mark.parametrize("field, value", [("name_refs", 5), ("name_refs", -2), ("columns", -1)])
+def test_columnar_rejects_bad_references(client, field, value):
+    create_store(client)
+    columnar = client.get("/store-layout/1/columnar").json()
+    columnar[field][0] = value
+
+    assert client.put("/store-layout/1/columnar", json=columnar).status_code == 400
+    assert client.get("/store-layout/1").json()["version"] == 1
+
+
+@pytest.mark.parametrize("field", ["column", "row"])
+def test_put_and_patch_reject_negative_positions(client, field):
+    layout = create_store(client)
+    module = dict(layout["columns"][0][0], **{field: -1})
+    put_layout = dict(layout, columns=[[module] + layout["columns"][0][1:]] + layout["columns"][1:])
+
+    assert client.put("/store-layout/1", json=put_layout).status_code == 422
+    assert patch(client, 1, {"op": "move", "module_id": 0, "x": 0, "y": 0, field: -1}).status_code == 422
+    assert patch(client, 1, {"op": "add", "module_id": 100, "module": dict(module, module_id=100)}).status_code == 422
+    assert client.get("/store-layout/1").json() == layout
+
+
+def test_optimize_applies_known_categories(client):
+    create_store(client, num_columns=2, modules_per_column=2)
+    for category_id in (10, 20):
+        assert client.post("/category/", json={"id": category_id, "name": f"Cat {category_id}"}).status_code == 200
+
+    response = client.post("/store-layout/1/optimize", json={"targets": {"10": 50, "20": 50}, "apply": True,
+                                                             "time_limit": 0.1})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["applied"]
+    assert client.get("/store-layout/1/share").json() == {"10": 50.0, "20": 50.0}
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"targets": {"999": 50}, "apply": True}, 400),  # Categoria inexistente
+    ({"targets": {}, "adjacent": [[10, 999]]}, 400),
+    ({"targets": {}, "time_limit": 3600}, 422),
+    ({"targets": {}, "time_limit": 0}, 422),
+])
+def test_optimize_rejects_bad_requests(client, body, status):
+    create_store(client)
+    client.post("/category/", json={"id": 10, "name": "Cat 10"})
+
+    assert client.post("/store-layout/1/optimize", json=body).status_code == status
+    assert client.post("/optimize/bulk", json=body).status_code == status
+    assert client.get("/store-layout/1").json()["version"] == 1
+
+
+def test_share_check_mode_repairs_counters(client, monkeypatch, caplog):
+    create_store(client, num_columns=1, modules_per_column=2)
+    patch(client, 1, {"op": "set_category", "module_id": 0, "category_id": 10})
+    monkeypatch.setattr(layout_server, "share_counters_mode", "check")
+    # Contadores corrompidos: a recontagem completa é que vale
+    monkeypatch.setattr(layout_server.storage, "category_counts", lambda store_id: (2, {10: 2}))
+    mismatches = layout_server.metrics.counter_mismatches.series[()]
+
+    with caplog.at_level("WARNING", logger="layout_server"):
+        assert client.get("/store-layout/1/share").json() == {"10": 50.0}
+
+    assert "inconsistentes na loja 1" in caplog.text
+    assert layout_server.metrics.counter_mismatches.series[()] == mismatches + 1
+    assert "layout_share_counter_mismatches_total" in client.get("/metrics").text